@@ -3,10 +3,28 @@
 Generates documentation highlighting differences between human
 and AI-written code, creating learning examples to improve
 AI code generation capabilities.
+
+Besides the ``code-diff-doc-gen`` CLI, rounds can be run from async code with
+``run_round``, which yields a ``FileEvent`` for every stage of every file as
+it completes. The package logs through loguru but is disabled by default; call
+``logger.enable("code_diff_doc_gen")`` to see its messages.
 """
 
 __version__ = "0.2.0"
 
+from loguru import logger
+
 from .main import main
 
-__all__ = ["main"]
\ No newline at end of file
+logger.disable(__name__)
+
+__all__ = ["FileEvent", "main", "run_round"]
+
+
+def __getattr__(name: str):
+    # The library API pulls in the pipeline stages, so load it on first use only
+    if name in ("FileEvent", "run_round"):
+        from . import api
+
+        return getattr(api, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,215 @@
+"""Structured analysis records and streaming prompt aggregation.
+
+Each analysis appends one ``file`` record followed by one ``pair`` record per
+code pair to the ``analysis/round_N`` record log of the workspace store. A file
+may be analyzed several times; only the records of its latest analysis are
+used when building prompts.
+"""
+
+import hashlib
+import time
+import uuid
+from typing import Dict, Iterator, List, Optional, Set, TextIO, Tuple
+
+from .models import CodePair
+from .store import WorkspaceStore
+
+
+def content_hash(content: str) -> str:
+    """Compute a short stable hash of text content.
+
+    Args:
+        content: Text to hash
+
+    Returns:
+        First 16 hex digits of the SHA-256 digest
+    """
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+def hash_analysis(original: str, generated: str, pairs: List[Tuple[str, str]]) -> Tuple[str, str, List[str]]:
+    """Hash the contents of one file analysis.
+
+    Takes and returns plain strings so it can run on the CPU pool.
+
+    Args:
+        original: Original file content
+        generated: Generated file content
+        pairs: Bad and good code of each pair
+
+    Returns:
+        Hashes of the original content, the generated content and each pair
+    """
+    return (
+        content_hash(original),
+        content_hash(generated),
+        [content_hash(f"{bad_code}\0{good_code}") for bad_code, good_code in pairs],
+    )
+
+
+def format_pair(bad_code: str, good_code: str) -> str:
+    """Format a code pair as markdown code blocks.
+
+    Args:
+        bad_code: Problematic generated code
+        good_code: Correct original code
+
+    Returns:
+        Markdown with the bad and good code blocks
+    """
+    return f"```\n// Bad Code\n{bad_code}\n```\n\n```\n// Good Code\n{good_code}\n```\n\n"
+
+
+def record_analysis(
+    store: WorkspaceStore,
+    round_num: int,
+    key: str,
+    language: str,
+    original: str,
+    generated: str,
+    pairs: List[CodePair],
+    hashes: Optional[Tuple[str, str, List[str]]] = None,
+) -> None:
+    """Append structured records for one file analysis.
+
+    Args:
+        store: Workspace store to append to
+        round_num: Generation round number
+        key: Source path relative to the source directory
+        language: Source language of the file
+        original: Original file content
+        generated: Generated file content
+        pairs: Code pairs returned by the analysis
+        hashes: Result of ``hash_analysis`` for these contents (default: computed here)
+    """
+    original_hash, generated_hash, pair_hashes = hashes or hash_analysis(
+        original, generated, [(pair.bad_code, pair.good_code) for pair in pairs]
+    )
+    kind = f"analysis/round_{round_num}"
+    analysis_id = uuid.uuid4().hex
+    store.append_record(
+        kind,
+        {
+            "type": "file",
+            "analysis_id": analysis_id,
+            "file": key,
+            "language": language,
+            "round": round_num,
+            "original_hash": original_hash,
+            "generated_hash": generated_hash,
+            "pairs": len(pairs),
+            "ts": time.time(),
+        },
+    )
+    for index, (pair, pair_hash) in enumerate(zip(pairs, pair_hashes)):
+        store.append_record(
+            kind,
+            {
+                "type": "pair",
+                "analysis_id": analysis_id,
+                "file": key,
+                "language": language,
+                "round": round_num,
+                "pair": index,
+                "pair_hash": pair_hash,
+                "bad_code": pair.bad_code,
+                "good_code": pair.good_code,
+            },
+        )
+
+
+def latest_analysis_ids(store: WorkspaceStore, round_num: int) -> Dict[str, str]:
+    """Map every file with structured records to the id of its latest analysis."""
+    latest: Dict[str, str] = {}
+    for record in store.iter_records(f"analysis/round_{round_num}"):
+        if record.get("type") == "file":
+            latest[record["file"]] = record["analysis_id"]
+    return latest
+
+
+def iter_latest_pairs(
+    store: WorkspaceStore,
+    round_num: int,
+    languages: Optional[Set[str]] = None,
+    max_pairs_per_file: Optional[int] = None,
+    latest: Optional[Dict[str, str]] = None,
+) -> Iterator[Dict]:
+    """Stream the pair records of the latest analysis of every file.
+
+    The record log is read twice: the first pass keeps only the latest analysis
+    id per file, the second streams the matching pairs. Pair contents are never
+    held in memory beyond the record being yielded. Identical pairs reported
+    for several files are yielded once.
+
+    Args:
+        store: Workspace store holding the records
+        round_num: Generation round number
+        languages: Only yield pairs for these languages (default: all)
+        max_pairs_per_file: Maximum pairs to yield per file (default: all)
+        latest: Result of ``latest_analysis_ids``, if already known (skips the first pass)
+
+    Yields:
+        Pair records in append order
+    """
+    kind = f"analysis/round_{round_num}"
+    if latest is None:
+        latest = latest_analysis_ids(store, round_num)
+
+    seen: Set[str] = set()
+    for record in store.iter_records(kind):
+        if record.get("type") != "pair" or latest.get(record["file"]) != record["analysis_id"]:
+            continue
+        if languages is not None and record["language"] not in languages:
+            continue
+        if max_pairs_per_file is not None and record["pair"] >= max_pairs_per_file:
+            continue
+        if record["pair_hash"] in seen:
+            continue
+        seen.add(record["pair_hash"])
+        yield record
+
+
+def has_records(store: WorkspaceStore, round_num: int) -> bool:
+    """Check whether structured analysis records exist for a round."""
+    return next(iter(store.iter_records(f"analysis/round_{round_num}")), None) is not None
+
+
+def write_prompt(
+    out: TextIO,
+    prev_prompt: str,
+    round_num: int,
+    store: WorkspaceStore,
+    max_pairs_per_file: Optional[int] = None,
+) -> int:
+    """Stream the next round's system prompt to a text stream.
+
+    Files analyzed before structured records existed, including those of a
+    partly migrated workspace, fall back to their ``.analysis`` markdown, which
+    is also streamed one file at a time.
+
+    Args:
+        out: Text stream to write the prompt to
+        prev_prompt: System prompt of the current round
+        round_num: Current generation round number
+        store: Workspace store holding the analyses
+        max_pairs_per_file: Maximum pairs to include per file (default: all)
+
+    Returns:
+        Number of analysis entries written
+    """
+    out.write(f"{prev_prompt}\n\n# Examples from round {round_num}:\n\n")
+
+    count = 0
+    latest = latest_analysis_ids(store, round_num)
+    for record in iter_latest_pairs(store, round_num, max_pairs_per_file=max_pairs_per_file, latest=latest):
+        out.write(format_pair(record["bad_code"], record["good_code"]))
+        count += 1
+
+    # Files with records also have markdown, which repeats their pairs
+    analysis_ns = f"analysis/round_{round_num}"
+    for key in store.keys(analysis_ns):
+        if key not in latest:
+            out.write(f"{store.read(analysis_ns, key) or ''}\n\n")
+            count += 1
+
+    return count
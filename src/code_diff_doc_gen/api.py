@@ -0,0 +1,132 @@
+"""Async library API for running rounds from other applications.
+
+``run_round`` runs the describe, generate and analyze stages of a round as a
+pipeline and yields a ``FileEvent`` for every stage of every file as soon as
+it completes. It never shows progress bars or configures logging, and it can
+use the caller's API client, cost model and response cache. Stopping the
+iteration, or cancelling the task iterating, cancels the stages in flight;
+work already completed stays in the workspace and is skipped by later runs.
+"""
+
+import asyncio
+from pathlib import Path
+from typing import AsyncIterator, Optional, Sequence
+
+from .config import config
+from .fileio import run_io
+from .journal import Journal
+from .llm import bind_call_context, generate_system_prompt_from_analyses
+from .manifest import scan_sources, stat_sources
+from .pipeline import PIPELINE_STAGES, FileEvent, PipelineJob, run_pipelines
+from .response_cache import ResponseCache
+from .scheduler import TIMINGS_KIND, CostModel
+from .store import WorkspaceStore, detect_backend, ensure_workspace, open_store
+
+__all__ = ["FileEvent", "run_round"]
+
+# Workspace namespace of the artifact each stage writes
+_OUTPUTS = {"describe": "descriptions", "generate": "generated/round_{round}", "analyze": "analysis/round_{round}"}
+
+_DONE = object()
+
+
+async def run_round(
+    source_dir: Path,
+    workspace_dir: Path,
+    round_num: int = 0,
+    files: Optional[Sequence[str]] = None,
+    store: Optional[WorkspaceStore] = None,
+    client=None,
+    costs: Optional[CostModel] = None,
+    cache: Optional[ResponseCache] = None,
+    file_timeout: Optional[float] = None,
+    concurrency: Optional[int] = None,
+    journal: Optional[Journal] = None,
+    next_prompt: bool = True,
+) -> AsyncIterator[FileEvent]:
+    """Run a round and yield the outcome of every stage of every file as it completes.
+
+    Stages that are up to date in the workspace are skipped as in the CLI, and
+    still reported. Each event carries the artifact its stage produced: the
+    description, the generated code or the analysis. Given ``files`` are
+    looked up directly instead of scanning the tree, so a single file costs
+    about one model round trip per stage that is out of date.
+
+    Args:
+        source_dir: Directory containing source files
+        workspace_dir: Workspace directory (created if missing)
+        round_num: Generation round number
+        files: Source paths relative to the source directory (default: all files)
+        store: Workspace store (default: opened from the workspace directory and
+            closed when the round ends)
+        client: Instructor-wrapped ``AsyncAnthropic`` client (default: the
+            clients of the configured API keys)
+        costs: Cost model prioritizing the work (default: built from the
+            workspace's timings); it learns this round's timings
+        cache: Response cache (default: the process-wide cache)
+        file_timeout: Seconds a file may take from the start of its first stage
+        concurrency: Maximum stages in flight (default: config.max_concurrency)
+        journal: Run journal to record completed work in
+        next_prompt: Whether to write the next round's system prompt at the end
+
+    Yields:
+        Stage outcomes, in order of completion
+
+    Raises:
+        ValueError: If no source files are found, or a given file does not exist
+    """
+    own_store = store is None
+    if own_store:
+        backend = detect_backend(workspace_dir) if workspace_dir.exists() else config.store
+        await ensure_workspace(workspace_dir, backend)
+        store = await run_io(open_store, workspace_dir, backend)
+
+    try:
+        if files is None:
+            sources = await run_io(scan_sources, source_dir)
+        else:
+            # Given files are looked up directly, so a single file never waits for a scan of the tree
+            try:
+                sources = await run_io(stat_sources, source_dir, list(files))
+            except FileNotFoundError as e:
+                raise ValueError(f"Source file not found: {e.filename}") from e
+        keys = sorted(sources)
+        if not keys:
+            raise ValueError(f"No files found in {source_dir}")
+        if costs is None:
+            sizes = {key: size for key, (size, _) in sources.items()}
+            if len(keys) <= (concurrency or config.max_concurrency):
+                # Every file starts at once, so past timings would not change the order
+                costs = CostModel(sizes)
+            else:
+                costs = await run_io(lambda: CostModel.from_records(sizes, store.iter_records(TIMINGS_KIND)))
+
+        paths = [source_dir / key for key in keys]
+        job = PipelineJob(source_dir, round_num, workspace_dir, {s: paths for s in PIPELINE_STAGES}, store, journal, costs)
+        events: asyncio.Queue = asyncio.Queue()
+
+        async def run() -> None:
+            # The task runs in its own context, so the bound client and cache stay out of the caller's
+            bind_call_context(client, cache)
+            await run_pipelines([job], events.put_nowait, file_timeout, concurrency, progress=False)
+            if next_prompt:
+                await generate_system_prompt_from_analyses(round_num, workspace_dir, store)
+
+        task = asyncio.create_task(run())
+        task.add_done_callback(lambda _: events.put_nowait(_DONE))
+        try:
+            while (event := await events.get()) is not _DONE:
+                if event.status != "error":
+                    namespace = _OUTPUTS[event.stage].format(round=round_num)
+                    event.output = await run_io(store.read, namespace, event.path)
+                yield event
+            await task
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+    finally:
+        if own_store:
+            await run_io(store.close)
+        else:
+            await run_io(store.flush)
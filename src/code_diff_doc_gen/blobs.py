@@ -0,0 +1,176 @@
+"""Content-addressed blob pool and compressed round archives.
+
+Blobs are stored once under the SHA-256 of their content, zlib-compressed, so
+artifacts that are identical across rounds or files take space only once.
+Retired rounds can be packed into a single LZMA-compressed tar archive, which
+compresses the similar files of a round against each other.
+"""
+
+import hashlib
+import io
+import json
+import os
+import tarfile
+import threading
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from .fileio import atomic_write_bytes, atomic_writer
+
+BLOB_DIR = "blobs"
+ARCHIVE_DIR = "archive"
+PACK_INDEX = "index.json"
+
+# Entries of an index: key -> (content hash, mtime)
+Index = Dict[str, Tuple[str, float]]
+
+
+def content_hash(content: str) -> str:
+    """Hash text content to its blob name."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class BlobPool:
+    """Directory of compressed blobs named by the hash of their content."""
+
+    def __init__(self, root: Path):
+        """Initialize pool.
+
+        Args:
+            root: Directory holding the blobs
+        """
+        self.root = root
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:]
+
+    def put(self, content: str) -> str:
+        """Store content unless an identical blob exists.
+
+        Returns:
+            Hash of the content
+        """
+        digest = content_hash(content)
+        path = self._path(digest)
+        if not path.exists():
+            atomic_write_bytes(path, zlib.compress(content.encode("utf-8"), 6))
+        return digest
+
+    def get(self, digest: str) -> str:
+        """Read the content of a blob.
+
+        Raises:
+            FileNotFoundError: If the blob does not exist
+        """
+        return zlib.decompress(self._path(digest).read_bytes()).decode("utf-8")
+
+    def __contains__(self, digest: str) -> bool:
+        return self._path(digest).exists()
+
+    def digests(self) -> Iterator[str]:
+        """Iterate over the hashes of all blobs."""
+        for path in sorted(self.root.glob("??/*")):
+            if not path.name.startswith("."):
+                yield path.parent.name + path.name
+
+    def remove(self, digest: str) -> int:
+        """Delete a blob.
+
+        Returns:
+            Bytes freed
+        """
+        path = self._path(digest)
+        size = path.stat().st_size
+        path.unlink()
+        return size
+
+
+def pack_path(workspace_dir: Path, round_num: int) -> Path:
+    """Path of the archive of a round."""
+    return workspace_dir / ARCHIVE_DIR / f"round_{round_num}.tar.xz"
+
+
+def write_pack(path: Path, indexes: Dict[str, Index], read: Callable[[str], str]) -> int:
+    """Write namespace indexes and their blobs to an LZMA-compressed tar archive.
+
+    Args:
+        path: Archive path
+        indexes: Index of every archived namespace
+        read: Function returning the content of a blob
+
+    Returns:
+        Number of blobs written
+    """
+    digests = sorted({digest for index in indexes.values() for digest, _ in index.values()})
+    with atomic_writer(path, binary=True) as f:
+        with tarfile.open(fileobj=f, mode="w:xz") as tar:
+            _add_member(tar, PACK_INDEX, json.dumps(indexes, sort_keys=True).encode("utf-8"))
+            for digest in digests:
+                _add_member(tar, f"{BLOB_DIR}/{digest}", read(digest).encode("utf-8"))
+    return len(digests)
+
+
+def _add_member(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+class Pack:
+    """Read access to an archived round.
+
+    The archive is one LZMA stream, so reaching a blob means decompressing
+    every member before it. The first ``read`` therefore loads all blobs in one
+    pass and later reads are served from memory until ``release``.
+    """
+
+    def __init__(self, path: Path):
+        """Open an archive and load its index.
+
+        Args:
+            path: Archive path
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._blobs: Optional[Dict[str, str]] = None
+        with tarfile.open(path, mode="r:xz") as tar:
+            self.indexes: Dict[str, Index] = {
+                namespace: {key: (digest, mtime) for key, (digest, mtime) in index.items()}
+                for namespace, index in json.load(tar.extractfile(PACK_INDEX)).items()
+            }
+
+    def read(self, digest: str) -> str:
+        """Read one blob, loading all blobs of the archive on first use.
+
+        Raises:
+            KeyError: If the archive has no such blob
+        """
+        with self._lock:
+            if self._blobs is None:
+                self._blobs = self.blobs()
+            return self._blobs[digest]
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the blobs are held in memory."""
+        return self._blobs is not None
+
+    def release(self) -> None:
+        """Drop the blobs held in memory; the next read loads them again."""
+        with self._lock:
+            self._blobs = None
+
+    def blobs(self) -> Dict[str, str]:
+        """Read every blob in one pass over the archive."""
+        with tarfile.open(self.path, mode="r:xz") as tar:
+            return {
+                member.name.split("/", 1)[1]: tar.extractfile(member).read().decode("utf-8")
+                for member in tar
+                if member.name.startswith(f"{BLOB_DIR}/")
+            }
+
+
+def list_packs(workspace_dir: Path) -> List[Path]:
+    """List the round archives of a workspace."""
+    return sorted((workspace_dir / ARCHIVE_DIR).glob("round_*.tar.xz"), key=os.path.getmtime)
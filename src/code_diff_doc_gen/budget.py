@@ -0,0 +1,141 @@
+"""Size-adaptive token budgets for API calls.
+
+Thinking budget and output cap of each call are derived from the size of the
+source file it works on. Output ratios observed in earlier runs of the same
+workspace replace the configured defaults once enough samples exist, and a
+call that hits its output cap is retried with a larger one.
+"""
+
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Tuple
+
+# Thinking must stay at or above the API minimum and below max_tokens
+MIN_THINKING_BUDGET = 1024
+
+
+class BudgetExceededError(RuntimeError):
+    """Spending of the run reached the configured cost limit."""
+
+
+def estimate_tokens(chars: int) -> int:
+    """Estimate the token count of text from its length in characters."""
+    return chars // 4 + 1
+
+
+class TokenPolicy:
+    """Per-stage token budget policy learned from observed usage.
+
+    Observations are ``(stage, source_tokens, output_tokens, max_tokens)``
+    tuples. The policy keeps a sliding window of output/source ratios per stage
+    and uses a high percentile of them to size new calls.
+    """
+
+    def __init__(self, window: int = 500, min_samples: int = 10, percentile: float = 0.9):
+        """Initialize policy.
+
+        Args:
+            window: Number of recent ratios kept per stage
+            min_samples: Samples required before learned ratios are used
+            percentile: Percentile of observed ratios used for sizing
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self._ratios: Dict[str, Deque[float]] = {}
+        self.new_observations: List[Dict] = []
+
+    def load(self, records: Iterable[Dict]) -> int:
+        """Learn from usage records of earlier runs.
+
+        Args:
+            records: Records previously returned by ``new_observations``
+
+        Returns:
+            Number of records loaded
+        """
+        count = 0
+        for record in records:
+            if not record.get("truncated"):
+                self._add(record["stage"], record["source_tokens"], record["output_tokens"])
+            count += 1
+        return count
+
+    def _add(self, stage: str, source_tokens: int, output_tokens: int) -> None:
+        ratios = self._ratios.setdefault(stage, deque(maxlen=self.window))
+        ratios.append(output_tokens / max(1, source_tokens))
+
+    def observe(self, stage: str, source_tokens: int, output_tokens: int, max_tokens: int, truncated: bool = False) -> None:
+        """Record the usage of a completed or truncated call.
+
+        Truncated calls are kept for the workspace log but not learned from,
+        since their output says nothing about the size actually needed.
+
+        Args:
+            stage: Pipeline stage of the call
+            source_tokens: Estimated tokens of the source the call worked on
+            output_tokens: Output tokens reported by the API (including thinking)
+            max_tokens: Output cap the call ran with
+            truncated: Whether the call hit its output cap
+        """
+        if not truncated:
+            self._add(stage, source_tokens, output_tokens)
+        self.new_observations.append(
+            {
+                "stage": stage,
+                "source_tokens": source_tokens,
+                "output_tokens": output_tokens,
+                "max_tokens": max_tokens,
+                "truncated": truncated,
+            }
+        )
+
+    def learned_ratio(self, stage: str) -> float:
+        """Get the learned output/source ratio of a stage, or 0.0 if unknown."""
+        ratios = self._ratios.get(stage)
+        if not ratios or len(ratios) < self.min_samples:
+            return 0.0
+        ordered = sorted(ratios)
+        return ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def plan(self, stage: str, source_tokens: int, app_config) -> Tuple[int, int]:
+        """Size the output cap and thinking budget of a call.
+
+        Args:
+            stage: Pipeline stage of the call
+            source_tokens: Estimated tokens of the source the call works on
+            app_config: Application configuration with the stage defaults
+
+        Returns:
+            Tuple of max_tokens and thinking budget
+        """
+        if not app_config.adaptive_tokens:
+            return app_config.max_tokens, app_config.thinking_budget
+
+        thinking_ratio = app_config.stage_thinking_ratio.get(stage, 1.0)
+        thinking = int(source_tokens * thinking_ratio)
+        thinking = max(MIN_THINKING_BUDGET, min(thinking, app_config.thinking_budget))
+
+        min_answer = app_config.stage_min_output.get(stage, 2048)
+        learned = self.learned_ratio(stage)
+        if learned:
+            # Learned ratios already include the thinking tokens of past calls
+            max_tokens = max(thinking + min_answer, int(source_tokens * learned * app_config.token_headroom))
+        else:
+            answer_ratio = app_config.stage_output_ratio.get(stage, 1.0)
+            max_tokens = thinking + max(min_answer, int(source_tokens * answer_ratio * app_config.token_headroom))
+
+        return min(max_tokens, app_config.max_tokens), thinking
+
+    @staticmethod
+    def escalate(max_tokens: int, thinking: int, app_config) -> Tuple[int, int]:
+        """Raise the output cap of a call that hit it.
+
+        Args:
+            max_tokens: Output cap of the truncated call
+            thinking: Thinking budget of the truncated call
+            app_config: Application configuration with the escalation ceiling
+
+        Returns:
+            Tuple of the new max_tokens and thinking budget
+        """
+        return min(max_tokens * 2, app_config.max_output_tokens), thinking
@@ -3,29 +3,129 @@
 import os
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, Optional, Tuple
 
 from loguru import logger
 
+from .budget import TokenPolicy
+from .hedging import HedgeStats
+from .monitor import StageLatency
+from .routing import DEFAULT_MODEL, model_spec
+
 
 @dataclass
 class AppConfig:
     """Application configuration."""
 
     output_dir: Path = field(default_factory=lambda: Path(".codediff"))
-    model: str = "claude-3-7-sonnet-20250219"
+    model: str = DEFAULT_MODEL
     max_tokens: int = 20000
     thinking_budget: int = 10000
+    store: str = "files"
+    io_workers: int = 32
+    cpu_workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    cpu_chunk_size: int = 64
+    cpu_batch_delay: float = 0.002
+    loop_lag_threshold: float = 0.1
+    max_concurrency: int = 64
+    pipeline: bool = False
+
+    # HTTP transport shared by all API calls
+    max_connections: int = 64
+    max_keepalive_connections: int = 64
+    keepalive_expiry: float = 60.0
+    http2: bool = True
+    connect_timeout: float = 10.0
+    read_timeout: float = 600.0
+    prewarm_connections: int = 8
+
+    # API keys as "key" or "key@base_url"; empty uses ANTHROPIC_API_KEY
+    endpoints: Tuple[str, ...] = ()
+    key_cooldown: float = 30.0
+    dispatch_retries: int = 4
+
+    # Request hedging for slow calls
+    hedge: bool = False
+    hedge_percentile: float = 0.95
+    hedge_min_samples: int = 20
+    hedge_max_rate: float = 0.1
+
+    # Streamed responses with early validation
+    stream: bool = False
+    stream_retries: int = 2
+
+    # Code returned as fenced blocks instead of JSON-escaped tool input
+    raw_output: bool = False
+
+    # Identical requests answered once per process; spending stops at max_cost USD
+    response_cache: bool = True
+    response_cache_size: int = 10000
+    max_cost: Optional[float] = None
+
+    # Size-adaptive token budgets; max_tokens and thinking_budget above are the initial caps
+    adaptive_tokens: bool = True
+    stage_thinking_ratio: Dict[str, float] = field(
+        default_factory=lambda: {"describe": 0.25, "generate": 1.0, "analyze": 0.5}
+    )
+    stage_output_ratio: Dict[str, float] = field(
+        default_factory=lambda: {"describe": 0.2, "generate": 1.2, "analyze": 0.5}
+    )
+    stage_min_output: Dict[str, int] = field(
+        default_factory=lambda: {"describe": 1024, "generate": 2048, "analyze": 2048}
+    )
+    token_headroom: float = 1.5
+    max_output_tokens: int = 64000
+    max_escalations: int = 2
+
+    # Routing of small, simple files to a fast model
+    routing: bool = False
+    fast_model: str = "claude-3-5-haiku-20241022"
+    fast_stages: Tuple[str, ...] = ("describe", "generate")
+    route_fast_max_tokens: int = 1500
+    route_fast_max_branches: int = 8
 
     @classmethod
     def from_env(cls) -> "AppConfig":
         """Create config from environment variables."""
         output_dir = os.getenv("CODEDIFF_OUTPUT_DIR", ".codediff")
-        model = os.getenv("CODEDIFF_MODEL", "claude-3-7-sonnet-20250219")
+        model = os.getenv("CODEDIFF_MODEL", DEFAULT_MODEL)
+        fast_model = os.getenv("CODEDIFF_FAST_MODEL", "claude-3-5-haiku-20241022")
+        routing = os.getenv("CODEDIFF_ROUTING", "0") not in ("0", "false", "no")
+        store = os.getenv("CODEDIFF_STORE", "files")
+        io_workers = int(os.getenv("CODEDIFF_IO_WORKERS", "32"))
+        cpu_workers = int(os.getenv("CODEDIFF_CPU_WORKERS", str(os.cpu_count() or 1)))
+        max_connections = int(os.getenv("CODEDIFF_MAX_CONNECTIONS", "64"))
+        max_concurrency = int(os.getenv("CODEDIFF_MAX_CONCURRENCY", str(max_connections)))
+        pipeline = os.getenv("CODEDIFF_PIPELINE", "0") not in ("0", "false", "no")
+        http2 = os.getenv("CODEDIFF_HTTP2", "1") not in ("0", "false", "no")
+        hedge = os.getenv("CODEDIFF_HEDGE", "0") not in ("0", "false", "no")
+        stream = os.getenv("CODEDIFF_STREAM", "0") not in ("0", "false", "no")
+        raw_output = os.getenv("CODEDIFF_RAW_OUTPUT", "0") not in ("0", "false", "no")
+        adaptive_tokens = os.getenv("CODEDIFF_ADAPTIVE_TOKENS", "1") not in ("0", "false", "no")
+        response_cache = os.getenv("CODEDIFF_RESPONSE_CACHE", "1") not in ("0", "false", "no")
+        max_cost = float(os.environ["CODEDIFF_MAX_COST"]) if os.getenv("CODEDIFF_MAX_COST") else None
+        endpoints = tuple(spec for spec in os.getenv("CODEDIFF_API_KEYS", "").split(",") if spec.strip())
 
         return cls(
             output_dir=Path(output_dir),
             model=model,
+            store=store,
+            io_workers=io_workers,
+            cpu_workers=cpu_workers,
+            max_concurrency=max_concurrency,
+            pipeline=pipeline,
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            http2=http2,
+            endpoints=endpoints,
+            hedge=hedge,
+            stream=stream,
+            raw_output=raw_output,
+            response_cache=response_cache,
+            max_cost=max_cost,
+            adaptive_tokens=adaptive_tokens,
+            routing=routing,
+            fast_model=fast_model,
         )
 
 
@@ -42,36 +142,73 @@ class AppState:
             "cost": 0.0,
         }
     )
+    hedging: HedgeStats = field(default_factory=HedgeStats)
+    ttft: StageLatency = field(default_factory=StageLatency)
+    tokens: TokenPolicy = field(default_factory=TokenPolicy)
+    models: Dict[str, Dict] = field(default_factory=dict)
+    keys: Dict[str, Dict] = field(default_factory=dict)
+    raw_output: Dict[str, int] = field(default_factory=lambda: {"calls": 0, "fallbacks": 0})
 
 
 config = AppConfig.from_env()
 state = AppState()
 
 
-def update_usage_stats(completion_usage):
-    """Update cumulative usage statistics."""
+def usage_cost(completion_usage, model: Optional[str] = None) -> float:
+    """Calculate the cost of a single call from the pricing of its model.
+
+    Args:
+        completion_usage: Usage reported by the API
+        model: Model that served the call (default: config.model)
+
+    Returns:
+        Cost in USD
+    """
+    spec = model_spec(model or config.model)
+    input_cost = completion_usage.input_tokens * spec.input_price
+    cache_write_cost = (completion_usage.cache_creation_input_tokens or 0) * spec.cache_write_price
+    cache_hit_cost = (completion_usage.cache_read_input_tokens or 0) * spec.cache_read_price
+    output_cost = completion_usage.output_tokens * spec.output_price
+    return (input_cost + cache_write_cost + cache_hit_cost + output_cost) / 1_000_000
+
+
+def update_usage_stats(completion_usage, model: Optional[str] = None, key: Optional[str] = None):
+    """Update cumulative usage statistics.
+
+    Args:
+        completion_usage: Usage reported by the API
+        model: Model that served the call (default: config.model)
+        key: Name of the API endpoint that served the call
+    """
+    model = model or config.model
+
     # Update token counts
     state.total_usage["input_tokens"] += completion_usage.input_tokens
     state.total_usage["output_tokens"] += completion_usage.output_tokens
-    state.total_usage["cache_creation_input_tokens"] += completion_usage.cache_creation_input_tokens
-    state.total_usage["cache_read_input_tokens"] += completion_usage.cache_read_input_tokens
+    state.total_usage["cache_creation_input_tokens"] += completion_usage.cache_creation_input_tokens or 0
+    state.total_usage["cache_read_input_tokens"] += completion_usage.cache_read_input_tokens or 0
 
-    # Calculate costs based on Claude 3.7 Sonnet pricing
-    input_cost = completion_usage.input_tokens * 0.000003
-    cache_write_cost = completion_usage.cache_creation_input_tokens * 0.00000375
-    cache_hit_cost = completion_usage.cache_read_input_tokens * 0.0000003
-    output_cost = completion_usage.output_tokens * 0.000015
-    total_cost = input_cost + cache_write_cost + cache_hit_cost + output_cost
+    # Calculate costs based on the pricing of the model that served the call
+    total_cost = usage_cost(completion_usage, model)
 
-    # Add to total cost
+    # Add to total cost, overall and per model
     state.total_usage["cost"] += total_cost
+    per_model = state.models.setdefault(model, {"calls": 0, "cost": 0.0})
+    per_model["calls"] += 1
+    per_model["cost"] += total_cost
+    if key is not None:
+        per_key = state.keys.setdefault(key, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "cost": 0.0})
+        per_key["calls"] += 1
+        per_key["input_tokens"] += completion_usage.input_tokens
+        per_key["output_tokens"] += completion_usage.output_tokens
+        per_key["cost"] += total_cost
 
     # Log current call usage
     logger.info(
-        f"Call usage: {completion_usage.input_tokens:,} in / "
+        f"Call usage ({model}): {completion_usage.input_tokens:,} in / "
         f"{completion_usage.output_tokens:,} out / "
-        f"cache: {completion_usage.cache_creation_input_tokens:,} write / "
-        f"{completion_usage.cache_read_input_tokens:,} read / "
+        f"cache: {completion_usage.cache_creation_input_tokens or 0:,} write / "
+        f"{completion_usage.cache_read_input_tokens or 0:,} read / "
         f"${total_cost:.4f}"
     )
 
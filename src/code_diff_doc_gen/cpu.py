@@ -0,0 +1,209 @@
+"""Process pool for CPU-bound local work.
+
+Parsing and scoring source code holds the GIL, so doing it on the event loop
+or the I/O thread pool delays every in-flight API call on large trees. Such
+work runs in a pool of worker processes instead. Calls made at about the same
+time are sent to the pool together in chunks, so pickling and the round trip
+between processes are paid once per chunk rather than once per call.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple, TypeVar
+
+from .config import config
+from .fileio import run_io
+
+T = TypeVar("T")
+
+_executor: Optional[ProcessPoolExecutor] = None
+_batchers: Dict[Callable, "_Batcher"] = {}
+_started = time.monotonic()
+
+
+@dataclass
+class PoolStats:
+    """Work done by the CPU pool."""
+
+    calls: int = 0
+    chunks: int = 0
+    worker_seconds: float = 0.0
+
+
+stats = PoolStats()
+
+
+def cpu_executor() -> Optional[ProcessPoolExecutor]:
+    """Get the process pool for CPU-bound work.
+
+    Workers are started by a fork server (or spawned where that is not
+    available), never forked from this process, whose threads may hold locks.
+
+    Returns:
+        Shared executor sized by config.cpu_workers, or None if the pool is disabled
+    """
+    global _executor
+    if config.cpu_workers <= 0:
+        return None
+    if _executor is None:
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _executor = ProcessPoolExecutor(max_workers=config.cpu_workers, mp_context=multiprocessing.get_context(method))
+    return _executor
+
+
+def shutdown_cpu_executor() -> None:
+    """Stop the worker processes of the pool, if it was started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+
+
+def _apply_chunk(func: Callable[..., T], chunk: Sequence[Tuple]) -> Tuple[List[Tuple[bool, Any]], float]:
+    """Run a function over a chunk of argument tuples in a worker process.
+
+    Returns:
+        Per-call ``(ok, result or exception)`` pairs and the CPU seconds used
+    """
+    start = time.process_time()
+    results = []
+    for args in chunk:
+        try:
+            results.append((True, func(*args)))
+        except Exception as e:
+            results.append((False, e))
+    return results, time.process_time() - start
+
+
+async def _run_chunk(func: Callable[..., T], chunk: Sequence[Tuple]) -> List[Tuple[bool, Any]]:
+    global _executor
+    executor = cpu_executor()
+    if executor is None:
+        results, _ = await run_io(_apply_chunk, func, chunk)
+        return results
+
+    try:
+        results, seconds = await asyncio.get_running_loop().run_in_executor(executor, _apply_chunk, func, chunk)
+    except BrokenProcessPool:
+        # A crashed worker breaks the pool; start a new one for later calls
+        _executor = None
+        raise
+    stats.calls += len(chunk)
+    stats.chunks += 1
+    stats.worker_seconds += seconds
+    return results
+
+
+async def map_cpu(func: Callable[..., T], items: Iterable[Tuple], chunk_size: Optional[int] = None) -> List[T]:
+    """Apply a function to many argument tuples on the CPU pool.
+
+    Args:
+        func: Picklable module-level function
+        items: Argument tuples, one per call
+        chunk_size: Calls sent to a worker at once (default: config.cpu_chunk_size)
+
+    Returns:
+        Results in input order
+
+    Raises:
+        Exception: The first exception raised by a call
+    """
+    items = list(items)
+    size = max(1, chunk_size or config.cpu_chunk_size)
+    chunks = await asyncio.gather(*(_run_chunk(func, items[i : i + size]) for i in range(0, len(items), size)))
+    results = []
+    for ok, value in (result for chunk in chunks for result in chunk):
+        if not ok:
+            raise value
+        results.append(value)
+    return results
+
+
+class _Batcher:
+    """Collect concurrent calls of one function into chunks."""
+
+    def __init__(self, func: Callable, loop: asyncio.AbstractEventLoop):
+        self.func = func
+        self.loop = loop
+        self.pending: List[Tuple[Tuple, asyncio.Future]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.tasks: Set[asyncio.Task] = set()
+
+    def add(self, args: Tuple) -> asyncio.Future:
+        future = self.loop.create_future()
+        self.pending.append((args, future))
+        if len(self.pending) >= config.cpu_chunk_size:
+            self.flush()
+        elif self.timer is None:
+            self.timer = self.loop.call_later(config.cpu_batch_delay, self.flush)
+        return future
+
+    def flush(self) -> None:
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.pending = self.pending, []
+        if batch:
+            task = self.loop.create_task(self._submit(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def _submit(self, batch: List[Tuple[Tuple, asyncio.Future]]) -> None:
+        try:
+            results = await _run_chunk(self.func, [args for args, _ in batch])
+        except Exception as e:
+            results = [(False, e)] * len(batch)
+        for (_, future), (ok, value) in zip(batch, results):
+            if future.done():
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+
+async def run_cpu(func: Callable[..., T], *args: Any) -> T:
+    """Run one CPU-bound call on the pool.
+
+    Calls of the same function arriving within ``config.cpu_batch_delay`` of
+    each other are sent to a worker as one chunk. With the pool disabled
+    (``cpu_workers`` 0), calls run on the I/O thread pool.
+
+    Args:
+        func: Picklable module-level function
+        *args: Picklable positional arguments
+
+    Returns:
+        Result of the call
+    """
+    loop = asyncio.get_running_loop()
+    batcher = _batchers.get(func)
+    if batcher is None or batcher.loop is not loop:
+        batcher = _batchers[func] = _Batcher(func, loop)
+    return await batcher.add(args)
+
+
+def cpu_summary() -> Dict[str, float]:
+    """Summarize CPU use of this process and the pool since startup.
+
+    Returns:
+        CPU seconds of this process (all threads) and of the pool workers, wall
+        seconds, pool call and chunk counts, and the share of all cores used
+    """
+    wall = time.monotonic() - _started
+    process = time.process_time()
+    cores = os.cpu_count() or 1
+    return {
+        "wall_seconds": round(wall, 2),
+        "process_seconds": round(process, 2),
+        "pool_seconds": round(stats.worker_seconds, 2),
+        "pool_calls": stats.calls,
+        "pool_chunks": stats.chunks,
+        "cores": cores,
+        "utilization": round((process + stats.worker_seconds) / (wall * cores), 4) if wall else 0.0,
+    }
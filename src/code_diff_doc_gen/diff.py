@@ -5,146 +5,200 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Optional
 from loguru import logger
-from tqdm.asyncio import tqdm
 
+from .config import config
+from .cpu import run_cpu
+from .fileio import run_io
+from .analyses import format_pair, hash_analysis, record_analysis
+from .journal import Journal
 from .llm import analyze_code_differences
+from .processor import detect_language, discover_source_files
+from .results import StatusCounts
+from .scheduler import CostModel, run_scheduled
+from .store import WorkspaceStore, artifact_path, workspace_store
 
 
-@dataclass
+@dataclass(slots=True)
 class FileDiff:
-    """Represents differences between original and generated files."""
+    """Represents differences between original and generated files.
+
+    Only the pair count is kept; the analysis itself stays in the store and
+    can be loaded with ``read_analysis``.
+    """
     
     original_path: Path
     generated_path: Path
-    analysis: str
+    pairs: int = 0
     error: Optional[str] = None
     skipped: bool = False
+    analysis_ns: str = ""
+    key: str = ""
+
+    def read_analysis(self, store: WorkspaceStore) -> Optional[str]:
+        """Read the markdown analysis for this file from the store."""
+        return store.read(self.analysis_ns, self.key) if self.analysis_ns else None
 
 
 async def _compare_single_file(
     original_path: Path,
-    generated_path: Path,
-    analysis_dir: Path,
+    relative_path: Path,
+    round_num: int,
+    store: WorkspaceStore,
+    journal: Optional[Journal] = None,
 ) -> FileDiff:
     """Compare a single pair of files.
     
     Args:
         original_path: Path to original file
-        generated_path: Path to generated file
-        analysis_dir: Directory to store analysis files
+        relative_path: Path of the file relative to the source directory
+        round_num: Generation round number
+        store: Workspace store holding generated code and analyses
+        journal: Optional run journal to record completion in
         
     Returns:
         FileDiff containing analysis results
     """
+    key = relative_path.as_posix()
+    generated_ns = f"generated/round_{round_num}"
+    analysis_ns = f"analysis/round_{round_num}"
+    generated_path = store.workspace_dir / artifact_path(generated_ns, key)
+
     try:
-        if not generated_path.exists():
+        generated_mtime = await run_io(store.mtime, generated_ns, key)
+        if generated_mtime is None:
             return FileDiff(
                 original_path=original_path,
                 generated_path=generated_path,
-                analysis="",
                 error=f"Generated file not found: {generated_path}",
             )
 
         # Check if analysis can be skipped
-        analysis_file = (
-            analysis_dir / original_path.parent / f"{original_path.name}.analysis"
-        )
-        
-        if analysis_file.exists():
-            analysis_mtime = analysis_file.stat().st_mtime
-            original_mtime = original_path.stat().st_mtime
-            generated_mtime = generated_path.stat().st_mtime
+        analysis_mtime = await run_io(store.mtime, analysis_ns, key)
+        if analysis_mtime is not None:
+            original_mtime = (await run_io(original_path.stat)).st_mtime
 
             if analysis_mtime > original_mtime and analysis_mtime > generated_mtime:
-                analysis = analysis_file.read_text()
+                if journal:
+                    await run_io(journal.record, "analyze", key, round_num)
                 return FileDiff(
                     original_path=original_path,
                     generated_path=generated_path,
-                    analysis=analysis,
                     skipped=True,
+                    analysis_ns=analysis_ns,
+                    key=key,
                 )
 
         # Read file contents
-        original_content = original_path.read_text(encoding="utf-8")
-        generated_content = generated_path.read_text(encoding="utf-8")
+        original_content = await run_io(original_path.read_text, encoding="utf-8")
+        generated_content = await run_io(store.read, generated_ns, key)
 
         # Generate analysis
         result = await analyze_code_differences(original_content, generated_content)
         
         # Format analysis as markdown code blocks
-        analysis = ""
-        for pair in result.pairs:
-            analysis += f"```\n// Bad Code\n{pair.bad_code}\n```\n\n```\n// Good Code\n{pair.good_code}\n```\n\n"
-
-        # Save analysis to file
-        analysis_file.parent.mkdir(parents=True, exist_ok=True)
-        analysis_file.write_text(analysis)
+        analysis = "".join(format_pair(pair.bad_code, pair.good_code) for pair in result.pairs)
+
+        # Hash contents on the CPU pool, then save structured records and the readable analysis
+        hashes = await run_cpu(
+            hash_analysis,
+            original_content,
+            generated_content,
+            [(pair.bad_code, pair.good_code) for pair in result.pairs],
+        )
+        await run_io(
+            record_analysis,
+            store,
+            round_num,
+            key,
+            detect_language(original_path),
+            original_content,
+            generated_content,
+            result.pairs,
+            hashes,
+        )
+        await run_io(store.write, analysis_ns, key, analysis)
+        if journal:
+            await run_io(journal.record, "analyze", key, round_num)
 
         return FileDiff(
             original_path=original_path,
             generated_path=generated_path,
-            analysis=analysis,
+            pairs=len(result.pairs),
+            analysis_ns=analysis_ns,
+            key=key,
         )
     except Exception as e:
         logger.error(f"Error comparing {original_path}: {e}")
         return FileDiff(
             original_path=original_path,
             generated_path=generated_path,
-            analysis="",
             error=str(e),
         )
 
 
-async def compare_files(source_dir: Path, round_num: int, output_dir: Optional[Path] = None) -> None:
+async def compare_files(
+    source_dir: Path,
+    round_num: int,
+    output_dir: Optional[Path] = None,
+    files: Optional[List[Path]] = None,
+    journal: Optional[Journal] = None,
+    store: Optional[WorkspaceStore] = None,
+    costs: Optional[CostModel] = None,
+) -> StatusCounts:
     """Compare original and generated files in parallel and save results.
     
     Args:
         source_dir: Directory containing original source files
         round_num: Generation round number
         output_dir: Custom output directory (default: config.output_dir)
+        files: Explicit list of source files to compare (default: discover all)
+        journal: Optional run journal to record completion in
+        store: Workspace store (default: opened from output directory for the call)
+        costs: Cost model used to start the most expensive files first
+
+    Returns:
+        Counts of analyzed, skipped and failed files
         
     Raises:
         FileNotFoundError: If required directories/files don't exist
     """
     workspace_dir = output_dir or config.output_dir
-    generated_dir = workspace_dir / "generated" / f"round_{round_num}"
-    
-    if not generated_dir.exists():
-        raise FileNotFoundError(f"No generated files found for round {round_num}")
-
-    # Create analysis directory for this round
-    analysis_dir = workspace_dir / "analysis" / f"round_{round_num}"
-    analysis_dir.mkdir(parents=True, exist_ok=True)
 
-    # Find all source files
-    source_files = list(source_dir.rglob("*"))
-    source_files = [
-        f for f in source_files if f.is_file() and not f.name.startswith(".")
-    ]
-
-    if not source_files:
-        raise FileNotFoundError(f"No source files found in {source_dir}")
-
-    logger.info(f"Comparing {len(source_files)} files...")
-    
-    # Create tasks for file comparisons with progress bar
-    tasks = [
-        _compare_single_file(
-            source_file,
-            generated_dir / source_file.relative_to(source_dir),
-            analysis_dir,
+    async with workspace_store(workspace_dir, store) as store:
+        if not await run_io(store.exists, f"generated/round_{round_num}"):
+            raise FileNotFoundError(f"No generated files found for round {round_num}")
+
+        # Find all source files
+        if files is None:
+            source_files = await run_io(discover_source_files, source_dir)
+            if not source_files:
+                raise FileNotFoundError(f"No source files found in {source_dir}")
+        else:
+            source_files = files
+
+        logger.info(f"Comparing {len(source_files)} files...")
+
+        # Run comparisons largest-first with progress reporting
+        costs = costs or CostModel()
+
+        def key(path: Path) -> str:
+            return path.relative_to(source_dir).as_posix()
+
+        results = await run_scheduled(
+            source_files,
+            lambda f: _compare_single_file(f, f.relative_to(source_dir), round_num, store, journal),
+            lambda f: costs.estimate("analyze", key(f)),
+            config.max_concurrency,
+            "Analyzing differences",
+            lambda f, seconds: costs.observe("analyze", key(f), seconds, round_num),
         )
-        for source_file in source_files
-    ]
-    
-    # Run all comparisons concurrently with progress reporting
-    results = await tqdm.gather(*tasks, desc="Analyzing differences")
+        await run_io(costs.save, store)
+        await run_io(store.flush)
 
     # Count results by status
-    skipped = len([r for r in results if r.skipped])
-    analyzed = len([r for r in results if not r.skipped and not r.error])
-    errors = len([r for r in results if r.error])
+    counts = StatusCounts("error" if r.error else "skipped" if r.skipped else "analyzed" for r in results)
 
     logger.info(
-        f"Analysis completed: {analyzed} analyzed, {skipped} skipped, {errors} errors"
-    )
\ No newline at end of file
+        f"Analysis completed: {counts['analyzed']} analyzed, {counts['skipped']} skipped, {counts['error']} errors"
+    )
+    return counts
\ No newline at end of file
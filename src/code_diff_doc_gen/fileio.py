@@ -0,0 +1,100 @@
+"""Crash-safe and non-blocking file helpers for workspace artifacts."""
+
+import asyncio
+import contextlib
+import functools
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, TextIO, TypeVar
+
+from .config import config
+
+T = TypeVar("T")
+
+_io_executor: Optional[ThreadPoolExecutor] = None
+
+
+def io_executor() -> ThreadPoolExecutor:
+    """Get the bounded thread pool used for blocking file I/O.
+
+    Returns:
+        Shared executor sized by config.io_workers
+    """
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=config.io_workers, thread_name_prefix="codediff-io")
+    return _io_executor
+
+
+async def run_io(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking I/O call on the I/O thread pool.
+
+    Coroutines must route every filesystem and store call through this helper
+    so that slow storage (e.g. NFS) never blocks in-flight API calls.
+
+    Args:
+        func: Blocking callable
+        *args: Positional arguments for the callable
+        **kwargs: Keyword arguments for the callable
+
+    Returns:
+        Result of the callable
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor(), functools.partial(func, *args, **kwargs))
+
+
+@contextlib.contextmanager
+def atomic_writer(path: Path, encoding: str = "utf-8", binary: bool = False) -> Iterator[TextIO]:
+    """Open a stream whose content replaces a file atomically on close.
+
+    The content is written to a hidden temporary file in the destination
+    directory, flushed to disk and then renamed over the target path. If the
+    block raises, the temporary file is removed and the target is untouched.
+
+    Args:
+        path: Destination file path
+        encoding: Text encoding (default: utf-8)
+        binary: Open a byte stream instead of a text stream
+
+    Yields:
+        Writable text (or byte) stream
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") if binary else os.fdopen(fd, "w", encoding=encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_name)
+        raise
+
+
+def atomic_write_text(path: Path, content: str, encoding: str = "utf-8") -> None:
+    """Write text to a file so that readers never observe a partial write.
+
+    Args:
+        path: Destination file path
+        content: Text content to write
+        encoding: Text encoding (default: utf-8)
+    """
+    with atomic_writer(path, encoding) as f:
+        f.write(content)
+
+
+def atomic_write_bytes(path: Path, content: bytes) -> None:
+    """Write bytes to a file so that readers never observe a partial write.
+
+    Args:
+        path: Destination file path
+        content: Bytes to write
+    """
+    with atomic_writer(path, binary=True) as f:
+        f.write(content)
@@ -1,140 +1,178 @@
 """Generate code from descriptions."""
 
 import asyncio
-import json
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import List, Optional
 from loguru import logger
-from tqdm.asyncio import tqdm
 
 from .config import config
+from .cpu import run_cpu
+from .fileio import run_io
+from .journal import Journal
 from .llm import generate_code_from_description, load_system_prompt
+from .processor import discover_source_files
+from .results import FileResult, StatusCounts
+from .routing import score_complexity
+from .scheduler import CostModel, run_scheduled
+from .store import WorkspaceStore, workspace_store
+from .streaming import PartialWriter
 
 
 async def generate_file(
     source_file: Path,
     round_num: int,
     prompt: str,
-    descriptions_dir: Path,
+    store: WorkspaceStore,
     source_dir: Path,
-    output_dir: Path,
-) -> Dict[str, str]:
+    journal: Optional[Journal] = None,
+) -> FileResult:
     """Generate code for a single file.
     
     Args:
         source_file: Path to the original source file
         round_num: Generation round number
         prompt: System prompt for generation
-        descriptions_dir: Directory where descriptions are stored
+        store: Workspace store holding descriptions and generated code
         source_dir: Base directory of source files
-        output_dir: Base output directory
+        journal: Optional run journal to record completion in
         
     Returns:
-        Dict containing file path, generated code, and status
+        Status record; the generated code stays in the store
     """
-    # Compute corresponding description file path
-    desc_file = (
-        descriptions_dir
-        / source_file.relative_to(source_dir).parent
-        / f"{source_file.name}.desc"
-    )
-
-    if not desc_file.exists():
-        logger.warning(f"Description file not found: {desc_file}")
-        return {
-            "path": str(source_file),
-            "status": "error",
-            "error": "Description file not found",
-        }
-
-    # Determine output path in generated directory
-    output_path = output_dir / "generated" / f"round_{round_num}" / source_file.relative_to(source_dir)
-
-    # Skip if generated file already exists
-    if output_path.exists():
-        logger.debug(f"Skipping existing file: {source_file}")
-        return {
-            "path": str(source_file),
-            "status": "skipped",
-            "generated": output_path.read_text(),
-        }
-
-    # Generate code from description
-    description = desc_file.read_text()
-    result = await generate_code_from_description(description, str(source_file), prompt)
-    implementation = result.implementation
-
-    # Save generated code
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    output_path.write_text(implementation)
-
-    return {
-        "path": str(source_file),
-        "status": "generated",
-        "generated": implementation,
-    }
-
-
-async def generate_code(source_dir: Path, round_num: int, output_dir: Optional[Path] = None) -> List[Dict[str, str]]:
+    key = source_file.relative_to(source_dir).as_posix()
+    namespace = f"generated/round_{round_num}"
+
+    try:
+        # Skip if generated file exists and is not older than its description (writes are atomic, so it is complete)
+        generated_mtime = await run_io(store.mtime, namespace, key)
+        if generated_mtime is not None and generated_mtime >= (await run_io(store.mtime, "descriptions", key) or 0):
+            logger.debug(f"Skipping existing file: {source_file}")
+            if journal:
+                await run_io(journal.record, "generate", key, round_num)
+            return FileResult(str(source_file), key, "skipped", namespace)
+
+        description = await run_io(store.read, "descriptions", key)
+        if description is None:
+            logger.warning(f"Description not found for: {source_file}")
+            return FileResult(str(source_file), key, "error", error="Description file not found")
+
+        # Generate code from description, spooling the implementation to a partial file while it streams
+        partial = None
+        if config.stream:
+            partial = PartialWriter(store.workspace_dir / "partial" / namespace / f"{key}.partial", "implementation")
+        source_chars = (await run_io(source_file.stat)).st_size
+        complexity = None
+        if config.routing:
+            # Read on the I/O pool, parsed on the CPU pool as in the describe stage
+            content = await run_io(source_file.read_text, encoding="utf-8", errors="replace")
+            complexity = await run_cpu(score_complexity, content, source_file.suffix)
+        result = await generate_code_from_description(
+            description, str(source_file), prompt, partial, source_chars, complexity
+        )
+
+        # Save generated code
+        await run_io(store.write, namespace, key, result.implementation)
+        if partial:
+            await partial.discard()
+        if journal:
+            await run_io(journal.record, "generate", key, round_num)
+
+        return FileResult(str(source_file), key, "generated", namespace)
+    except Exception as e:
+        # Budget and API errors fail this file only, so the round still finishes and writes its prompt
+        logger.error(f"Error generating {source_file}: {e}")
+        return FileResult(str(source_file), key, "error", error=str(e))
+
+
+async def generate_code(
+    source_dir: Path,
+    round_num: int,
+    output_dir: Optional[Path] = None,
+    files: Optional[List[Path]] = None,
+    journal: Optional[Journal] = None,
+    store: Optional[WorkspaceStore] = None,
+    costs: Optional[CostModel] = None,
+) -> List[FileResult]:
     """Generate code for all source files in parallel.
     
     Args:
         source_dir: Directory containing original source files
         round_num: Generation round number
         output_dir: Custom output directory (default: config.output_dir)
+        files: Explicit list of source files to generate (default: discover all)
+        journal: Optional run journal to record completion in
+        store: Workspace store (default: opened from output directory for the call)
+        costs: Cost model used to start the most expensive files first
         
     Returns:
-        List of generated file data
+        Status records for the generated files
     """
     workspace_dir = output_dir or config.output_dir
-    descriptions_dir = workspace_dir / "descriptions"
-    
-    if not descriptions_dir.exists():
-        raise FileNotFoundError("No descriptions found. Run process first.")
 
-    # Get all source files
-    source_files = list(source_dir.rglob("*"))
-    source_files = [
-        f for f in source_files if f.is_file() and not f.name.startswith(".")
-    ]
+    async with workspace_store(workspace_dir, store) as store:
+        if not await run_io(store.exists, "descriptions"):
+            raise FileNotFoundError("No descriptions found. Run process first.")
 
-    if not source_files:
-        raise FileNotFoundError(f"No source files found in {source_dir}")
+        # Get all source files
+        if files is None:
+            source_files = await run_io(discover_source_files, source_dir)
+            if not source_files:
+                raise FileNotFoundError(f"No source files found in {source_dir}")
+        else:
+            source_files = files
 
-    # Load system prompt
-    prompt = load_system_prompt(round_num, workspace_dir)
-    logger.info(f"Using system prompt for round {round_num}")
+        # Load system prompt
+        prompt = await run_io(load_system_prompt, round_num, workspace_dir, store)
+        logger.info(f"Using system prompt for round {round_num}")
 
-    # Generate code with progress bar
-    tasks = [
-        generate_file(f, round_num, prompt, descriptions_dir, source_dir, workspace_dir)
-        for f in source_files
-    ]
-    results = await tqdm.gather(*tasks, desc="Generating code")
+        # Generate code largest-first with progress bar
+        costs = costs or CostModel()
 
-    # Filter out failures
-    generated = [r for r in results if r is not None]
+        def key(path: Path) -> str:
+            return path.relative_to(source_dir).as_posix()
 
-    # Count genuinely generated files
-    newly_generated = len([r for r in generated if r["status"] == "generated"])
-    skipped = len([r for r in generated if r["status"] == "skipped"])
-    errors = len([r for r in generated if r["status"] == "error"])
+        results = await run_scheduled(
+            source_files,
+            lambda f: generate_file(f, round_num, prompt, store, source_dir, journal),
+            lambda f: costs.estimate("generate", key(f)),
+            config.max_concurrency,
+            "Generating code",
+            lambda f, seconds: costs.observe("generate", key(f), seconds, round_num),
+        )
+        await run_io(costs.save, store)
+
+        # Count genuinely generated files
+        counts = StatusCounts(r.status for r in results)
+        await write_generation_metadata(store, round_num, len(source_files), counts)
+    return results
+
+
+async def write_generation_metadata(store: WorkspaceStore, round_num: int, total: int, counts: StatusCounts) -> None:
+    """Save and log the outcome of a generation round.
+
+    Args:
+        store: Workspace store holding generated code
+        round_num: Generation round number
+        total: Number of files scheduled for generation
+        counts: Counts of generated, skipped and failed files
+    """
+    newly_generated = counts["generated"]
+    skipped = counts["skipped"]
+    errors = counts["error"]
 
     # Save metadata
     meta = {
         "round": round_num,
-        "total": len(source_files),
-        "successful": len(generated) - errors,
+        "total": total,
+        "successful": counts.total - errors,
         "newly_generated": newly_generated,
         "skipped": skipped,
         "errors": errors,
     }
     
-    meta_file = workspace_dir / "generated" / f"round_{round_num}" / "metadata.json"
-    meta_file.parent.mkdir(parents=True, exist_ok=True)
-    meta_file.write_text(json.dumps(meta, indent=2))
+    await run_io(store.write_meta, f"generated/round_{round_num}/metadata.json", meta)
+    await run_io(store.flush)
 
     logger.info(
         f"Generated {newly_generated} new files, skipped {skipped} existing files, {errors} errors"
     )
-    return generated
\ No newline at end of file
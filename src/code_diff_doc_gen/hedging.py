@@ -0,0 +1,138 @@
+"""Latency tracking and request hedging for slow API calls.
+
+A call that runs past a high percentile of observed latency for its stage
+and size class gets a duplicate request. The first valid response wins and
+the other request is cancelled.
+"""
+
+import asyncio
+import math
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+
+def size_class(chars: int) -> int:
+    """Bucket a prompt size into a power-of-two class of estimated tokens.
+
+    Args:
+        chars: Prompt length in characters
+
+    Returns:
+        Size class index
+    """
+    return int(math.log2(max(1, chars // 4)))
+
+
+class LatencyTracker:
+    """Sliding window of call latencies per stage and size class."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """Initialize tracker.
+
+        Args:
+            window: Number of recent latencies kept per class
+            min_samples: Samples required before percentiles are reported
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[Tuple[str, int], Deque[float]] = {}
+
+    def observe(self, stage: str, size: int, seconds: float) -> None:
+        """Record the latency of a completed call.
+
+        Args:
+            stage: Pipeline stage of the call
+            size: Size class of the call
+            seconds: Observed latency
+        """
+        self._samples.setdefault((stage, size), deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, stage: str, size: int, q: float) -> Optional[float]:
+        """Get a latency percentile for a stage and size class.
+
+        Args:
+            stage: Pipeline stage
+            size: Size class
+            q: Percentile as a fraction (e.g. 0.95)
+
+        Returns:
+            Latency in seconds, or None if there are too few samples
+        """
+        samples = self._samples.get((stage, size))
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+@dataclass
+class HedgeStats:
+    """Counters for hedged requests and their extra spend."""
+
+    calls: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0
+    extra_cost: float = 0.0
+
+    @property
+    def rate(self) -> float:
+        """Fraction of calls that issued a hedge."""
+        return self.hedged / self.calls if self.calls else 0.0
+
+
+async def hedged_call(
+    make_call: Callable[[], Awaitable[T]],
+    delay: Optional[float],
+    stats: HedgeStats,
+    max_rate: float,
+) -> Tuple[T, bool]:
+    """Run a call, issuing one duplicate if it is still pending after a delay.
+
+    Args:
+        make_call: Factory creating a fresh request coroutine
+        delay: Seconds to wait before hedging (None disables hedging)
+        stats: Hedge counters to update
+        max_rate: Maximum fraction of calls allowed to hedge
+
+    Returns:
+        Tuple of the first valid result and whether a hedge was issued
+
+    Raises:
+        Exception: The last error if every issued request failed
+    """
+    stats.calls += 1
+    primary = asyncio.ensure_future(make_call())
+    if delay is None:
+        return await primary, False
+
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+    except asyncio.CancelledError:
+        primary.cancel()
+        raise
+    if done or stats.hedged + 1 > max_rate * stats.calls:
+        return await primary, False
+
+    stats.hedged += 1
+    logger.debug(f"Hedging call still pending after {delay:.1f}s")
+    hedge = asyncio.ensure_future(make_call())
+    pending = {primary, hedge}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        stats.hedge_wins += 1
+                    return task.result(), True
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
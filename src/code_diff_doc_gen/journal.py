@@ -0,0 +1,91 @@
+"""Append-only run journal used to resume interrupted runs."""
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set, Tuple
+
+from .store import WorkspaceStore
+
+
+@dataclass
+class JournalState:
+    """Completion state reconstructed from a journal.
+
+    Completions only count for the plan they were recorded under, so files
+    finished by an earlier run are checked again after a new plan.
+    """
+
+    plans: Dict[int, List[str]] = field(default_factory=dict)
+    done: Set[Tuple[str, Optional[int], str]] = field(default_factory=set)
+
+    def pending(self, stage: str, round_num: Optional[int], paths: List[str]) -> List[str]:
+        """Filter paths down to those not yet completed for a stage.
+
+        Args:
+            stage: Pipeline stage name
+            round_num: Generation round (None for round-independent stages)
+            paths: Relative source paths to check
+
+        Returns:
+            Paths that still need work, in input order
+        """
+        return [p for p in paths if (stage, round_num, p) not in self.done]
+
+
+class Journal:
+    """Append-only journal of per-file, per-stage completion.
+
+    Entries are appended to the ``journal`` record log of the workspace store.
+    With the file backend each entry is a self-contained JSON line, so a crash
+    can at worst leave a truncated final line, which is ignored on load. Each
+    plan starts a new journal, so replaying it costs no more than the run it
+    resumes.
+    """
+
+    def __init__(self, store: WorkspaceStore):
+        """Initialize journal.
+
+        Args:
+            store: Workspace store holding the journal
+        """
+        self.store = store
+
+    def _append(self, entry: Dict) -> None:
+        """Append a single entry to the journal."""
+        self.store.append_record("journal", entry)
+
+    def record_plan(self, round_num: int, paths: List[str]) -> None:
+        """Record the discovered file set for a round, dropping the entries of earlier runs.
+
+        Args:
+            round_num: Generation round number
+            paths: Source paths relative to the source directory
+        """
+        self.store.clear_records("journal")
+        self._append({"event": "plan", "round": round_num, "files": paths, "ts": time.time()})
+
+    def record(self, stage: str, path: str, round_num: Optional[int] = None) -> None:
+        """Record completion of a stage for a single file.
+
+        Args:
+            stage: Pipeline stage name
+            path: Source path relative to the source directory
+            round_num: Generation round (None for round-independent stages)
+        """
+        self._append({"event": "done", "stage": stage, "round": round_num, "path": path, "ts": time.time()})
+
+    def load(self) -> JournalState:
+        """Replay the journal into a completion state.
+
+        Returns:
+            Reconstructed journal state (empty if no journal exists)
+        """
+        state = JournalState()
+        for entry in self.store.iter_records("journal"):
+            if entry.get("event") == "plan":
+                state.plans[entry["round"]] = entry["files"]
+                state.done.clear()
+            elif entry.get("event") == "done":
+                state.done.add((entry["stage"], entry["round"], entry["path"]))
+
+        return state
@@ -0,0 +1,189 @@
+"""Pool of API keys and endpoints with least-loaded dispatch.
+
+Each call goes to the endpoint with the fewest calls in flight. Rate-limit
+headers of every response are tracked per key; a key that is throttled (429),
+overloaded (529) or out of requests for the current window cools down until
+the server says it may be used again, and calls move to the other keys.
+"""
+
+import asyncio
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from loguru import logger
+
+THROTTLE_STATUSES = (429, 529)
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """An API key and the base URL it is used with."""
+
+    name: str
+    api_key: Optional[str]
+    base_url: Optional[str] = None
+
+
+@dataclass
+class KeyStats:
+    """Load and rate-limit state of one endpoint."""
+
+    calls: int = 0
+    in_flight: int = 0
+    throttled: int = 0
+    requests_remaining: Optional[int] = None
+    tokens_remaining: Optional[int] = None
+    cooldown_until: float = 0.0
+
+
+def parse_endpoints(specs: Iterable[str], default_key: Optional[str] = None) -> List[Endpoint]:
+    """Parse endpoint specifications.
+
+    Args:
+        specs: Endpoints as ``key`` or ``key@base_url``
+        default_key: Key used when no endpoints are given
+
+    Returns:
+        Endpoints, a single default-key endpoint if ``specs`` is empty
+
+    Raises:
+        ValueError: If a key appears twice
+    """
+    endpoints = []
+    for spec in specs:
+        spec = spec.strip()
+        if not spec:
+            continue
+        api_key, _, base_url = spec.partition("@")
+        host = urlparse(base_url).netloc if base_url else ""
+        name = f"...{api_key[-4:]}" + (f"@{host}" if host else "")
+        endpoints.append(Endpoint(name, api_key, base_url or None))
+    if not endpoints:
+        return [Endpoint("default", default_key)]
+    if len({e.api_key for e in endpoints}) < len(endpoints):
+        raise ValueError("Each API key may only be listed once")
+    return endpoints
+
+
+def _reset_delay(value: Optional[str], now: float) -> Optional[float]:
+    """Seconds until an RFC 3339 rate-limit reset time."""
+    if not value:
+        return None
+    try:
+        reset = datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+    return max(0.0, reset - now)
+
+
+def _int_header(headers, name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class KeyPool:
+    """Least-loaded dispatch over several API endpoints."""
+
+    def __init__(self, endpoints: List[Endpoint], cooldown: float = 30.0):
+        """Initialize pool.
+
+        Args:
+            endpoints: Endpoints to dispatch to
+            cooldown: Seconds a throttled key rests when the server gives no retry time
+        """
+        self.endpoints = endpoints
+        self.cooldown_seconds = cooldown
+        self.stats: Dict[str, KeyStats] = {e.name: KeyStats() for e in endpoints}
+        self._by_key = {e.api_key: e for e in endpoints}
+
+    def __len__(self) -> int:
+        return len(self.endpoints)
+
+    def pick(self, now: Optional[float] = None) -> Optional[Endpoint]:
+        """Choose the least-loaded endpoint that is not cooling down.
+
+        Returns:
+            Endpoint, or None if every key is cooling down
+        """
+        now = time.time() if now is None else now
+        ready = [e for e in self.endpoints if self.stats[e.name].cooldown_until <= now]
+        if not ready:
+            return None
+        return min(ready, key=lambda e: (self.stats[e.name].in_flight, self.stats[e.name].calls))
+
+    async def acquire(self) -> Endpoint:
+        """Take the least-loaded endpoint, waiting while every key cools down."""
+        while True:
+            now = time.time()
+            endpoint = self.pick(now)
+            if endpoint is not None:
+                stats = self.stats[endpoint.name]
+                stats.in_flight += 1
+                stats.calls += 1
+                return endpoint
+            wait = min(s.cooldown_until for s in self.stats.values()) - now
+            logger.warning(f"All {len(self)} API keys are rate limited, waiting {wait:.1f}s")
+            await asyncio.sleep(wait)
+
+    def release(self, endpoint: Endpoint) -> None:
+        """Return an endpoint taken with ``acquire``."""
+        self.stats[endpoint.name].in_flight -= 1
+
+    def cool_down(self, endpoint: Endpoint, seconds: Optional[float] = None) -> None:
+        """Stop dispatching to an endpoint for a while.
+
+        Args:
+            endpoint: Throttled endpoint
+            seconds: Rest time (default: the pool's cooldown)
+        """
+        stats = self.stats[endpoint.name]
+        seconds = self.cooldown_seconds if seconds is None else seconds
+        stats.cooldown_until = max(stats.cooldown_until, time.time() + seconds)
+        stats.throttled += 1
+        logger.warning(f"API key {endpoint.name} throttled, cooling down for {seconds:.1f}s")
+
+    def observe(self, api_key: Optional[str], status: int, headers) -> None:
+        """Update the rate-limit state of a key from a response.
+
+        Args:
+            api_key: Key the request was sent with
+            status: HTTP status code
+            headers: Response headers
+        """
+        endpoint = self._by_key.get(api_key)
+        if endpoint is None:
+            return
+        stats = self.stats[endpoint.name]
+        now = time.time()
+        stats.requests_remaining = _int_header(headers, "anthropic-ratelimit-requests-remaining")
+        stats.tokens_remaining = _int_header(headers, "anthropic-ratelimit-tokens-remaining")
+
+        if status in THROTTLE_STATUSES:
+            retry_after = headers.get("retry-after")
+            try:
+                seconds = float(retry_after) if retry_after is not None else None
+            except ValueError:
+                seconds = None
+            self.cool_down(endpoint, seconds)
+        elif stats.requests_remaining == 0:
+            # The window is used up; rest until it resets instead of collecting 429s
+            delay = _reset_delay(headers.get("anthropic-ratelimit-requests-reset"), now)
+            if delay:
+                self.cool_down(endpoint, delay)
+
+    async def on_response(self, response) -> None:
+        """HTTP client response hook feeding ``observe``."""
+        self.observe(response.request.headers.get("x-api-key"), response.status_code, response.headers)
+
+    def summary(self) -> Dict[str, Dict]:
+        """Summarize load and throttling by endpoint."""
+        return {
+            name: {k: v for k, v in asdict(stats).items() if k not in ("in_flight", "cooldown_until")}
+            for name, stats in self.stats.items()
+        }
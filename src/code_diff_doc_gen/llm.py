@@ -2,68 +2,498 @@
 
 import os
 import time
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Any, Dict, List, Optional, TypeVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 
-import anthropic
-import instructor
 from loguru import logger
 
-from .config import config, update_usage_stats
+from .budget import BudgetExceededError, estimate_tokens
+from .config import config, state, update_usage_stats, usage_cost
+from .hedging import LatencyTracker, hedged_call, size_class
+from .keypool import THROTTLE_STATUSES, Endpoint, KeyPool, parse_endpoints
+from .rawtext import RAW_FORMATS, RawFormatError, raw_call
+from .response_cache import ResponseCache, request_key
+from .routing import Complexity, model_spec, route_model, score_complexity
+from .analyses import has_records, write_prompt
+from .cpu import run_cpu
+from .fileio import run_io
+from .store import WorkspaceStore, detect_backend, open_store, workspace_store
+from .streaming import MalformedOutputError, PartialWriter, TruncatedOutputError, stream_structured
 from .models import CodeAnalysisResult, FileDescription, GeneratedCode
 
-# Initialize Anthropic with instructor
-client = instructor.from_anthropic(
-    anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY")), mode=instructor.Mode.ANTHROPIC_REASONING_TOOLS, beta=True
-)
-
 T = TypeVar("T")
 
+_clients: Dict[str, Any] = {}
+_http_client = None
+_key_pool = None
+_response_cache: Optional[ResponseCache] = None
+_latency = LatencyTracker(min_samples=config.hedge_min_samples)
+
+# Client and response cache supplied by an embedding application, per task
+_bound_client: ContextVar[Optional[Any]] = ContextVar("bound_client", default=None)
+_bound_cache: ContextVar[Optional[ResponseCache]] = ContextVar("bound_cache", default=None)
+_BOUND_ENDPOINT = Endpoint("client", None)
+
+
+def _get_http_client():
+    """Get the HTTP client shared by the clients of all endpoints."""
+    global _http_client
+    if _http_client is None:
+        from .transport import build_http_client
+
+        _http_client = build_http_client(config)
+    return _http_client
+
+
+def get_key_pool() -> KeyPool:
+    """Get the pool of API keys and endpoints calls are dispatched to.
+
+    The pool holds the endpoints of ``config.endpoints``, or the
+    ``ANTHROPIC_API_KEY`` endpoint if none are configured, and tracks the
+    rate-limit headers of every response of the shared HTTP client.
+
+    Returns:
+        Key pool
+    """
+    global _key_pool
+    if _key_pool is None:
+        _key_pool = KeyPool(parse_endpoints(config.endpoints, os.getenv("ANTHROPIC_API_KEY")), config.key_cooldown)
+        _get_http_client().event_hooks["response"].append(_key_pool.on_response)
+    return _key_pool
+
+
+def get_client(endpoint: Optional[Endpoint] = None):
+    """Get the instructor-wrapped Anthropic client of an endpoint.
+
+    The clients and the anthropic/instructor packages are only loaded on first
+    use, so commands that make no API calls start quickly. All endpoints share
+    one HTTP connection pool configured from ``AppConfig``.
+
+    Args:
+        endpoint: Endpoint to call (default: the first endpoint of the key pool)
+
+    Returns:
+        Async instructor client
+    """
+    bound = _bound_client.get()
+    if bound is not None:
+        return bound
+    pool = get_key_pool()
+    endpoint = endpoint or pool.endpoints[0]
+    client = _clients.get(endpoint.name)
+    if client is None:
+        import anthropic
+        import instructor
+
+        from .transport import build_timeout
+
+        client = instructor.from_anthropic(
+            anthropic.AsyncAnthropic(
+                api_key=endpoint.api_key,
+                base_url=endpoint.base_url,
+                http_client=_get_http_client(),
+                timeout=build_timeout(config),
+                # With several keys, failed calls move to another key instead of retrying in place
+                max_retries=2 if len(pool) == 1 else 0,
+            ),
+            mode=instructor.Mode.ANTHROPIC_REASONING_TOOLS,
+            beta=True,
+        )
+        _clients[endpoint.name] = client
+    return client
+
+
+async def prewarm_client(connections: Optional[int] = None) -> None:
+    """Create the endpoint clients and open connections before the first calls.
+
+    Args:
+        connections: Number of connections to open (default: config value)
+    """
+    from .transport import prewarm
+
+    count = config.prewarm_connections if connections is None else connections
+    base_urls = sorted({str(get_client(endpoint).client.base_url) for endpoint in get_key_pool().endpoints})
+    for base_url in base_urls:
+        await prewarm(_http_client, base_url, count // len(base_urls))
+
+
+def get_pool_stats() -> Optional[Dict[str, float]]:
+    """Summarize utilization of the shared connection pool.
+
+    Returns:
+        Pool summary, or None if no client was created
+    """
+    from .transport import pool_stats
+
+    stats = pool_stats(_http_client)
+    return stats.summary() if stats else None
+
+
+def bind_call_context(client=None, cache: Optional[ResponseCache] = None) -> None:
+    """Make the calls of the current task, and of tasks it starts, use a given client and cache.
+
+    A bound client replaces the key pool: calls go to it directly, without
+    dispatch across keys. A bound cache is used even if ``config.response_cache``
+    is off.
+
+    Args:
+        client: Instructor-wrapped ``AsyncAnthropic`` client
+        cache: Response cache
+    """
+    if client is not None:
+        _bound_client.set(client)
+    if cache is not None:
+        _bound_cache.set(cache)
+
+
+def get_response_cache() -> ResponseCache:
+    """Get the response cache of the current task, or the one shared by all calls of the process."""
+    global _response_cache
+    bound = _bound_cache.get()
+    if bound is not None:
+        return bound
+    if _response_cache is None:
+        _response_cache = ResponseCache(config.response_cache_size)
+    return _response_cache
+
+
+def get_key_stats() -> Optional[Dict[str, Dict]]:
+    """Summarize dispatch and throttling by API key.
+
+    Returns:
+        Summary by endpoint name, or None if no call was dispatched
+    """
+    return _key_pool.summary() if _key_pool else None
+
 
 async def call_anthropic_model(
-    system_prompt: str, user_message: str, response_model: T, max_tokens: Optional[int] = None, thinking_budget: Optional[int] = None
+    system_prompt: str,
+    user_message: str,
+    response_model: T,
+    max_tokens: Optional[int] = None,
+    thinking_budget: Optional[int] = None,
+    stage: str = "default",
+    partial: Optional[PartialWriter] = None,
+    source_chars: Optional[int] = None,
+    complexity: Optional[Complexity] = None,
 ) -> T:
     """Call Anthropic model with instructor and track usage.
 
+    When hedging is enabled and the call outlives the configured latency
+    percentile of its stage and size class, a duplicate request is issued and
+    the first valid response is used. In streaming mode the response is
+    validated as it arrives and retried early if it goes wrong.
+
+    Unless given explicitly, the output cap and thinking budget are sized from
+    the source the call works on, and a call that hits its output cap is
+    retried with a larger one. With routing enabled, small and simple sources
+    go to the fast model, falling back to the configured model if the fast
+    model's output does not validate. With plain-text output enabled, code
+    carrying responses are requested as fenced code blocks and only repeated
+    as tool calls if they cannot be parsed. Identical requests are served from
+    the response cache unless it is disabled.
+
     Args:
         system_prompt: System prompt to guide generation
         user_message: User message content
         response_model: Pydantic model for response validation
-        max_tokens: Maximum tokens to generate (default: config value)
-        thinking_budget: Thinking budget tokens (default: config value)
+        max_tokens: Maximum tokens to generate (default: sized by the token policy)
+        thinking_budget: Thinking budget tokens (default: sized by the token policy)
+        stage: Pipeline stage making the call, used for latency tracking and sizing
+        partial: Spool for partial output of one field (streaming mode only)
+        source_chars: Size of the source the call works on (default: message length)
+        complexity: Complexity of the source file, used for model routing
 
     Returns:
         Response parsed into the provided model type
+
+    Raises:
+        BudgetExceededError: If the run already spent ``config.max_cost``
     """
-    max_tokens = max_tokens or config.max_tokens
-    thinking_budget = thinking_budget or config.thinking_budget
+    args = (system_prompt, user_message, response_model, max_tokens, thinking_budget, stage, partial, source_chars, complexity)
+    if not config.response_cache and _bound_cache.get() is None:
+        return await _call_model(*args)
+    key = request_key(stage, response_model, system_prompt, user_message)
+    return await get_response_cache().get(key, lambda: _call_model(*args))
+
+
+async def _call_model(
+    system_prompt: str,
+    user_message: str,
+    response_model: T,
+    max_tokens: Optional[int],
+    thinking_budget: Optional[int],
+    stage: str,
+    partial: Optional[PartialWriter],
+    source_chars: Optional[int],
+    complexity: Optional[Complexity],
+) -> T:
+    """Make a model call; see ``call_anthropic_model``."""
+    if config.max_cost is not None and state.total_usage["cost"] >= config.max_cost:
+        raise BudgetExceededError(f"Cost limit of ${config.max_cost:.2f} reached")
+
+    source_tokens = estimate_tokens(len(user_message) if source_chars is None else source_chars)
+    planned_tokens, planned_thinking = state.tokens.plan(stage, source_tokens, config)
+    max_tokens = max_tokens or planned_tokens
+    thinking_budget = thinking_budget or planned_thinking
 
     # Prepare message for the API call
+    system = [{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}]
     messages = [
         {"role": "user", "content": [{"type": "text", "text": user_message, "cache_control": {"type": "ephemeral"}}]},
     ]
 
-    # Make the API call with timing
+    # Requests made for the current attempt, counting hedged duplicates
+    requests = 0
+    raw = config.raw_output and response_model in RAW_FORMATS
+
+    async def make_call():
+        nonlocal requests
+        requests += 1
+        call_start = time.time()
+        # A hedged duplicate must not interleave its output with the first request's spool
+        spool = partial if requests == 1 else None
+
+        async def call(endpoint: Endpoint):
+            nonlocal raw
+            client = get_client(endpoint)
+            if raw:
+                try:
+                    response, usage, ttft = await raw_call(
+                        client.client, response_model, system, messages, spool, config.stream, **request
+                    )
+                except RawFormatError as e:
+                    # Output that does not parse as code blocks is requested again as a tool call
+                    update_usage_stats(e.usage, request["model"], endpoint.name)
+                    state.raw_output["fallbacks"] += 1
+                    logger.warning(f"Plain-text {stage} response could not be parsed ({e}), retrying in structured mode")
+                    raw = False
+                    if spool:
+                        spool.reset()
+                else:
+                    state.raw_output["calls"] += 1
+                    if ttft is not None:
+                        state.ttft.observe(stage, ttft)
+                    return response, usage
+            if config.stream:
+                return await _stream_with_retries(
+                    client, endpoint.name, system, messages, response_model, stage, spool, request
+                )
+            response, completion = await client.messages.create_with_completion(
+                system=system,
+                messages=messages,
+                response_model=response_model,
+                max_retries=_validation_retries(),
+                **request,
+            )
+            return response, completion.usage
+
+        (response, usage), endpoint = await _dispatch(call, stage)
+        return response, usage, time.time() - call_start, endpoint.name
+
+    size = size_class(len(user_message))
+    model = route_model(stage, source_tokens, complexity, config)
+    escalations = 0
     start_time = time.time()
-    response, completion = await client.messages.create_with_completion(
-        model=config.model,
-        system=[{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}],
-        messages=messages,
-        response_model=response_model,
-        max_tokens=max_tokens,
-        thinking={"type": "enabled", "budget_tokens": thinking_budget},
-        betas=["output-128k-2025-02-19"],
-    )
+    while True:
+        request = _build_request(model, max_tokens, thinking_budget)
+        latency_key = f"{stage}/{model}"
+        hedge_delay = _latency.percentile(latency_key, size, config.hedge_percentile) if config.hedge else None
+
+        # Make the API call with timing, hedging slow calls if enabled; every retry spools afresh
+        requests = 0
+        try:
+            (response, usage, call_elapsed, key), hedged = await hedged_call(
+                make_call, hedge_delay, state.hedging, config.hedge_max_rate
+            )
+            break
+        except Exception as e:
+            truncated, truncated_usage = _truncation(e)
+            if truncated:
+                if truncated_usage is not None:
+                    update_usage_stats(truncated_usage, model, getattr(e, "endpoint_name", None))
+                    if model_spec(model).thinking:
+                        state.tokens.observe(stage, source_tokens, truncated_usage.output_tokens, max_tokens, truncated=True)
+                ceiling = min(config.max_output_tokens, model_spec(model).max_output)
+                if escalations < config.max_escalations and request["max_tokens"] < ceiling:
+                    escalations += 1
+                    max_tokens, thinking_budget = state.tokens.escalate(max_tokens, thinking_budget, config)
+                    logger.warning(f"{stage} call hit its output cap, retrying with max_tokens={max_tokens:,}")
+                    if partial:
+                        partial.reset()
+                    continue
+            elif not _is_validation_error(e):
+                raise
+            if model == config.model:
+                raise
+            # Output the fast model could not produce goes to the standard model
+            logger.warning(f"{stage} call failed on {model} ({type(e).__name__}), falling back to {config.model}")
+            model = config.model
+            if partial:
+                partial.reset()
+    _latency.observe(latency_key, size, call_elapsed)
 
     elapsed = time.time() - start_time
     logger.info(f"LLM call completed in {elapsed:.2f}s")
 
     # Update token usage statistics
-    update_usage_stats(completion.usage)
+    update_usage_stats(usage, model, key)
+    if model_spec(model).thinking:
+        state.tokens.observe(stage, source_tokens, usage.output_tokens, max_tokens)
+    if hedged:
+        # The cancelled duplicate is billed for what it consumed; count it at the winner's cost as an upper bound
+        state.hedging.extra_cost += usage_cost(usage, model)
 
     return response
 
 
+def _build_request(model: str, max_tokens: int, thinking_budget: int) -> Dict[str, Any]:
+    """Build the model parameters of a request within the limits of the model.
+
+    Args:
+        model: Model id to call
+        max_tokens: Output cap including the thinking budget
+        thinking_budget: Thinking budget tokens
+
+    Returns:
+        Keyword arguments for the messages API
+    """
+    spec = model_spec(model)
+    if not spec.thinking:
+        # Without extended thinking only the answer part of the budget is needed
+        return {"model": model, "max_tokens": min(max_tokens - thinking_budget, spec.max_output)}
+    return {
+        "model": model,
+        "max_tokens": min(max_tokens, spec.max_output),
+        "thinking": {"type": "enabled", "budget_tokens": thinking_budget},
+        "betas": ["output-128k-2025-02-19"],
+    }
+
+
+def _is_validation_error(error: Exception) -> bool:
+    """Check whether a failed call returned output that did not validate."""
+    from instructor.exceptions import InstructorRetryException
+    from pydantic import ValidationError
+
+    return isinstance(error, (InstructorRetryException, MalformedOutputError, ValidationError))
+
+
+def _truncation(error: Exception) -> Tuple[bool, Any]:
+    """Check whether a failed call hit its output cap.
+
+    Args:
+        error: Error raised by the call
+
+    Returns:
+        Tuple of whether the call was truncated and its usage, if known
+    """
+    from instructor.exceptions import IncompleteOutputException
+
+    if isinstance(error, TruncatedOutputError):
+        return True, error.usage
+    # Instructor wraps the error of its last attempt in InstructorRetryException
+    for candidate in (error, error.args[0] if error.args else None):
+        if isinstance(candidate, IncompleteOutputException):
+            return True, getattr(candidate.last_completion, "usage", None)
+    return False, None
+
+
+async def _dispatch(call: Callable[[Endpoint], Awaitable[T]], stage: str) -> Tuple[T, Endpoint]:
+    """Run a call on the least-loaded API key, moving to another key if it fails.
+
+    Calls that are throttled, overloaded or fail in transit are retried on
+    another key up to ``config.dispatch_retries`` times. Throttled keys are
+    put on cooldown by the pool's response hook, so the retry avoids them.
+
+    Args:
+        call: Coroutine function making the call with an endpoint
+        stage: Pipeline stage making the call, for logging
+
+    Returns:
+        Tuple of the call's result and the endpoint that served it
+
+    Raises:
+        Exception: The error of the last call, with the name of the endpoint
+            that served it as ``endpoint_name`` for usage accounting
+    """
+    if _bound_client.get() is not None:
+        try:
+            return await call(_BOUND_ENDPOINT), _BOUND_ENDPOINT
+        except Exception as e:
+            e.endpoint_name = _BOUND_ENDPOINT.name
+            raise
+    pool = get_key_pool()
+    for attempt in range(config.dispatch_retries + 1):
+        endpoint = await pool.acquire()
+        try:
+            return await call(endpoint), endpoint
+        except Exception as e:
+            e.endpoint_name = endpoint.name
+            # A single key keeps the client's own retries
+            if len(pool) == 1 or attempt == config.dispatch_retries or not _is_retryable(e):
+                raise
+            logger.warning(f"{stage} call on key {endpoint.name} failed ({type(e).__name__}), retrying on another key")
+        finally:
+            pool.release(endpoint)
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Check whether a failed call may succeed on another key."""
+    import anthropic
+
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in THROTTLE_STATUSES or error.status_code >= 500
+    return isinstance(error, anthropic.APIConnectionError)
+
+
+def _validation_retries():
+    """Instructor retry policy that re-asks on invalid output but leaves API errors to dispatch."""
+    from json import JSONDecodeError
+
+    from pydantic import ValidationError
+    from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt
+
+    return AsyncRetrying(stop=stop_after_attempt(3), retry=retry_if_exception_type((ValidationError, JSONDecodeError)))
+
+
+async def _stream_with_retries(
+    client,
+    key: str,
+    system: List[Dict],
+    messages: List[Dict],
+    response_model: Any,
+    stage: str,
+    partial: Optional[PartialWriter],
+    request: Dict[str, Any],
+):
+    """Stream a call, retrying responses that are aborted as malformed.
+
+    Truncated responses are raised so the caller can retry with a larger cap.
+
+    Returns:
+        Tuple of the validated response and its usage
+    """
+    for attempt in range(config.stream_retries + 1):
+        try:
+            response, usage, ttft = await stream_structured(
+                client.client, response_model, system, messages, partial, **request
+            )
+        except MalformedOutputError as e:
+            if e.usage is not None:
+                update_usage_stats(e.usage, request["model"], key)
+            if attempt == config.stream_retries:
+                raise
+            logger.warning(f"Aborted {stage} stream: {e}; retrying ({attempt + 1}/{config.stream_retries})")
+            if partial:
+                partial.reset()
+            continue
+
+        if ttft is not None:
+            state.ttft.observe(stage, ttft)
+        return response, usage
+
+
 async def analyze_code_differences(original: str, generated: str) -> CodeAnalysisResult:
     """Analyze differences between original and generated code.
 
@@ -101,6 +531,7 @@ async def analyze_code_differences(original: str, generated: str) -> CodeAnalysi
         system_prompt=system_prompt,
         user_message=user_prompt,
         response_model=CodeAnalysisResult,
+        stage="analyze",
     )
 
 
@@ -149,20 +580,36 @@ Keep your response concise and focused only on what would be needed in a develop
 
     user_prompt = content
 
+    complexity = None
+    if config.routing:
+        complexity = await run_cpu(score_complexity, content, Path(file_path).suffix)
+
     return await call_anthropic_model(
         system_prompt=system_prompt,
         user_message=user_prompt,
         response_model=FileDescription,
+        stage="describe",
+        complexity=complexity,
     )
 
 
-async def generate_code_from_description(description: str, file_path: str, system_prompt: Optional[str] = None) -> GeneratedCode:
+async def generate_code_from_description(
+    description: str,
+    file_path: str,
+    system_prompt: Optional[str] = None,
+    partial: Optional[PartialWriter] = None,
+    source_chars: Optional[int] = None,
+    complexity: Optional[Complexity] = None,
+) -> GeneratedCode:
     """Generate code from a description.
 
     Args:
         description: Natural language description of the code
         file_path: Path to the file being generated
         system_prompt: Optional system prompt to guide generation
+        partial: Optional spool for the implementation while it streams
+        source_chars: Size of the original source file, used to size the call
+        complexity: Complexity of the original source file, used for model routing
 
     Returns:
         Generated code
@@ -232,15 +679,20 @@ If needed, you can include brief comments within the code to explain non-obvious
         system_prompt=system_prompt,
         user_message=user_prompt,
         response_model=GeneratedCode,
+        stage="generate",
+        partial=partial,
+        source_chars=source_chars,
+        complexity=complexity,
     )
 
 
-def load_system_prompt(round_num: int, workspace_dir: Path) -> Optional[str]:
+def load_system_prompt(round_num: int, workspace_dir: Path, store: Optional[WorkspaceStore] = None) -> Optional[str]:
     """Load system prompt for the specified generation round.
 
     Args:
         round_num: Generation round number
         workspace_dir: Path to workspace directory
+        store: Workspace store (default: opened from workspace directory for the call)
 
     Returns:
         System prompt string if found, None otherwise
@@ -248,44 +700,54 @@ def load_system_prompt(round_num: int, workspace_dir: Path) -> Optional[str]:
     if round_num == 0:
         return "You are an expert developer that can generate prod ready code from description"
 
-    prompt_file = workspace_dir / "prompts" / f"system_{round_num}.md"
-    return prompt_file.read_text() if prompt_file.exists() else None
-
-
-async def generate_system_prompt_from_analyses(round_num: int, workspace_dir: Path) -> str:
+    if store is not None:
+        return store.read("prompts", f"system_{round_num}.md")
+    store = open_store(workspace_dir, detect_backend(workspace_dir))
+    try:
+        return store.read("prompts", f"system_{round_num}.md")
+    finally:
+        store.close()
+
+
+async def generate_system_prompt_from_analyses(
+    round_num: int,
+    workspace_dir: Path,
+    store: Optional[WorkspaceStore] = None,
+    max_pairs_per_file: Optional[int] = None,
+) -> str:
     """Generate a system prompt for the next round based on previous analyses.
 
+    The prompt is streamed to the store from the structured analysis records,
+    so analyses are never all held in memory at once; the finished prompt is
+    read back once to be returned.
+
     Args:
         round_num: Current generation round number
         workspace_dir: Path to workspace directory
+        store: Workspace store (default: opened from workspace directory for the call)
+        max_pairs_per_file: Maximum code pairs to include per file (default: all)
 
     Returns:
-        System prompt incorporating learnings from analyses
+        System prompt for the next round, or the current round's prompt if there are no analyses
     """
-    analysis_dir = workspace_dir / "analysis" / f"round_{round_num}"
-    if not analysis_dir.exists():
-        logger.warning(f"No analysis directory found for round {round_num}")
-        return load_system_prompt(round_num, workspace_dir) or ""
-
-    # Collect all analysis files
-    analysis_files = list(analysis_dir.rglob("*.analysis"))
-    if not analysis_files:
-        logger.warning(f"No analysis files found for round {round_num}")
-        return load_system_prompt(round_num, workspace_dir) or ""
-
-    # Get previous prompt
-    prev_prompt = load_system_prompt(round_num, workspace_dir) or ""
-
-    # Combine all analyses
-    analyses = "\n\n".join(f.read_text() for f in analysis_files)
-
-    # Combine previous prompt with analyses
-    next_prompt = f"{prev_prompt}\n\n# Examples from round {round_num}:\n\n{analyses}"
-
-    # Save the new prompt
-    prompt_dir = workspace_dir / "prompts"
-    prompt_dir.mkdir(parents=True, exist_ok=True)
-    prompt_file = prompt_dir / f"system_{round_num + 1}.md"
-    prompt_file.write_text(next_prompt)
-
+    analysis_ns = f"analysis/round_{round_num}"
+    async with workspace_store(workspace_dir, store) as store:
+        # Get previous prompt
+        prev_prompt = await run_io(load_system_prompt, round_num, workspace_dir, store) or ""
+
+        if not await run_io(store.exists, analysis_ns) and not await run_io(has_records, store, round_num):
+            logger.warning(f"No analyses found for round {round_num}")
+            return prev_prompt
+
+        # Stream previous prompt and examples into the new prompt
+        def write_next_prompt() -> int:
+            with store.open_writer("prompts", f"system_{round_num + 1}.md") as out:
+                count = write_prompt(out, prev_prompt, round_num, store, max_pairs_per_file)
+            store.flush()
+            return count
+
+        count = await run_io(write_next_prompt)
+        next_prompt = await run_io(store.read, "prompts", f"system_{round_num + 1}.md")
+
+    logger.info(f"Wrote system prompt for round {round_num + 1} with {count} examples")
     return next_prompt
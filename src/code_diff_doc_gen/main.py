@@ -1,77 +1,967 @@
 """Code generation and analysis tool."""
 
 import asyncio
+import importlib.util
 import os
 from pathlib import Path
+import socket
 import sys
+import time
+from dataclasses import asdict
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
 import typer
 from loguru import logger
 
-from .config import config
-from .processor import process_files
-from .generator import generate_code
-from .diff import compare_files
-from .llm import generate_system_prompt_from_analyses
+from .config import config, state
+from .fileio import run_io
+from .journal import Journal
+from .manifest import is_file_up_to_date, is_up_to_date, load_manifest, save_manifest, scan_sources, stat_sources
+from .monitor import LoopLagMonitor
+from .repos import assign_workspaces, load_repo_list
+from .sharding import SHARD_META, find_shard_workspaces, merge_workspaces, parse_shard, select_shard, shard_dir_name
+from .store import STORE_BACKENDS, detect_backend, ensure_workspace, export_workspace, open_store
 
 app = typer.Typer()
 
-# Remove default handler
-logger.remove()
-
-# Add a new handler with custom format
-logger.add(
-    sys.stderr,
-    format="<green>{time:HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <cyan>{file}:{line} {function}</cyan> - <level>{message}</level>",
-    level="INFO",
-)
-
 
-async def ensure_workspace(workspace_dir: Path):
-    """Create workspace directories."""
-    for subdir in ["descriptions", "generated", "analysis", "prompts"]:
-        (workspace_dir / subdir).mkdir(parents=True, exist_ok=True)
+@app.callback()
+def configure_logging() -> None:
+    """Code generation and analysis tool."""
+    # Logging is set up by the CLI only, so embedding the package leaves the global logger alone
+    logger.enable("code_diff_doc_gen")
+    logger.remove()
+    logger.add(
+        sys.stderr,
+        format="<green>{time:HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <cyan>{file}:{line} {function}</cyan> - <level>{message}</level>",
+        level="INFO",
+    )
 
 
 @app.command()
 def run(
-    source_dir: Path = typer.Argument(..., help="Source code directory"),
+    source_dirs: List[Path] = typer.Argument(None, help="Source code directories"),
+    repos_file: Path = typer.Option(None, "--repos", help="File listing source directories, one per line"),
     round_num: int = typer.Option(0, "--round", "-r", help="Generation round"),
     output_dir: Path = typer.Option(None, "--output", "-o", help="Output directory"),
+    resume: bool = typer.Option(False, "--resume", help="Resume unfinished work recorded in the run journal"),
+    store_backend: str = typer.Option(None, "--store", help=f"Workspace store backend ({', '.join(STORE_BACKENDS)})"),
+    hedge: bool = typer.Option(None, "--hedge/--no-hedge", help="Duplicate calls that exceed the stage's latency percentile"),
+    stream: bool = typer.Option(None, "--stream/--no-stream", help="Stream responses, validating and spooling output early"),
+    raw: bool = typer.Option(None, "--raw/--no-raw", help="Return code as fenced blocks instead of JSON tool input"),
+    route: bool = typer.Option(None, "--route/--no-route", help="Send small, simple files to the fast model"),
+    pipeline: bool = typer.Option(None, "--pipeline/--no-pipeline", help="Start each file's next stage as soon as it is ready"),
+    shard: str = typer.Option(None, "--shard", help="Process only shard i/N of the files (zero-based, e.g. 0/4)"),
+    max_cost: float = typer.Option(None, "--max-cost", help="Stop making API calls once this many USD are spent"),
+    plan: bool = typer.Option(False, "--plan", help="Estimate calls, tokens, cost and wall time without calling the API"),
+    files: List[Path] = typer.Option(None, "--file", "-f", help="Process only this file right away and print its results (repeatable)"),
+    profile: bool = typer.Option(False, "--profile", help="Profile each stage and write the profiles to the workspace"),
 ):
     """Process source code, generate code, and analyze differences."""
+    # Set workspace directory
+    workspace_dir = output_dir or config.output_dir
+    backend = store_backend or (detect_backend(workspace_dir) if workspace_dir.exists() else config.store)
+
+    # A shard works on its stable-hash partition of the files in its own workspace
+    parent_dir = workspace_dir
+    shard_index = shard_count = None
+    if shard:
+        try:
+            shard_index, shard_count = parse_shard(shard)
+        except ValueError as e:
+            logger.error(str(e))
+            raise typer.Exit(1)
+        workspace_dir = workspace_dir / shard_dir_name(shard_index, shard_count)
+    if hedge is not None:
+        config.hedge = hedge
+    if stream is not None:
+        config.stream = stream
+    if raw is not None:
+        config.raw_output = raw
+    if route is not None:
+        config.routing = route
+    if pipeline is not None:
+        config.pipeline = pipeline
+    if max_cost is not None:
+        config.max_cost = max_cost
+
+    # Several source trees each get a workspace below the output directory
+    repos = [(path, None) for path in source_dirs or []]
+    try:
+        if repos_file:
+            repos += load_repo_list(repos_file)
+        if not repos:
+            raise ValueError("No source directory given")
+        if profile and (files or plan or repos_file or len(repos) > 1):
+            raise ValueError("--profile needs a single source directory and cannot be combined with --file or --plan")
+        if files and (shard or repos_file or len(repos) > 1):
+            raise ValueError("--file needs a single source directory and cannot be combined with --shard")
+        if repos_file or len(repos) > 1:
+            if shard:
+                raise ValueError("--shard cannot be combined with several source directories")
+            run_repos(assign_workspaces(repos, workspace_dir), round_num, workspace_dir, store_backend, resume, plan)
+            return
+    except (OSError, ValueError) as e:
+        logger.error(str(e))
+        raise typer.Exit(1)
+    source_dir = repos[0][0]
+
+    if not source_dir.is_dir():
+        logger.error(f"Source directory not found: {source_dir}")
+        raise typer.Exit(1)
+
+    if files:
+        try:
+            keys = [source_key(source_dir, path) for path in files]
+            if plan:
+                plan_runs([(source_dir, workspace_dir, backend, stat_sources(source_dir, keys))], round_num, workspace_dir, backend, False)
+            else:
+                run_files(source_dir, keys, round_num, workspace_dir, backend)
+        except (OSError, ValueError) as e:
+            logger.error(str(e))
+            raise typer.Exit(1)
+        return
+
+    def scan():
+        scanned = scan_sources(source_dir)
+        if shard_count is None:
+            return scanned
+        return {path: scanned[path] for path in select_shard(scanned, shard_index, shard_count)}
+
+    from .profiling import Profiler
+
+    profiler = Profiler(enabled=profile)
+
+    # Fast path: exit before loading any pipeline stage when nothing changed
+    sources = None
+    manifest = None
+    if not resume:
+        with profiler.stage("discover"):
+            try:
+                sources = scan()
+            except OSError as e:
+                logger.error(f"Cannot scan source directory {source_dir}: {e}")
+                raise typer.Exit(1)
+            if workspace_dir.exists():
+                store = open_store(workspace_dir, backend)
+                try:
+                    manifest = load_manifest(store)
+                finally:
+                    store.close()
+        if is_up_to_date(manifest, source_dir, round_num, sources):
+            logger.info(f"Round {round_num} is up to date, no source files changed")
+            profiler.save(workspace_dir)
+            return
+    if plan:
+        plan_runs([(source_dir, workspace_dir, backend, sources or scan())], round_num, workspace_dir, backend, config.pipeline)
+        return
+
     async def main():
-        # Set workspace directory
-        workspace_dir = output_dir or config.output_dir
-        logger.info(f"Using workspace directory: {workspace_dir}")
+        nonlocal sources
+
+        # Pipeline stages pull in the API client stack, so load them only when there is work
+        from .diff import compare_files
+        from .generator import generate_code
+        from .llm import generate_system_prompt_from_analyses, prewarm_client
+        from .pipeline import run_pipeline
+        from .processor import process_files
+        from .scheduler import TIMINGS_KIND, CostModel
+
+        logger.info(f"Using workspace directory: {workspace_dir} ({backend} store)")
 
-        await ensure_workspace(workspace_dir)
+        await ensure_workspace(workspace_dir, backend)
+        store = await run_io(open_store, workspace_dir, backend)
+        journal = Journal(store)
+        await run_io(lambda: state.tokens.load(store.iter_records("token_usage")))
+        monitor = LoopLagMonitor(threshold=config.loop_lag_threshold)
+        monitor.start()
 
         try:
-            # Process files
-            logger.info("Processing source files...")
-            await process_files(source_dir, workspace_dir)
+            # Resolve the file set, from the journal when resuming
+            journal_state = await run_io(journal.load) if resume else None
+            if journal_state and round_num in journal_state.plans:
+                paths = journal_state.plans[round_num]
+                logger.info(f"Resuming round {round_num} from journal ({len(paths)} files planned)")
+            else:
+                if resume:
+                    logger.warning(f"No journal plan for round {round_num}, starting a full run")
+                    sources = await run_io(scan)
+                if not sources:
+                    raise ValueError(f"No files found in {source_dir}")
+                paths = sorted(sources)
+                await run_io(journal.record_plan, round_num, paths)
+
+            if shard_count is not None:
+                logger.info(f"Shard {shard_index}/{shard_count}: {len(paths)} files")
+                await run_io(store.write_meta, SHARD_META, {"index": shard_index, "count": shard_count, "files": len(paths)})
+                await run_io(inherit_prompt, store, parent_dir, round_num)
+
+            def pending(stage: str, stage_round: Optional[int]) -> List[Path]:
+                todo = journal_state.pending(stage, stage_round, paths) if journal_state else paths
+                return [source_dir / p for p in todo]
 
-            # Generate code
-            logger.info("Generating code...")
-            await generate_code(source_dir, round_num, workspace_dir)
+            # Estimate per-file costs from source sizes and timings of earlier runs
+            sizes = sources if sources is not None else await run_io(scan)
+            costs = await run_io(
+                lambda: CostModel.from_records({p: size for p, (size, _) in sizes.items()}, store.iter_records(TIMINGS_KIND))
+            )
 
-            # Compare and analyze
-            logger.info("Analyzing differences...")
-            await compare_files(source_dir, round_num, workspace_dir)
+            # Open API connections while the first stage reads its inputs
+            prewarm = asyncio.create_task(prewarm_client())
+
+            if config.pipeline:
+                logger.info("Running describe, generate and analyze as a pipeline...")
+                await prewarm
+                stage_files = {
+                    "describe": pending("describe", None),
+                    "generate": pending("generate", round_num),
+                    "analyze": pending("analyze", round_num),
+                }
+                # The stages overlap, so a pipelined run is profiled as one stage
+                with profiler.stage("run_pipeline"):
+                    counts = await run_pipeline(source_dir, round_num, workspace_dir, stage_files, store, journal, costs)
+                errors = sum(c["error"] for c in counts.values())
+            else:
+                # Process files
+                logger.info("Processing source files...")
+                with profiler.stage("process_files"):
+                    described = await process_files(source_dir, workspace_dir, pending("describe", None), journal, store, costs)
+                await prewarm
+
+                # Generate code
+                logger.info("Generating code...")
+                with profiler.stage("generate_code"):
+                    generated = await generate_code(
+                        source_dir, round_num, workspace_dir, pending("generate", round_num), journal, store, costs
+                    )
+
+                # Compare and analyze
+                logger.info("Analyzing differences...")
+                with profiler.stage("compare_files"):
+                    analyzed = await compare_files(
+                        source_dir, round_num, workspace_dir, pending("analyze", round_num), journal, store, costs
+                    )
+                errors = sum(r.status == "error" for r in [*described, *generated]) + analyzed["error"]
 
             # Generate system prompt for next round
             logger.info("Generating system prompt for next round...")
-            await generate_system_prompt_from_analyses(round_num, workspace_dir)
+            with profiler.stage("generate_system_prompt_from_analyses"):
+                await generate_system_prompt_from_analyses(round_num, workspace_dir, store)
+
+            # A round with failed files, e.g. after the cost limit was hit, is run again next time
+            if errors:
+                logger.warning(f"{errors} file stages failed, round {round_num} will be retried by the next run")
+            elif sources is not None:
+                await run_io(save_manifest, store, source_dir, round_num, sources, manifest)
 
             logger.info(f"Analysis and system prompt generation completed")
 
         except Exception as e:
             logger.exception(e)
             raise typer.Exit(1)
+        finally:
+            await finish_run(store, round_num, monitor)
+            await run_io(profiler.save, workspace_dir)
+
+    asyncio.run(main())
+
+
+def source_key(source_dir: Path, path: Path) -> str:
+    """Resolve a file given on the command line to its path relative to the source directory.
+
+    Args:
+        source_dir: Directory containing source files
+        path: File path, relative to the working directory or to the source directory
+
+    Returns:
+        POSIX path relative to the source directory
+
+    Raises:
+        ValueError: If the file does not exist or is outside the source directory
+    """
+    candidate = path if path.is_absolute() or path.exists() else source_dir / path
+    try:
+        key = candidate.resolve().relative_to(source_dir.resolve()).as_posix()
+    except ValueError:
+        raise ValueError(f"{path} is not inside {source_dir}")
+    if not candidate.is_file():
+        raise ValueError(f"Source file not found: {path}")
+    return key
+
+
+def run_files(source_dir: Path, keys: List[str], round_num: int, workspace_dir: Path, backend: str) -> None:
+    """Describe, generate and analyze single files right away, printing each stage's output as it completes.
+
+    Files unchanged since a completed round are answered from the workspace
+    without loading the API stack. Other files go straight to their
+    artifacts, without scanning the tree or planning a journal, and reuse the
+    round's stored system prompt, so its cached prefix is hit. The next
+    round's prompt is left to the next full run.
+
+    Args:
+        source_dir: Directory containing source files
+        keys: Source paths relative to the source directory
+        round_num: Generation round number
+        workspace_dir: Path to workspace directory
+        backend: Workspace store backend
+    """
+    stats = stat_sources(source_dir, keys)
+    if workspace_dir.exists():
+        store = open_store(workspace_dir, backend)
+        try:
+            manifest = load_manifest(store)
+            if all(is_file_up_to_date(manifest, source_dir, round_num, key, stats[key]) for key in keys):
+                for key in keys:
+                    for stage, namespace in (
+                        ("describe", "descriptions"),
+                        ("generate", f"generated/round_{round_num}"),
+                        ("analyze", f"analysis/round_{round_num}"),
+                    ):
+                        typer.echo(f"==> {key} [{stage}, up to date]")
+                        typer.echo(store.read(namespace, key) or "")
+                return
+        finally:
+            store.close()
+
+    async def main():
+        from .api import run_round
+        from .llm import prewarm_client
+
+        await ensure_workspace(workspace_dir, backend)
+        store = await run_io(open_store, workspace_dir, backend)
+        await run_io(lambda: state.tokens.load(store.iter_records("token_usage")))
+        monitor = LoopLagMonitor(threshold=config.loop_lag_threshold)
+        monitor.start()
+        # Connections open while the first stage reads its inputs
+        prewarm = asyncio.create_task(prewarm_client(len(keys)))
+        errors = 0
+        try:
+            async for event in run_round(source_dir, workspace_dir, round_num, keys, store, next_prompt=False):
+                if event.status == "error":
+                    errors += 1
+                    logger.error(f"{event.stage} of {event.path} failed{f': {event.error}' if event.error else ''}")
+                    continue
+                typer.echo(f"==> {event.path} [{event.stage}, {event.status}, {event.seconds:.2f}s]")
+                typer.echo(event.output or "")
+            await prewarm
+        except Exception as e:
+            logger.exception(e)
+            raise typer.Exit(1)
+        finally:
+            if not prewarm.done():
+                prewarm.cancel()
+            await finish_run(store, round_num, monitor)
+        if errors:
+            raise typer.Exit(1)
+
+    asyncio.run(main())
+
+
+def run_repos(
+    repos: List[Tuple[Path, Path]],
+    round_num: int,
+    root_dir: Path,
+    store_backend: Optional[str],
+    resume: bool,
+    plan: bool = False,
+) -> None:
+    """Run a round for several source trees with shared workers, client, response cache and budget.
+
+    Every tree keeps its own workspace, journal, manifest and system prompts.
+    Usage and token policy of the combined run are kept in the root directory.
+
+    Args:
+        repos: Pairs of source directory and workspace directory
+        round_num: Generation round number
+        root_dir: Directory holding the workspaces
+        store_backend: Store backend for new workspaces (default: config.store)
+        resume: Resume unfinished work recorded in the run journals
+        plan: Only estimate the run, without calling the API
+    """
+    runs = []
+    for source_dir, workspace_dir in repos:
+        if not source_dir.is_dir():
+            logger.error(f"Source directory not found: {source_dir}")
+            raise typer.Exit(1)
+        backend = store_backend or (detect_backend(workspace_dir) if workspace_dir.exists() else config.store)
+
+        # Trees without changes are skipped before any stage is loaded
+        sources = manifest = None
+        if not resume:
+            try:
+                sources = scan_sources(source_dir)
+            except OSError as e:
+                logger.error(f"Cannot scan source directory {source_dir}: {e}")
+                raise typer.Exit(1)
+            if workspace_dir.exists():
+                store = open_store(workspace_dir, backend)
+                try:
+                    manifest = load_manifest(store)
+                finally:
+                    store.close()
+            if is_up_to_date(manifest, source_dir, round_num, sources):
+                logger.info(f"{source_dir}: round {round_num} is up to date")
+                continue
+        runs.append((source_dir, workspace_dir, backend, sources, manifest))
+    if not runs:
+        logger.info(f"Round {round_num} is up to date for all {len(repos)} source directories")
+        return
+    if plan:
+        # Trees of a multi-repository run always share one pipeline
+        trees = [(source, workspace, backend, sources or scan_sources(source)) for source, workspace, backend, sources, _ in runs]
+        plan_runs(trees, round_num, root_dir, store_backend or config.store, pipelined=True)
+        return
+
+    async def main():
+        from .llm import generate_system_prompt_from_analyses, prewarm_client
+        from .pipeline import PIPELINE_STAGES, PipelineJob, run_pipelines
+        from .scheduler import TIMINGS_KIND, CostModel
+
+        await run_io(root_dir.mkdir, parents=True, exist_ok=True)
+        root_store = await run_io(open_store, root_dir, store_backend or config.store)
+        await run_io(lambda: state.tokens.load(root_store.iter_records("token_usage")))
+        monitor = LoopLagMonitor(threshold=config.loop_lag_threshold)
+        monitor.start()
+        prewarm = asyncio.create_task(prewarm_client())
+
+        jobs = []
+        try:
+            for source_dir, workspace_dir, backend, sources, _ in runs:
+                await ensure_workspace(workspace_dir, backend)
+                store = await run_io(open_store, workspace_dir, backend)
+                journal = Journal(store)
+                job = PipelineJob(source_dir, round_num, workspace_dir, {}, store, journal)
+                jobs.append(job)
+
+                journal_state = await run_io(journal.load) if resume else None
+                if journal_state and round_num in journal_state.plans:
+                    paths = journal_state.plans[round_num]
+                else:
+                    sources = sources or await run_io(scan_sources, source_dir)
+                    paths = sorted(sources)
+                    await run_io(journal.record_plan, round_num, paths)
+                for stage in PIPELINE_STAGES:
+                    stage_round = None if stage == "describe" else round_num
+                    todo = journal_state.pending(stage, stage_round, paths) if journal_state else paths
+                    job.pending[stage] = [source_dir / p for p in todo]
+
+                sizes = sources or await run_io(scan_sources, source_dir)
+                job.costs = await run_io(
+                    lambda: CostModel.from_records({p: size for p, (size, _) in sizes.items()}, store.iter_records(TIMINGS_KIND))
+                )
+                logger.info(f"{source_dir}: {len(job.pending['describe'])} files, workspace {workspace_dir} ({backend} store)")
+
+            await prewarm
+            logger.info(f"Running {len(jobs)} source directories on one shared pipeline...")
+            counts = await run_pipelines(jobs)
+
+            for job, job_counts, (source_dir, _, _, sources, manifest) in zip(jobs, counts, runs):
+                await generate_system_prompt_from_analyses(round_num, job.workspace_dir, job.store)
+                # A tree with failed files, e.g. after the cost limit was hit, is run again next time
+                if sources is not None and not any(c["error"] for c in job_counts.values()):
+                    await run_io(save_manifest, job.store, source_dir, round_num, sources, manifest)
+
+        except Exception as e:
+            logger.exception(e)
+            raise typer.Exit(1)
+        finally:
+            for job in jobs:
+                await run_io(job.store.close)
+            await finish_run(root_store, round_num, monitor)
+
+    asyncio.run(main())
+
+
+def plan_runs(
+    runs: List[Tuple[Path, Path, str, Dict[str, Tuple[int, int]]]],
+    round_num: int,
+    usage_dir: Path,
+    usage_backend: str,
+    pipelined: bool,
+) -> None:
+    """Log the estimated calls, tokens, cost and wall time of a run without calling the API.
+
+    Nothing is written; workspaces that do not exist yet are planned as empty.
+
+    Args:
+        runs: Source directory, workspace directory, store backend and source scan of each tree
+        round_num: Generation round number
+        usage_dir: Workspace holding the token usage of earlier runs
+        usage_backend: Store backend of the usage workspace
+        pipelined: Whether the run would execute the stages as a pipeline
+    """
+
+    async def main():
+        from .budget import TokenPolicy
+        from .cpu import shutdown_cpu_executor
+        from .pipeline import PIPELINE_STAGES
+        from .planner import plan_round, project_wall_time
+        from .scheduler import TIMINGS_KIND, CostModel
+
+        def open_existing(workspace_dir: Path, backend: str):
+            return open_store(workspace_dir, backend) if workspace_dir.exists() else None
+
+        policy = TokenPolicy()
+        usage_store = await run_io(open_existing, usage_dir, usage_backend)
+        if usage_store is not None:
+            await run_io(lambda: policy.load(usage_store.iter_records("token_usage")))
+            await run_io(usage_store.close)
+
+        plans = []
+        try:
+            for source_dir, workspace_dir, backend, sources in runs:
+                store = await run_io(open_existing, workspace_dir, backend)
+                try:
+                    sizes = {p: size for p, (size, _) in sources.items()}
+                    records = await run_io(lambda: list(store.iter_records(TIMINGS_KIND))) if store is not None else []
+                    costs = CostModel.from_records(sizes, records)
+                    plans.append(await plan_round(source_dir, round_num, store, sources, costs, policy, config))
+                finally:
+                    if store is not None:
+                        await run_io(store.close)
+        finally:
+            await run_io(shutdown_cpu_executor)
+
+        wall, stage_wall = project_wall_time([c for p in plans for c in p.chains], config.max_concurrency, pipelined)
+        for plan in plans:
+            logger.info(f"Plan for {plan.source_dir}, round {round_num}: {plan.files} files, {plan.calls} API calls")
+        for stage in PIPELINE_STAGES:
+            estimates = [p.stages[stage] for p in plans]
+            models = {}
+            for estimate in estimates:
+                for model, calls in estimate.models.items():
+                    models[model] = models.get(model, 0) + calls
+            wall_note = f", ~{timedelta(seconds=round(stage_wall[stage]))} wall" if stage in stage_wall else ""
+            logger.info(
+                f"  {stage}: {sum(e.calls for e in estimates)} calls ({sum(e.up_to_date for e in estimates)} up to date), "
+                f"{sum(e.input_tokens for e in estimates):,} in / {sum(e.output_tokens for e in estimates):,} out tokens, "
+                f"${sum(e.cost for e in estimates):.4f}, {sum(e.busy_seconds for e in estimates):.0f}s of calls{wall_note}"
+                + (f" [{', '.join(f'{m}: {n}' for m, n in models.items())}]" if len(models) > 1 else "")
+            )
+        logger.info("  prompt: built locally, no API calls")
+
+        calls = sum(p.calls for p in plans)
+        cost = sum(p.cost for p in plans)
+        tokens_in = sum(e.input_tokens for p in plans for e in p.stages.values())
+        tokens_out = sum(e.output_tokens for p in plans for e in p.stages.values())
+        logger.info(
+            f"Projected: {calls} calls, {tokens_in:,} in / {tokens_out:,} out tokens, ${cost:.2f}, "
+            f"~{timedelta(seconds=round(wall))} wall at concurrency {config.max_concurrency} "
+            f"({'pipeline' if pipelined else 'stage by stage'})"
+        )
+        if config.max_cost is not None and cost > config.max_cost:
+            logger.warning(
+                f"Projected cost exceeds the ${config.max_cost:.2f} limit; "
+                f"the run would stop after about {config.max_cost / cost:.0%} of its calls"
+            )
+
+    asyncio.run(main())
+
+
+async def finish_run(store, round_num: int, monitor: LoopLagMonitor) -> None:
+    """Log the statistics of a run, save its usage records and close the store."""
+    from .cpu import cpu_summary, shutdown_cpu_executor
+    from .llm import get_key_stats, get_pool_stats, get_response_cache
+
+    pool = get_pool_stats()
+    if pool:
+        logger.info(
+            f"Connection pool: {pool['requests']} requests, peak {pool['peak_in_flight']} in flight, "
+            f"mean utilization {pool['mean_utilization']:.0%}, {pool['waited']} waited "
+            f"(mean {pool['mean_wait_ms']}ms, max {pool['max_wait_ms']}ms)"
+        )
+    if state.hedging.hedged:
+        logger.info(
+            f"Hedging: {state.hedging.hedged} of {state.hedging.calls} calls hedged "
+            f"({state.hedging.rate:.1%}), {state.hedging.hedge_wins} won by the hedge, "
+            f"up to ${state.hedging.extra_cost:.4f} extra"
+        )
+    if len(state.models) > 1:
+        for model, stats in state.models.items():
+            logger.info(f"Model {model}: {stats['calls']} calls, ${stats['cost']:.4f}")
+    if state.raw_output["calls"] or state.raw_output["fallbacks"]:
+        logger.info(
+            f"Plain-text output: {state.raw_output['calls']} calls parsed, "
+            f"{state.raw_output['fallbacks']} repeated in structured mode"
+        )
+    cache = get_response_cache().summary()
+    if cache["hits"]:
+        logger.info(f"Response cache: {cache['hits']} duplicate calls answered, {cache['misses']} calls made")
+    keys = get_key_stats()
+    if keys and len(keys) > 1:
+        for name, stats in keys.items():
+            key_usage = state.keys.get(name, {})
+            logger.info(
+                f"API key {name}: {stats['calls']} calls, {stats['throttled']} throttled, "
+                f"{key_usage.get('output_tokens', 0):,} output tokens, ${key_usage.get('cost', 0.0):.4f}"
+            )
+    ttft = state.ttft.summary()
+    for stage, stats in ttft.items():
+        logger.info(
+            f"Time to first token ({stage}): mean {stats['mean_ms']}ms, max {stats['max_ms']}ms "
+            f"over {stats['count']} calls"
+        )
+    await monitor.stop()
+    lag = monitor.summary()
+    logger.info(
+        f"Event loop lag: mean {lag['mean_lag_ms']}ms, max {lag['max_lag_ms']}ms, "
+        f"{lag['stalls']} stalls over {config.loop_lag_threshold * 1000:.0f}ms"
+    )
+    await run_io(shutdown_cpu_executor)
+    cpu = cpu_summary()
+    logger.info(
+        f"CPU: {cpu['process_seconds']}s in this process, {cpu['pool_seconds']}s in the worker pool "
+        f"({cpu['pool_calls']} calls in {cpu['pool_chunks']} chunks), "
+        f"{cpu['utilization']:.0%} of {cpu['cores']} cores over {cpu['wall_seconds']}s"
+    )
+    usage = {
+        "round": round_num,
+        "ts": time.time(),
+        **state.total_usage,
+        "hedging": asdict(state.hedging),
+        "models": state.models,
+        "loop_lag": lag,
+        "cpu": cpu,
+    }
+    if ttft:
+        usage["ttft"] = ttft
+    if state.keys:
+        usage["keys"] = state.keys
+    if config.raw_output:
+        usage["raw_output"] = state.raw_output
+    if cache["hits"]:
+        usage["response_cache"] = cache
+    await run_io(store.append_record, "usage", usage)
+
+    def save_token_usage():
+        for record in state.tokens.new_observations:
+            store.append_record("token_usage", record)
+
+    await run_io(save_token_usage)
+    await run_io(store.close)
+
+
+def inherit_prompt(store, parent_dir: Path, round_num: int) -> None:
+    """Copy the system prompt of a round from the merged workspace into a shard workspace."""
+    name = f"system_{round_num}.md"
+    if round_num == 0 or store.read("prompts", name) is not None or not parent_dir.exists():
+        return
+    parent = open_store(parent_dir, detect_backend(parent_dir))
+    try:
+        prompt = parent.read("prompts", name)
+    finally:
+        parent.close()
+    if prompt is None:
+        logger.warning(f"No system prompt for round {round_num} in {parent_dir}, using the default prompt")
+        return
+    store.write("prompts", name, prompt)
+
+
+@app.command()
+def merge(
+    shard_dirs: List[Path] = typer.Argument(None, help="Shard workspaces (default: shard-*-of-* in the output directory)"),
+    output_dir: Path = typer.Option(None, "--output", "-o", help="Merged workspace directory"),
+    round_num: int = typer.Option(0, "--round", "-r", help="Round whose analyses build the next system prompt"),
+    store_backend: str = typer.Option(None, "--store", help=f"Workspace store backend ({', '.join(STORE_BACKENDS)})"),
+):
+    """Merge shard workspaces and build the next system prompt from all analyses."""
+    workspace_dir = output_dir or config.output_dir
+    backend = store_backend or (detect_backend(workspace_dir) if workspace_dir.exists() else config.store)
+    shard_dirs = shard_dirs or find_shard_workspaces(workspace_dir)
+    if not shard_dirs:
+        logger.error(f"No shard workspaces found in {workspace_dir}")
+        raise typer.Exit(1)
+
+    async def main():
+        from .llm import generate_system_prompt_from_analyses
+
+        await ensure_workspace(workspace_dir, backend)
+        dest = await run_io(open_store, workspace_dir, backend)
+        shards = [await run_io(open_store, d, detect_backend(d)) for d in shard_dirs]
+        try:
+            counts = await run_io(merge_workspaces, shards, dest)
+            logger.info(
+                f"Merged {len(shards)} shards into {workspace_dir}: {counts['artifacts']} artifacts, "
+                f"{counts['records']} records, {counts['meta']} metadata documents"
+            )
+            await generate_system_prompt_from_analyses(round_num, workspace_dir, dest)
+        finally:
+            for store in [*shards, dest]:
+                await run_io(store.close)
+
+    asyncio.run(main())
+
+
+@app.command()
+def worker(
+    source_dir: Path = typer.Argument(..., help="Source code directory"),
+    round_num: int = typer.Option(0, "--round", "-r", help="Generation round"),
+    output_dir: Path = typer.Option(None, "--output", "-o", help="Shared workspace directory"),
+    store_backend: str = typer.Option(None, "--store", help=f"Workspace store backend ({', '.join(STORE_BACKENDS)})"),
+    worker_id: str = typer.Option(None, "--id", help="Worker id (default: host:pid)"),
+    lease: float = typer.Option(600.0, "--lease", help="Seconds before the files of an unresponsive worker are reclaimed"),
+    poll: float = typer.Option(5.0, "--poll", help="Seconds between checks for reclaimable files"),
+    reset: bool = typer.Option(False, "--reset", help="Queue every file of the round again"),
+):
+    """Claim files from the workspace's task queue alongside other workers."""
+    workspace_dir = output_dir or config.output_dir
+    backend = store_backend or (detect_backend(workspace_dir) if workspace_dir.exists() else config.store)
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+
+    if not source_dir.is_dir():
+        logger.error(f"Source directory not found: {source_dir}")
+        raise typer.Exit(1)
+
+    async def main():
+        from .generator import write_generation_metadata
+        from .llm import generate_system_prompt_from_analyses, prewarm_client
+        from .pipeline import PIPELINE_STAGES
+        from .results import StatusCounts
+        from .scheduler import TIMINGS_KIND, CostModel
+        from .work_queue import WorkQueue
+        from .worker import run_worker
+
+        logger.info(f"Worker {worker_id} using workspace directory: {workspace_dir} ({backend} store)")
+
+        sources = await run_io(scan_sources, source_dir)
+        if not sources:
+            logger.error(f"No files found in {source_dir}")
+            raise typer.Exit(1)
+
+        await ensure_workspace(workspace_dir, backend)
+        store = await run_io(open_store, workspace_dir, backend)
+        queue = await run_io(WorkQueue, workspace_dir, lease)
+        journal = Journal(store)
+        await run_io(lambda: state.tokens.load(store.iter_records("token_usage")))
+        monitor = LoopLagMonitor(threshold=config.loop_lag_threshold)
+        monitor.start()
+
+        try:
+            costs = await run_io(
+                lambda: CostModel.from_records({p: size for p, (size, _) in sources.items()}, store.iter_records(TIMINGS_KIND))
+            )
+            if reset:
+                await run_io(queue.reset, round_num)
+            # Every worker offers the file set; only the first one to start queues it, and
+            # files changed since they were processed are queued again
+            queued = await run_io(
+                queue.enqueue,
+                round_num,
+                [(p, costs.remaining(PIPELINE_STAGES, p), mtime_ns) for p, (_, mtime_ns) in sorted(sources.items())],
+            )
+            if queued:
+                logger.info(f"Queued {queued} files for round {round_num}")
+                await run_io(journal.record_plan, round_num, sorted(sources))
+
+            await prewarm_client()
+            counts = await run_worker(source_dir, round_num, workspace_dir, store, queue, worker_id, journal, costs, poll)
+            logger.info(
+                f"Worker {worker_id} finished: {counts['generate'].total} files generated, "
+                f"{sum(c['error'] for c in counts.values())} errors"
+            )
+
+            # The worker that sees the queue drained first builds the next system prompt
+            if await run_io(queue.try_finalize, round_num, worker_id):
+                results = await run_io(queue.results, round_num)
+                generated = StatusCounts(status for status, count in results.items() for _ in range(count))
+                await write_generation_metadata(store, round_num, sum(results.values()), generated)
+                logger.info("Generating system prompt for next round...")
+                await generate_system_prompt_from_analyses(round_num, workspace_dir, store)
+                # Failed files of any worker keep the round from being recorded as complete
+                if results.get("error") or any(c["error"] for c in counts.values()):
+                    logger.warning(f"Round {round_num} had failed files and will be retried by the next run")
+                else:
+                    manifest = await run_io(load_manifest, store)
+                    await run_io(save_manifest, store, source_dir, round_num, sources, manifest)
+        except Exception as e:
+            logger.exception(e)
+            raise typer.Exit(1)
+        finally:
+            await run_io(queue.close)
+            await finish_run(store, round_num, monitor)
 
     asyncio.run(main())
 
 
+@app.command()
+def watch(
+    source_dir: Path = typer.Argument(..., help="Source code directory"),
+    round_num: int = typer.Option(0, "--round", "-r", help="Generation round"),
+    output_dir: Path = typer.Option(None, "--output", "-o", help="Output directory"),
+    store_backend: str = typer.Option(None, "--store", help=f"Workspace store backend ({', '.join(STORE_BACKENDS)})"),
+    interval: float = typer.Option(1.0, "--interval", help="Seconds between scans of the source directory"),
+    debounce: float = typer.Option(0.5, "--debounce", help="Seconds without changes before changed files are processed"),
+    retry_delay: float = typer.Option(60.0, "--retry-delay", help="Seconds before failed files are retried"),
+):
+    """Keep regenerating changed files of a round until interrupted."""
+    workspace_dir = output_dir or config.output_dir
+    backend = store_backend or (detect_backend(workspace_dir) if workspace_dir.exists() else config.store)
+
+    if not source_dir.is_dir():
+        logger.error(f"Source directory not found: {source_dir}")
+        raise typer.Exit(1)
+
+    async def main():
+        import signal
+
+        from .llm import prewarm_client
+        from .scheduler import TIMINGS_KIND, CostModel
+        from .watch import watch_sources
+
+        logger.info(f"Using workspace directory: {workspace_dir} ({backend} store)")
+        await ensure_workspace(workspace_dir, backend)
+        store = await run_io(open_store, workspace_dir, backend)
+        journal = Journal(store)
+        await run_io(lambda: state.tokens.load(store.iter_records("token_usage")))
+        monitor = LoopLagMonitor(threshold=config.loop_lag_threshold)
+        monitor.start()
+
+        # Finish the running batch's bookkeeping on Ctrl+C or SIGTERM instead of cancelling it
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                pass
+
+        try:
+            costs = await run_io(lambda: CostModel.from_records({}, store.iter_records(TIMINGS_KIND)))
+            await prewarm_client()
+            batches = await watch_sources(
+                source_dir, round_num, workspace_dir, store, journal, costs, interval, debounce, retry_delay, stop
+            )
+            logger.info(f"Stopped watching after {batches} batches")
+        except Exception as e:
+            logger.exception(e)
+            raise typer.Exit(1)
+        finally:
+            await finish_run(store, round_num, monitor)
+
+    asyncio.run(main())
+
+
+@app.command()
+def score(
+    source_dir: Path = typer.Argument(..., help="Source code directory"),
+    output_dir: Path = typer.Option(None, "--output", "-o", help="Workspace directory"),
+    store_backend: str = typer.Option(None, "--store", help=f"Workspace store backend ({', '.join(STORE_BACKENDS)})"),
+    bits: int = typer.Option(12, "--bits", help="Feature vector length as a power of two"),
+    min_gain: float = typer.Option(0.005, "--min-gain", help="Mean similarity gain below which rounds count as converged"),
+):
+    """Score every round's generated code against the sources without API calls."""
+    workspace_dir = output_dir or config.output_dir
+    if importlib.util.find_spec("numpy") is None:
+        logger.error("Scoring needs NumPy: pip install 'code_diff_doc_gen[scoring]'")
+        raise typer.Exit(1)
+    if not workspace_dir.exists() or not source_dir.is_dir():
+        logger.error(f"Workspace {workspace_dir} or source directory {source_dir} not found")
+        raise typer.Exit(1)
+    backend = store_backend or detect_backend(workspace_dir)
+
+    async def main():
+        from .cpu import shutdown_cpu_executor
+        from .scoring import SCORES_FILE, find_rounds, save_scores, score_rounds, summarize
+
+        store = await run_io(open_store, workspace_dir, backend)
+        try:
+            rounds = await run_io(find_rounds, store)
+            if not rounds:
+                logger.error(f"No generated code found in {workspace_dir}")
+                raise typer.Exit(1)
+            files = sorted(await run_io(scan_sources, source_dir))
+            logger.info(f"Scoring {len(files)} files over {len(rounds)} rounds...")
+            scores = await score_rounds(source_dir, files, store, rounds, bits)
+            summary = summarize(files, rounds, scores, min_gain)
+            await run_io(save_scores, store, files, rounds, scores, summary)
+
+            for entry in summary["rounds"]:
+                gain = f", gain {entry['gain']:+.4f} ({entry['improved']} improved, {entry['regressed']} regressed)" if entry.get("gain") is not None else ""
+                mean = f"mean {entry['mean']:.4f}, median {entry['median']:.4f}, p10 {entry['p10']:.4f}" if entry["files"] else "no files"
+                logger.info(f"Round {entry['round']}: {entry['files']} files, {mean}{gain}")
+            logger.info(
+                f"{'Converged' if summary['converged'] else 'Not converged'} (minimum gain {min_gain}); "
+                f"matrix saved to {workspace_dir / SCORES_FILE}"
+            )
+        finally:
+            await run_io(store.close)
+            await run_io(shutdown_cpu_executor)
+
+    asyncio.run(main())
+
+
+@app.command()
+def export(
+    dest_dir: Path = typer.Argument(..., help="Directory to materialize the workspace into"),
+    output_dir: Path = typer.Option(None, "--output", "-o", help="Workspace directory to export"),
+    store_backend: str = typer.Option(None, "--store", help=f"Workspace store backend ({', '.join(STORE_BACKENDS)})"),
+):
+    """Materialize a workspace store as the mirrored directory layout."""
+    workspace_dir = output_dir or config.output_dir
+    if not workspace_dir.exists():
+        logger.error(f"Workspace not found: {workspace_dir}")
+        raise typer.Exit(1)
+    store = open_store(workspace_dir, store_backend or detect_backend(workspace_dir))
+    try:
+        count = export_workspace(store, dest_dir)
+    finally:
+        store.close()
+    logger.info(f"Exported {count} artifacts from {workspace_dir} to {dest_dir}")
+
+
+def open_blob_store(output_dir: Optional[Path]):
+    """Open an existing workspace that uses the blob store backend."""
+    workspace_dir = output_dir or config.output_dir
+    if not workspace_dir.exists() or detect_backend(workspace_dir) != "blobs":
+        logger.error(f"{workspace_dir} is not a workspace with the blobs store")
+        raise typer.Exit(1)
+    return open_store(workspace_dir, "blobs")
+
+
+@app.command()
+def gc(
+    output_dir: Path = typer.Option(None, "--output", "-o", help="Workspace directory"),
+):
+    """Compact reference logs and delete unreferenced blobs of a blobs workspace."""
+    store = open_blob_store(output_dir)
+    try:
+        stats = store.gc()
+    finally:
+        store.close()
+    logger.info(
+        f"Compacted {stats['compacted']} reference logs, removed {stats['removed']} blobs "
+        f"({stats['freed'] / 1024:.1f} KiB)"
+    )
+
+
+@app.command()
+def archive(
+    rounds: List[int] = typer.Option(None, "--round", "-r", help="Round to archive (repeatable)"),
+    keep: int = typer.Option(None, "--keep", help="Archive all live rounds except the latest N"),
+    output_dir: Path = typer.Option(None, "--output", "-o", help="Workspace directory"),
+):
+    """Pack retired rounds of a blobs workspace into compressed archives."""
+    store = open_blob_store(output_dir)
+    try:
+        rounds = list(rounds or [])
+        if keep is not None:
+            live = store.live_rounds()
+            rounds += live[: max(0, len(live) - keep)]
+        if not rounds:
+            logger.error("Nothing to archive, pass --round or --keep")
+            raise typer.Exit(1)
+        for round_num in sorted(set(rounds)):
+            try:
+                store.archive_round(round_num)
+            except ValueError as e:
+                logger.warning(str(e))
+        stats = store.gc()
+    finally:
+        store.close()
+    logger.info(f"Removed {stats['removed']} blobs no longer used by live rounds ({stats['freed'] / 1024:.1f} KiB)")
+
+
 def main():
     """CLI entry point."""
     app()
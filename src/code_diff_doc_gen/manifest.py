@@ -0,0 +1,144 @@
+"""Source manifest used to detect when a run has nothing to do."""
+
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .store import WorkspaceStore
+
+MANIFEST_NAME = "manifest.json"
+
+
+def scan_sources(source_dir: Path) -> Dict[str, Tuple[int, int]]:
+    """Stat every non-hidden source file without reading it.
+
+    Uses ``os.scandir`` so each directory entry costs at most one stat call.
+    Like ``Path.rglob``, symlinked files are listed but symlinked directories
+    are not descended into, so symlink cycles cannot recurse forever.
+
+    Args:
+        source_dir: Directory containing source files
+
+    Returns:
+        Mapping of POSIX path relative to the source directory to (size, mtime_ns)
+    """
+    entries: Dict[str, Tuple[int, int]] = {}
+    stack: List[Tuple[str, str]] = [(str(source_dir), "")]
+    while stack:
+        directory, prefix = stack.pop()
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((entry.path, f"{prefix}{entry.name}/"))
+                elif entry.is_file(follow_symlinks=True) and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    entries[f"{prefix}{entry.name}"] = (stat.st_size, stat.st_mtime_ns)
+    return entries
+
+
+def stat_sources(source_dir: Path, keys: List[str]) -> Dict[str, Tuple[int, int]]:
+    """Stat given source files, without scanning the rest of the tree.
+
+    Args:
+        source_dir: Directory containing source files
+        keys: POSIX paths relative to the source directory
+
+    Returns:
+        Mapping of each path to (size, mtime_ns)
+
+    Raises:
+        FileNotFoundError: If a file does not exist
+    """
+    entries = {}
+    for key in keys:
+        stat = os.stat(source_dir / key)
+        entries[key] = (stat.st_size, stat.st_mtime_ns)
+    return entries
+
+
+def load_manifest(store: WorkspaceStore) -> Optional[Dict]:
+    """Load the workspace manifest.
+
+    Args:
+        store: Workspace store holding the manifest
+
+    Returns:
+        Manifest document, or None if no run has completed yet
+    """
+    return store.read_meta(MANIFEST_NAME)
+
+
+def is_up_to_date(manifest: Optional[Dict], source_dir: Path, round_num: int, files: Dict[str, Tuple[int, int]]) -> bool:
+    """Check whether a round already completed for the current source tree.
+
+    Args:
+        manifest: Manifest document from the last completed run
+        source_dir: Directory containing source files
+        round_num: Generation round number
+        files: Current scan of the source directory
+
+    Returns:
+        True if the round completed and no source file changed since
+    """
+    if not manifest or round_num not in manifest.get("rounds", []):
+        return False
+    if manifest.get("source_dir") != str(source_dir.resolve()):
+        return False
+    recorded = manifest.get("files", {})
+    return len(recorded) == len(files) and all(
+        tuple(recorded.get(path, ())) == stat for path, stat in files.items()
+    )
+
+
+def is_file_up_to_date(
+    manifest: Optional[Dict], source_dir: Path, round_num: int, key: str, stat: Tuple[int, int]
+) -> bool:
+    """Check whether a file is unchanged since a completed round recorded it.
+
+    Args:
+        manifest: Manifest document from the last completed run
+        source_dir: Directory containing source files
+        round_num: Generation round number
+        key: Source path relative to the source directory
+        stat: Current (size, mtime_ns) of the file
+
+    Returns:
+        True if the round completed and the file's artifacts are current
+    """
+    if not manifest or round_num not in manifest.get("rounds", []):
+        return False
+    if manifest.get("source_dir") != str(source_dir.resolve()):
+        return False
+    return tuple(manifest.get("files", {}).get(key, ())) == stat
+
+
+def save_manifest(
+    store: WorkspaceStore,
+    source_dir: Path,
+    round_num: int,
+    files: Dict[str, Tuple[int, int]],
+    previous: Optional[Dict] = None,
+) -> None:
+    """Record a completed round for the scanned source tree.
+
+    Completed rounds are kept only while the source tree is unchanged.
+
+    Args:
+        store: Workspace store to write the manifest to
+        source_dir: Directory containing source files
+        round_num: Generation round number that completed
+        files: Scan of the source directory taken at the start of the run
+        previous: Previously loaded manifest, if any
+    """
+    rounds = []
+    if previous and is_up_to_date({**previous, "rounds": [round_num]}, source_dir, round_num, files):
+        rounds = [r for r in previous.get("rounds", []) if r != round_num]
+
+    store.write_meta(
+        MANIFEST_NAME,
+        {
+            "source_dir": str(source_dir.resolve()),
+            "rounds": sorted(rounds + [round_num]),
+            "files": {path: list(stat) for path, stat in sorted(files.items())},
+        },
+    )
@@ -0,0 +1,107 @@
+"""Runtime monitors for the asyncio event loop."""
+
+import asyncio
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+
+class LoopLagMonitor:
+    """Measure how late the event loop wakes up a periodic timer.
+
+    Any lag above the threshold means a coroutine held the loop with blocking
+    work, delaying every in-flight API call.
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1):
+        """Initialize monitor.
+
+        Args:
+            interval: Seconds between timer wake-ups
+            threshold: Lag in seconds reported as a stall
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.samples = 0
+        self.stalls = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - start - self.interval)
+            self.samples += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self.stalls += 1
+                logger.warning(f"Event loop stalled for {lag * 1000:.0f}ms")
+
+    def start(self) -> None:
+        """Start sampling on the running loop."""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop sampling."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def summary(self) -> Dict[str, float]:
+        """Summarize observed loop lag.
+
+        Returns:
+            Sample count, stall count, mean and max lag in milliseconds
+        """
+        mean = self.total_lag / self.samples if self.samples else 0.0
+        return {
+            "samples": self.samples,
+            "stalls": self.stalls,
+            "mean_lag_ms": round(mean * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+        }
+
+    async def __aenter__(self) -> "LoopLagMonitor":
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+
+class StageLatency:
+    """Per-stage latency counters, e.g. time to first token of API calls."""
+
+    def __init__(self):
+        """Initialize counters."""
+        self._stages: Dict[str, List[float]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record one latency sample for a stage.
+
+        Args:
+            stage: Pipeline stage name
+            seconds: Observed latency
+        """
+        count, total, peak = self._stages.get(stage, (0, 0.0, 0.0))
+        self._stages[stage] = [count + 1, total + seconds, max(peak, seconds)]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Summarize the samples of every stage.
+
+        Returns:
+            Sample count, mean and max latency in milliseconds per stage
+        """
+        return {
+            stage: {"count": count, "mean_ms": round(total / count * 1000, 1), "max_ms": round(peak * 1000, 1)}
+            for stage, (count, total, peak) in self._stages.items()
+        }
@@ -0,0 +1,236 @@
+"""Pipelined execution of the describe, generate and analyze stages.
+
+Instead of waiting for every file to finish a stage before the next stage
+starts, each file moves on as soon as its previous stage is done. Idle workers
+always pick the ready task with the longest remaining critical path (the
+estimated time of the task plus all downstream stages of its file), so the
+files that determine total wall time are never left waiting.
+"""
+
+import asyncio
+import heapq
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+from tqdm import tqdm
+
+from .config import config
+from .diff import _compare_single_file
+from .fileio import run_io
+from .generator import generate_file, write_generation_metadata
+from .journal import Journal
+from .llm import load_system_prompt
+from .processor import read_file
+from .results import StatusCounts
+from .scheduler import CostModel
+from .store import WorkspaceStore
+
+PIPELINE_STAGES = ("describe", "generate", "analyze")
+
+
+async def run_file_stage(
+    stage: str,
+    path: Path,
+    source_dir: Path,
+    round_num: int,
+    prompt: str,
+    store: WorkspaceStore,
+    journal: Optional[Journal] = None,
+) -> str:
+    """Run one stage for one file and map its result to a status.
+
+    Args:
+        stage: Stage name from ``PIPELINE_STAGES``
+        path: Source file path
+        source_dir: Directory containing source files
+        round_num: Generation round number
+        prompt: System prompt of the round
+        store: Workspace store
+        journal: Optional run journal to record completion in
+
+    Returns:
+        ``generated``, ``analyzed``, ``skipped`` or ``error``
+    """
+    if stage == "describe":
+        return (await read_file(path, store, source_dir, journal)).status
+    if stage == "generate":
+        return (await generate_file(path, round_num, prompt, store, source_dir, journal)).status
+    diff = await _compare_single_file(path, path.relative_to(source_dir), round_num, store, journal)
+    return "error" if diff.error else "skipped" if diff.skipped else "analyzed"
+
+
+@dataclass
+class FileEvent:
+    """Outcome of one stage for one file."""
+
+    source_dir: Path
+    path: str
+    stage: str
+    status: str
+    seconds: float
+    error: Optional[str] = None
+    # Artifact the stage produced, filled in by consumers that read it back
+    output: Optional[str] = None
+
+
+@dataclass
+class PipelineJob:
+    """Files of one source tree and the workspace they are processed into."""
+
+    source_dir: Path
+    round_num: int
+    workspace_dir: Path
+    pending: Dict[str, List[Path]]
+    store: WorkspaceStore
+    journal: Optional[Journal] = None
+    costs: CostModel = field(default_factory=CostModel)
+
+
+async def run_pipeline(
+    source_dir: Path,
+    round_num: int,
+    workspace_dir: Path,
+    pending: Dict[str, List[Path]],
+    store: WorkspaceStore,
+    journal: Optional[Journal] = None,
+    costs: Optional[CostModel] = None,
+) -> Dict[str, StatusCounts]:
+    """Run the per-file stages as a pipeline with critical-path priority.
+
+    Args:
+        source_dir: Directory containing source files
+        round_num: Generation round number
+        workspace_dir: Path to workspace directory
+        pending: Files still to process, by stage name
+        store: Workspace store
+        journal: Optional run journal to record completion in
+        costs: Cost model used to prioritize work
+
+    Returns:
+        Status counts by stage
+    """
+    job = PipelineJob(source_dir, round_num, workspace_dir, pending, store, journal, costs or CostModel())
+    return (await run_pipelines([job]))[0]
+
+
+async def run_pipelines(
+    jobs: List[PipelineJob],
+    on_event: Optional[Callable[[FileEvent], None]] = None,
+    file_timeout: Optional[float] = None,
+    concurrency: Optional[int] = None,
+    progress: bool = True,
+) -> List[Dict[str, StatusCounts]]:
+    """Run the pipelines of several source trees on one shared set of workers.
+
+    Tasks of all jobs compete in one critical-path queue, so the
+    ``config.max_concurrency`` slots stay busy until the last file of any tree
+    is done, instead of idling while one tree's stragglers finish.
+
+    Args:
+        jobs: Source trees with their pending files, stores and cost models
+        on_event: Callback receiving the outcome of every stage of every file
+        file_timeout: Seconds a file may take from the start of its first stage;
+            a stage still running then is cancelled and the file fails
+        concurrency: Maximum stages in flight (default: config.max_concurrency)
+        progress: Whether to show a progress bar
+
+    Returns:
+        Status counts by stage, for each job
+    """
+    prompts = [await run_io(load_system_prompt, job.round_num, job.workspace_dir, job.store) for job in jobs]
+
+    # Each file runs the stages it still needs, in pipeline order
+    todo: Dict[Tuple[int, str], Tuple[Path, List[str]]] = {}
+    for number, job in enumerate(jobs):
+        for stage in PIPELINE_STAGES:
+            for path in job.pending.get(stage, []):
+                key = path.relative_to(job.source_dir).as_posix()
+                todo.setdefault((number, key), (path, []))[1].append(stage)
+
+    counts = [{stage: StatusCounts() for stage in PIPELINE_STAGES} for _ in jobs]
+    total = sum(len(stages) for _, stages in todo.values())
+
+    heap: List[Tuple[float, int, str, int]] = []
+
+    def push(number: int, key: str, index: int) -> None:
+        stages = todo[number, key][1][index:]
+        heapq.heappush(heap, (-jobs[number].costs.remaining(stages, key), number, key, index))
+
+    for number, key in todo:
+        push(number, key, 0)
+
+    ready = asyncio.Condition()
+    active = 0
+    started: Dict[Tuple[int, str], float] = {}
+
+    async def run_stage(number: int, key: str, stage: str, path: Path) -> str:
+        job = jobs[number]
+        call = run_file_stage(stage, path, job.source_dir, job.round_num, prompts[number], job.store, job.journal)
+        if file_timeout is None:
+            return await call
+        remaining = file_timeout - (time.monotonic() - started.setdefault((number, key), time.monotonic()))
+        return await asyncio.wait_for(call, max(0.0, remaining))
+
+    with tqdm(total=total, desc="Pipeline", disable=not progress) as bar:
+
+        async def worker() -> None:
+            nonlocal active
+            while True:
+                async with ready:
+                    # Wait while other workers may still push follow-up stages
+                    while not heap and active:
+                        await ready.wait()
+                    if not heap:
+                        return
+                    _, number, key, index = heapq.heappop(heap)
+                    active += 1
+
+                job = jobs[number]
+                path, stages = todo[number, key]
+                stage = stages[index]
+                status = "error"
+                error = None
+                start = time.monotonic()
+                try:
+                    status = await run_stage(number, key, stage, path)
+                    job.costs.observe(stage, key, time.monotonic() - start, None if stage == "describe" else job.round_num)
+                except asyncio.TimeoutError:
+                    error = f"Deadline of {file_timeout}s exceeded"
+                    logger.error(f"{stage} of {path}: {error}")
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+                    raise
+                finally:
+                    counts[number][stage].add(status)
+                    bar.update()
+                    if on_event:
+                        on_event(FileEvent(job.source_dir, key, stage, status, time.monotonic() - start, error))
+                    async with ready:
+                        active -= 1
+                        if status != "error" and index + 1 < len(stages):
+                            push(number, key, index + 1)
+                        else:
+                            # Later stages of a failed file are dropped from the progress total
+                            bar.total -= len(stages) - index - 1
+                        ready.notify_all()
+
+        workers = max(1, min(concurrency or config.max_concurrency, len(todo)))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+
+    for job, job_counts in zip(jobs, counts):
+        await run_io(job.costs.save, job.store)
+        if job.pending.get("generate"):
+            await write_generation_metadata(job.store, job.round_num, len(job.pending["generate"]), job_counts["generate"])
+        else:
+            await run_io(job.store.flush)
+
+        logger.info(
+            f"Pipeline completed{f' for {job.source_dir}' if len(jobs) > 1 else ''}: "
+            f"{job_counts['describe'].total} described, {job_counts['generate'].total} generated, "
+            f"{job_counts['analyze']['analyzed']} analyzed, "
+            f"{sum(c['error'] for c in job_counts.values())} errors"
+        )
+    return counts
@@ -0,0 +1,281 @@
+"""Dry-run planning of a round: pending calls, tokens, cost and wall time.
+
+A plan applies the same freshness checks as the stages to find the calls a
+run would make, without making any of them. Tokens are estimated locally from
+text sizes and the workspace's token policy, cost uses the per-model pricing
+of the usage statistics, and wall time is projected by replaying the run's
+scheduling over the workspace's historical latencies.
+"""
+
+import heapq
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .budget import TokenPolicy, estimate_tokens
+from .config import usage_cost
+from .cpu import map_cpu
+from .fileio import run_io
+from .pipeline import PIPELINE_STAGES
+from .routing import Complexity, model_spec, route_model, score_file
+from .scheduler import CostModel
+from .store import WorkspaceStore
+
+# Tokens of each stage's fixed instructions and message framing, excluding the round's system prompt
+STAGE_PROMPT_TOKENS: Dict[str, int] = {"describe": 400, "generate": 80, "analyze": 200}
+
+# System prompts shorter than this are not cached by the API
+MIN_CACHEABLE_TOKENS = 1024
+
+
+@dataclass
+class CallUsage:
+    """Estimated usage of one call, with the fields of the API's usage report."""
+
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_input_tokens: int = 0
+    cache_read_input_tokens: int = 0
+
+
+@dataclass
+class StageEstimate:
+    """Estimated work of one stage."""
+
+    calls: int = 0
+    up_to_date: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+    busy_seconds: float = 0.0
+    models: Dict[str, int] = field(default_factory=dict)
+
+    def add(self, usage: CallUsage, model: str, seconds: float) -> None:
+        """Add one planned call."""
+        self.calls += 1
+        self.input_tokens += usage.input_tokens + usage.cache_creation_input_tokens + usage.cache_read_input_tokens
+        self.output_tokens += usage.output_tokens
+        self.cost += usage_cost(usage, model)
+        self.busy_seconds += seconds
+        self.models[model] = self.models.get(model, 0) + 1
+
+
+@dataclass
+class RunPlan:
+    """Estimated calls of a round for one source tree."""
+
+    source_dir: Path
+    files: int
+    stages: Dict[str, StageEstimate] = field(default_factory=lambda: {s: StageEstimate() for s in PIPELINE_STAGES})
+    # Estimated seconds of the stages each file still needs, in stage order
+    chains: List[List[Tuple[str, float]]] = field(default_factory=list)
+
+    @property
+    def calls(self) -> int:
+        """Total planned API calls."""
+        return sum(s.calls for s in self.stages.values())
+
+    @property
+    def cost(self) -> float:
+        """Total projected cost in USD."""
+        return sum(s.cost for s in self.stages.values())
+
+
+def pending_calls(
+    source_dir: Path, round_num: int, store: Optional[WorkspaceStore], sources: Dict[str, Tuple[int, int]]
+) -> Dict[str, List[str]]:
+    """Find the files each stage would make an API call for.
+
+    Mirrors the freshness checks of the stages: a description older than its
+    source, a generation older than its description and an analysis not newer
+    than both its inputs are redone, as is everything downstream of a redone
+    stage.
+
+    Args:
+        source_dir: Directory containing source files
+        round_num: Generation round number
+        store: Workspace store, or None if the workspace does not exist yet
+        sources: Scan of the files to plan, relative path to (size, mtime_ns)
+
+    Returns:
+        Relative paths by stage
+    """
+    pending: Dict[str, List[str]] = {stage: [] for stage in PIPELINE_STAGES}
+    for key, (_, mtime_ns) in sorted(sources.items()):
+        mtime = mtime_ns / 1e9
+        if store is None:
+            described = generated = analyzed = None
+        else:
+            described = store.mtime("descriptions", key)
+            generated = store.mtime(f"generated/round_{round_num}", key)
+            analyzed = store.mtime(f"analysis/round_{round_num}", key)
+
+        describe = described is None or described < mtime
+        generate = describe or generated is None or generated < described
+        analyze = generate or analyzed is None or not (analyzed > mtime and analyzed > generated)
+        for stage, needed in zip(PIPELINE_STAGES, (describe, generate, analyze)):
+            if needed:
+                pending[stage].append(key)
+    return pending
+
+
+def estimate_output_tokens(stage: str, source_tokens: int, model: str, policy: TokenPolicy, app_config) -> int:
+    """Estimate the output tokens of a call, thinking included.
+
+    Uses the output ratio learned from earlier runs of the workspace when the
+    policy has one, otherwise the configured thinking budget and answer ratio.
+
+    Args:
+        stage: Pipeline stage of the call
+        source_tokens: Estimated tokens of the source the call works on
+        model: Model the call is routed to
+        policy: Token policy of the workspace
+        app_config: Application configuration with the stage defaults
+
+    Returns:
+        Estimated output tokens, at most the call's output cap
+    """
+    max_tokens, thinking = policy.plan(stage, source_tokens, app_config)
+    answer = int(source_tokens * app_config.stage_output_ratio.get(stage, 1.0))
+    if not model_spec(model).thinking:
+        return min(answer, max_tokens - thinking)
+    learned = policy.learned_ratio(stage)
+    if learned:
+        return min(int(source_tokens * learned), max_tokens)
+    return min(thinking + answer, max_tokens)
+
+
+async def plan_round(
+    source_dir: Path,
+    round_num: int,
+    store: Optional[WorkspaceStore],
+    sources: Dict[str, Tuple[int, int]],
+    costs: CostModel,
+    policy: TokenPolicy,
+    app_config,
+) -> RunPlan:
+    """Estimate the calls, tokens, cost and busy time of a round without calling the API.
+
+    Input sizes come from the existing descriptions and generations where a
+    stage is up to date, and from the expected output of the stage before it
+    otherwise. The round's system prompt is counted once as a cache write and
+    then as cache reads, as the stages mark it for prompt caching.
+
+    Args:
+        source_dir: Directory containing source files
+        round_num: Generation round number
+        store: Workspace store, or None if the workspace does not exist yet
+        sources: Scan of the files to plan, relative path to (size, mtime_ns)
+        costs: Cost model with the historical latencies of the workspace
+        policy: Token policy with the output ratios of the workspace
+        app_config: Application configuration
+
+    Returns:
+        Plan with per-stage estimates and the per-file stage chains
+    """
+    pending = await run_io(pending_calls, source_dir, round_num, store, sources)
+    plan = RunPlan(source_dir, len(sources))
+    for stage in PIPELINE_STAGES:
+        plan.stages[stage].up_to_date = len(sources) - len(pending[stage])
+
+    system_tokens = 0
+    if round_num > 0 and store is not None:
+        prompt = await run_io(store.read, "prompts", f"system_{round_num}.md")
+        system_tokens = estimate_tokens(len(prompt or ""))
+
+    complexity: Dict[str, Complexity] = {}
+    if app_config.routing:
+        keys = sorted(set(pending["describe"]) | set(pending["generate"]))
+        scores = await map_cpu(score_file, [(source_dir / key,) for key in keys])
+        complexity = dict(zip(keys, scores))
+
+    def read_size(namespace: str, key: str) -> Optional[int]:
+        content = store.read(namespace, key) if store is not None else None
+        return None if content is None else len(content)
+
+    stage_sets = {stage: set(keys) for stage, keys in pending.items()}
+    cached_prompt = {stage: False for stage in PIPELINE_STAGES}
+    for key in sorted(stage_sets["analyze"]):
+        source_tokens = estimate_tokens(sources[key][0])
+        chain = []
+        description_tokens = generated_tokens = None
+        for stage in PIPELINE_STAGES:
+            if key not in stage_sets[stage]:
+                continue
+            if stage == "describe":
+                input_tokens = call_tokens = source_tokens
+            elif stage == "generate":
+                if description_tokens is None:
+                    size = await run_io(read_size, "descriptions", key)
+                    description_tokens = estimate_tokens(size) if size is not None else source_tokens
+                input_tokens, call_tokens = description_tokens, source_tokens
+            else:
+                if generated_tokens is None:
+                    size = await run_io(read_size, f"generated/round_{round_num}", key)
+                    generated_tokens = estimate_tokens(size) if size is not None else source_tokens
+                input_tokens = call_tokens = source_tokens + generated_tokens
+
+            model = route_model(stage, call_tokens, complexity.get(key), app_config)
+            output_tokens = estimate_output_tokens(stage, call_tokens, model, policy, app_config)
+            usage = CallUsage(input_tokens + STAGE_PROMPT_TOKENS[stage], output_tokens)
+            if stage == "generate" and system_tokens:
+                if system_tokens < MIN_CACHEABLE_TOKENS:
+                    usage.input_tokens += system_tokens
+                elif cached_prompt[stage]:
+                    usage.cache_read_input_tokens = system_tokens
+                else:
+                    usage.cache_creation_input_tokens = system_tokens
+                    cached_prompt[stage] = True
+
+            seconds = costs.estimate(stage, key)
+            plan.stages[stage].add(usage, model, seconds)
+            chain.append((stage, seconds))
+
+            # Outputs feed the next stage's input
+            if stage == "describe":
+                description_tokens = int(source_tokens * app_config.stage_output_ratio.get("describe", 1.0)) + 1
+            elif stage == "generate":
+                generated_tokens = source_tokens
+        plan.chains.append(chain)
+    return plan
+
+
+def project_wall_time(
+    chains: List[List[Tuple[str, float]]], concurrency: int, pipelined: bool
+) -> Tuple[float, Dict[str, float]]:
+    """Project the wall time of a run by replaying its scheduling.
+
+    A pipelined run starts every file's next stage as soon as it is ready and
+    gives idle workers the task with the longest remaining chain. Otherwise
+    the stages run one after another, each largest-first.
+
+    Args:
+        chains: Estimated seconds of each file's pending stages, in stage order
+        concurrency: Maximum calls in flight
+        pipelined: Whether stages run as a pipeline
+
+    Returns:
+        Total seconds and, for stage-by-stage runs, seconds per stage
+    """
+    if pipelined:
+        return _makespan([[seconds for _, seconds in chain] for chain in chains], concurrency), {}
+    per_stage = {}
+    for stage in PIPELINE_STAGES:
+        per_stage[stage] = _makespan([[s] for chain in chains for name, s in chain if name == stage], concurrency)
+    return sum(per_stage.values()), per_stage
+
+
+def _makespan(chains: List[List[float]], concurrency: int) -> float:
+    """Simulate critical-path list scheduling of task chains on a worker pool."""
+    ready = [(-sum(chain), number, 0) for number, chain in enumerate(chains) if chain]
+    heapq.heapify(ready)
+    running: List[Tuple[float, int, int]] = []
+    now = 0.0
+    while ready or running:
+        while ready and len(running) < max(1, concurrency):
+            _, number, index = heapq.heappop(ready)
+            heapq.heappush(running, (now + chains[number][index], number, index))
+        now, number, index = heapq.heappop(running)
+        if index + 1 < len(chains[number]):
+            heapq.heappush(ready, (-sum(chains[number][index + 1 :]), number, index + 1))
+    return now
@@ -2,89 +2,155 @@
 
 import asyncio
 from pathlib import Path
-from typing import Dict, List, Optional
-import aiofiles
+from typing import List, Optional
 from loguru import logger
-from tqdm.asyncio import tqdm
 
 from .config import config
+from .fileio import run_io
+from .journal import Journal
 from .llm import generate_file_description
+from .results import FileResult, StatusCounts
+from .scheduler import CostModel, run_scheduled
+from .store import WorkspaceStore, workspace_store
+
+
+LANGUAGES = {
+    ".swift": "swift",
+    ".py": "python",
+    ".js": "javascript",
+    ".jsx": "javascript",
+    ".ts": "typescript",
+    ".tsx": "typescript",
+    ".kt": "kotlin",
+    ".java": "java",
+    ".go": "go",
+    ".rs": "rust",
+    ".rb": "ruby",
+    ".m": "objective-c",
+    ".h": "c",
+    ".c": "c",
+    ".cpp": "cpp",
+    ".cs": "csharp",
+}
+
+
+def detect_language(path: Path) -> str:
+    """Detect the source language of a file from its extension.
 
+    Args:
+        path: Path to the file
+
+    Returns:
+        Language name, or the bare extension for unknown languages
+    """
+    suffix = path.suffix.lower()
+    return LANGUAGES.get(suffix, suffix.lstrip(".") or "text")
+
+
+def discover_source_files(source_dir: Path) -> List[Path]:
+    """Collect all non-hidden source files under a directory.
+
+    Args:
+        source_dir: Directory containing source files
+
+    Returns:
+        List of source file paths
+    """
+    files = list(source_dir.rglob("*"))
+    return [f for f in files if f.is_file() and not f.name.startswith(".")]
 
-async def read_file(path: Path, descriptions_dir: Path, source_dir: Path) -> Dict[str, str]:
+
+async def read_file(
+    path: Path, store: WorkspaceStore, source_dir: Path, journal: Optional[Journal] = None
+) -> FileResult:
     """Read file content and generate description.
 
     Args:
         path: Path to the file
-        descriptions_dir: Directory to store descriptions
+        store: Workspace store holding descriptions
         source_dir: Base directory of source files
+        journal: Optional run journal to record completion in
 
     Returns:
-        Dict containing file info and description
+        Status record; the description stays in the store
     """
+    # Descriptions are keyed by the path relative to the source directory
+    key = path.relative_to(source_dir).as_posix()
     try:
-        file_path_str = str(path)
-        mtime = path.stat().st_mtime
-
-        # Create mirrored path for description
-        relative_path = path.relative_to(source_dir)
-        desc_file = descriptions_dir / relative_path.parent / f"{path.name}.desc"
+        mtime = (await run_io(path.stat)).st_mtime
 
         # Check if description exists and is up to date
-        if desc_file.exists() and desc_file.stat().st_mtime >= mtime:
-            description = desc_file.read_text()
+        desc_mtime = await run_io(store.mtime, "descriptions", key)
+        if desc_mtime is not None and desc_mtime >= mtime:
             logger.debug(f"Using existing description for: {path}")
+            status = "skipped"
         else:
-            async with aiofiles.open(path, "r", encoding="utf-8") as f:
-                content = await f.read()
+            content = await run_io(path.read_text, encoding="utf-8")
 
             result = await generate_file_description(content, path)
-            description = result.description
 
             # Save description
-            desc_file.parent.mkdir(parents=True, exist_ok=True)
-            desc_file.write_text(description)
-
-        return {
-            "path": file_path_str,
-            "extension": path.suffix,
-            "description": description,
-            "mtime": mtime,
-        }
+            await run_io(store.write, "descriptions", key, result.description)
+            status = "generated"
+
+        if journal:
+            await run_io(journal.record, "describe", key)
+
+        return FileResult(str(path), key, status, "descriptions")
     except Exception as e:
         logger.error(f"Error processing {path}: {e}")
-        return None
+        return FileResult(str(path), key, "error", error=str(e))
 
 
-async def process_files(source_dir: Path, output_dir: Optional[Path] = None) -> List[Dict[str, str]]:
+async def process_files(
+    source_dir: Path,
+    output_dir: Optional[Path] = None,
+    files: Optional[List[Path]] = None,
+    journal: Optional[Journal] = None,
+    store: Optional[WorkspaceStore] = None,
+    costs: Optional[CostModel] = None,
+) -> List[FileResult]:
     """Process source files in parallel.
 
     Args:
         source_dir: Directory containing source files
         output_dir: Custom output directory (default: config.output_dir)
+        files: Explicit list of files to process (default: discover all)
+        journal: Optional run journal to record completion in
+        store: Workspace store (default: opened from output directory for the call)
+        costs: Cost model used to start the most expensive files first
 
     Returns:
-        List of processed file data
+        Status records of the processed files; descriptions stay in the store
     """
     workspace_dir = output_dir or config.output_dir
-    descriptions_dir = workspace_dir / "descriptions"
-    descriptions_dir.mkdir(parents=True, exist_ok=True)
 
     # Collect all source files
-    files = list(source_dir.rglob("*"))
-    files = [f for f in files if f.is_file() and not f.name.startswith(".")]
-
-    if not files:
-        raise ValueError(f"No files found in {source_dir}")
+    if files is None:
+        files = await run_io(discover_source_files, source_dir)
+        if not files:
+            raise ValueError(f"No files found in {source_dir}")
 
     logger.info(f"Processing {len(files)} files...")
 
-    # Process files with progress bar
-    tasks = [read_file(f, descriptions_dir, source_dir) for f in files]
-    results = await tqdm.gather(*tasks, desc="Generating descriptions")
-
-    # Filter out failures
-    processed = [r for r in results if r is not None]
-
-    logger.info(f"Successfully processed {len(processed)} of {len(files)} files")
-    return processed
+    # Process files largest-first with progress bar
+    costs = costs or CostModel()
+
+    def key(path: Path) -> str:
+        return path.relative_to(source_dir).as_posix()
+
+    async with workspace_store(workspace_dir, store) as store:
+        results = await run_scheduled(
+            files,
+            lambda f: read_file(f, store, source_dir, journal),
+            lambda f: costs.estimate("describe", key(f)),
+            config.max_concurrency,
+            "Generating descriptions",
+            lambda f, seconds: costs.observe("describe", key(f), seconds),
+        )
+        await run_io(costs.save, store)
+        await run_io(store.flush)
+
+    counts = StatusCounts(r.status for r in results)
+    logger.info(f"Successfully processed {counts.total - counts['error']} of {len(files)} files")
+    return results
@@ -0,0 +1,221 @@
+"""Per-stage profiling of a run.
+
+Each stage of a profiled run is measured three ways:
+
+- Deterministic: ``cProfile`` on the event loop thread, where coroutines,
+  response parsing and validation run, dumped as ``profile/<stage>.prof``
+  (readable with ``pstats`` or snakeviz).
+- Sampling: a background thread samples the stacks of all threads, including
+  the I/O pool, and writes them to ``profile/stacks.collapsed`` in the
+  collapsed-stack format of flamegraph.pl, speedscope and inferno.
+- Tasks: every asyncio task created during the stage is timed, giving its
+  lifetime and the time it held the event loop, in ``profile/tasks.json``.
+
+Time a stage spends waiting on the network shows up as the loop thread
+sampled in the selector, and as task lifetime not spent on the loop.
+"""
+
+import asyncio
+import collections.abc
+import contextlib
+import cProfile
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from .fileio import atomic_write_bytes, atomic_write_text
+
+PROFILE_DIR = "profile"
+STACKS_FILE = "stacks.collapsed"
+TASKS_FILE = "tasks.json"
+
+# Leaf frames of threads idling until they get work, which are not sampled
+_IDLE_FRAMES = {("_worker", "thread.py"), ("Event.wait", "threading.py"), ("Condition.wait", "threading.py")}
+
+
+class _TimedCoroutine(collections.abc.Coroutine):
+    """Coroutine wrapper measuring the time each step holds the event loop."""
+
+    def __init__(self, coro: Any):
+        self.coro = coro
+        self.name = getattr(coro, "__qualname__", type(coro).__name__)
+        self.created = time.perf_counter()
+        self.busy = 0.0
+        self.steps = 0
+
+    def _step(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.busy += time.perf_counter() - start
+            self.steps += 1
+
+    def send(self, value):
+        return self._step(self.coro.send, value)
+
+    def throw(self, *args):
+        return self._step(self.coro.throw, *args)
+
+    def close(self):
+        return self.coro.close()
+
+    def __await__(self):
+        return self.coro.__await__()
+
+
+class _Stage:
+    """Measurements of one stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = 0.0
+        self.samples = 0
+        self.profile = cProfile.Profile()
+        self.tasks: Dict[str, Dict[str, float]] = {}
+
+    def record_task(self, timed: _TimedCoroutine) -> None:
+        entry = self.tasks.setdefault(
+            timed.name, {"tasks": 0, "steps": 0, "wall_seconds": 0.0, "busy_seconds": 0.0, "max_wall_seconds": 0.0}
+        )
+        wall = time.perf_counter() - timed.created
+        entry["tasks"] += 1
+        entry["steps"] += timed.steps
+        entry["wall_seconds"] += wall
+        entry["busy_seconds"] += timed.busy
+        entry["max_wall_seconds"] = max(entry["max_wall_seconds"], wall)
+
+
+class Profiler:
+    """Profile the stages of a run; a disabled profiler measures nothing."""
+
+    def __init__(self, enabled: bool = True, interval: float = 0.005):
+        """Initialize profiler.
+
+        Args:
+            enabled: Whether stages are profiled
+            interval: Seconds between stack samples
+        """
+        self.enabled = enabled
+        self.interval = interval
+        self.stages: List[_Stage] = []
+        self.stacks: collections.Counter = collections.Counter()
+        self._current: Optional[_Stage] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            stage = self._current
+            if stage is None:
+                continue
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append((getattr(code, "co_qualname", code.co_name), os.path.basename(code.co_filename)))
+                    frame = frame.f_back
+                if frames and frames[0] in _IDLE_FRAMES:
+                    continue
+                path = ";".join(f"{name} ({filename})" for name, filename in reversed(frames))
+                self.stacks[f"{stage.name};{names.get(ident, ident)};{path}"] += 1
+                stage.samples += 1
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Profile the code run inside the context as one stage.
+
+        Args:
+            name: Stage name, used for its dump file and as the root frame of its stacks
+        """
+        if not self.enabled:
+            yield
+            return
+        if self._sampler is None:
+            self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+            self._sampler.start()
+
+        stage = _Stage(name)
+        self.stages.append(stage)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        previous_factory = loop.get_task_factory() if loop else None
+
+        def task_factory(loop, coro, **kwargs):
+            timed = _TimedCoroutine(coro)
+            task = asyncio.Task(timed, loop=loop, **kwargs)
+            task.add_done_callback(lambda _: stage.record_task(timed))
+            return task
+
+        if loop:
+            loop.set_task_factory(task_factory)
+        self._current = stage
+        start = time.perf_counter()
+        stage.profile.enable()
+        try:
+            yield
+        finally:
+            stage.profile.disable()
+            stage.wall = time.perf_counter() - start
+            self._current = None
+            if loop:
+                loop.set_task_factory(previous_factory)
+
+    def save(self, workspace_dir: Path) -> Optional[Path]:
+        """Stop sampling, write the profiles to the workspace and log a summary per stage.
+
+        Args:
+            workspace_dir: Workspace directory
+
+        Returns:
+            Directory the profiles were written to, or None if nothing was profiled
+        """
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        if not self.stages:
+            return None
+
+        profile_dir = workspace_dir / PROFILE_DIR
+        # Dumps of stages that did not run this time must not be mistaken for this run's
+        for stale in profile_dir.glob("*.prof"):
+            stale.unlink()
+        summary = {}
+        for stage in self.stages:
+            stage.profile.create_stats()
+            atomic_write_bytes(profile_dir / f"{stage.name}.prof", marshal.dumps(stage.profile.stats))
+            tasks = dict(sorted(stage.tasks.items(), key=lambda item: -item[1]["busy_seconds"]))
+            summary[stage.name] = {
+                "wall_seconds": round(stage.wall, 4),
+                "samples": stage.samples,
+                "tasks": {name: {k: round(v, 4) for k, v in entry.items()} for name, entry in tasks.items()},
+            }
+
+            # Functions with the most own time on the loop thread
+            hottest = sorted(stage.profile.stats.items(), key=lambda item: -item[1][2])[:3]
+            hot = ", ".join(f"{func[2]} ({os.path.basename(func[0])}) {stats[2]:.2f}s" for func, stats in hottest)
+            logger.info(
+                f"Profile {stage.name}: {stage.wall:.2f}s wall, {len(stage.tasks)} task kinds, "
+                f"{stage.samples} stack samples; top loop-thread functions: {hot or 'none'}"
+            )
+
+        atomic_write_text(profile_dir / STACKS_FILE, "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items())))
+        atomic_write_text(profile_dir / TASKS_FILE, json.dumps(summary, indent=2))
+        logger.info(f"Profiles written to {profile_dir}")
+        return profile_dir
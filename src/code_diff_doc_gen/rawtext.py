@@ -0,0 +1,199 @@
+"""Plain-text responses with fenced code blocks instead of tool calls.
+
+Code returned through a tool call is a JSON string, so every quote, backslash
+and newline of the code costs extra output tokens, and a single bad escape
+fails validation of the whole response. For response models that carry code,
+the model can instead answer with ordinary fenced code blocks, which are
+parsed locally. Responses that cannot be parsed raise ``RawFormatError`` so
+the caller can repeat the call in structured mode.
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .models import CodeAnalysisResult, CodePair, GeneratedCode
+from .streaming import MalformedOutputError, PartialWriter, TruncatedOutputError
+
+_FENCE = re.compile(r"^ {0,3}(`{3,}|~{3,})\s*([^`]*?)\s*$")
+
+_FENCING_RULE = (
+    "If the code itself contains a line starting with three backticks, fence it with four or more backticks instead."
+)
+
+
+class RawFormatError(MalformedOutputError):
+    """Plain-text response does not contain the expected code blocks."""
+
+
+@dataclass(frozen=True)
+class RawFormat:
+    """How a response model is requested and parsed as plain text."""
+
+    instructions: str
+    parse: Callable[[str], Any]
+
+
+def parse_fenced_blocks(text: str) -> List[Tuple[str, str]]:
+    """Extract the fenced code blocks of a Markdown text.
+
+    A block closes at a line holding only a fence of the same character that
+    is at least as long as the opening fence, so code containing shorter
+    fences survives intact.
+
+    Args:
+        text: Markdown text
+
+    Returns:
+        Pairs of the lowercased first word of the info string and the block content
+
+    Raises:
+        RawFormatError: If a block is not closed
+    """
+    blocks = []
+    fence: Optional[str] = None
+    info = ""
+    body: List[str] = []
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        if fence is None:
+            match = _FENCE.match(line.rstrip("\r\n"))
+            if match:
+                fence = match.group(1)
+                info = (match.group(2).split() or [""])[0].lower()
+                body = []
+        elif stripped and set(stripped) == {fence[0]} and len(stripped) >= len(fence):
+            blocks.append((info, "".join(body).rstrip("\r\n")))
+            fence = None
+        else:
+            body.append(line)
+    if fence is not None:
+        raise RawFormatError("Response ended inside a code block")
+    return blocks
+
+
+def parse_generated_code(text: str) -> GeneratedCode:
+    """Parse a plain-text code generation response.
+
+    Any text around the code is ignored. If the response holds several
+    blocks, the longest one is taken as the implementation.
+
+    Raises:
+        RawFormatError: If the response contains no code block
+    """
+    blocks = [content for _, content in parse_fenced_blocks(text) if content.strip()]
+    if not blocks:
+        raise RawFormatError("Response contains no code block")
+    return GeneratedCode(implementation=max(blocks, key=len))
+
+
+def parse_code_pairs(text: str) -> CodeAnalysisResult:
+    """Parse a plain-text analysis response of ``bad``/``good`` code block pairs.
+
+    Raises:
+        RawFormatError: If blocks are unlabelled or do not form pairs
+    """
+    blocks = parse_fenced_blocks(text)
+    if not blocks:
+        if text.strip().strip(".").upper() in ("", "NONE"):
+            return CodeAnalysisResult(pairs=[])
+        raise RawFormatError("Response contains neither code pairs nor NONE")
+
+    pairs = []
+    for index in range(0, len(blocks), 2):
+        labels = [info for info, _ in blocks[index : index + 2]]
+        if labels != ["bad", "good"]:
+            raise RawFormatError(f"Expected a 'bad' block followed by a 'good' block, got {labels}")
+        pairs.append(CodePair(bad_code=blocks[index][1], good_code=blocks[index + 1][1]))
+    return CodeAnalysisResult(pairs=pairs)
+
+
+RAW_FORMATS: Dict[Any, RawFormat] = {
+    GeneratedCode: RawFormat(
+        instructions=(
+            "Return the complete implementation in one fenced code block, tagged with the language. "
+            f"Do not wrap the code in JSON or escape it. {_FENCING_RULE}"
+        ),
+        parse=parse_generated_code,
+    ),
+    CodeAnalysisResult: RawFormat(
+        instructions=(
+            "Return each code pair as two fenced code blocks: first the problematic generated code in a block "
+            "whose info string is `bad`, then the correct original code in a block whose info string is `good`. "
+            "Write the code as is, without JSON or escaping, and put nothing between the blocks. "
+            f"{_FENCING_RULE} If there are no issues, reply with the single word NONE."
+        ),
+        parse=parse_code_pairs,
+    ),
+}
+
+
+def _message_text(message: Any) -> str:
+    """Join the text blocks of a message, skipping thinking blocks."""
+    return "".join(block.text for block in message.content if block.type == "text")
+
+
+async def raw_call(
+    client: Any,
+    response_model: Any,
+    system: List[Dict],
+    messages: List[Dict],
+    partial: Optional[PartialWriter] = None,
+    stream: bool = False,
+    **create_kwargs: Any,
+) -> Tuple[Any, Any, Optional[float]]:
+    """Request a plain-text response and parse it into the response model.
+
+    Args:
+        client: Raw async Anthropic client
+        response_model: Response model with an entry in ``RAW_FORMATS``
+        system: System prompt blocks
+        messages: Conversation messages
+        partial: Optional spool receiving the response text while it streams
+        stream: Whether to stream the response
+        **create_kwargs: Model, token limits and other request parameters
+
+    Returns:
+        Tuple of the parsed response, the usage and the time to first token
+
+    Raises:
+        RawFormatError: If the response cannot be parsed
+        TruncatedOutputError: If the response hit the token limit
+    """
+    raw_format = RAW_FORMATS[response_model]
+    system = [*system, {"type": "text", "text": raw_format.instructions}]
+
+    ttft: Optional[float] = None
+    if stream:
+        start = time.monotonic()
+        async with client.beta.messages.stream(system=system, messages=messages, **create_kwargs) as response_stream:
+            async for event in response_stream:
+                if event.type == "content_block_delta":
+                    if ttft is None:
+                        ttft = time.monotonic() - start
+                    if partial and event.delta.type == "text_delta":
+                        partial.write(event.delta.text)
+                        if partial.should_flush:
+                            await partial.flush()
+            message = await response_stream.get_final_message()
+        if partial:
+            await partial.flush()
+    else:
+        message = await client.beta.messages.create(system=system, messages=messages, **create_kwargs)
+
+    if message.stop_reason == "max_tokens":
+        error = TruncatedOutputError(f"Response hit the {create_kwargs.get('max_tokens')} token limit")
+        error.usage = message.usage
+        raise error
+
+    try:
+        response = raw_format.parse(_message_text(message))
+    except RawFormatError as e:
+        e.usage = message.usage
+        raise
+
+    logger.debug(f"Parsed plain-text {response_model.__name__} from {message.usage.output_tokens} output tokens")
+    return response, message.usage, ttft
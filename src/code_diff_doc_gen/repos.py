@@ -0,0 +1,72 @@
+"""Source trees of a multi-repository run and their workspaces."""
+
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+def load_repo_list(path: Path) -> List[Tuple[Path, Optional[str]]]:
+    """Read a repository list file.
+
+    Each line holds a source directory, optionally followed by the name of its
+    workspace. Blank lines and lines starting with ``#`` are ignored; relative
+    paths are resolved against the directory of the list file.
+
+    Args:
+        path: Repository list file
+
+    Returns:
+        Source directories with their workspace names, if given
+
+    Raises:
+        ValueError: If a line has more than two fields
+    """
+    repos = []
+    for number, line in enumerate(path.read_text(encoding="utf-8").splitlines(), 1):
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        if len(fields) > 2:
+            raise ValueError(f"{path}:{number}: expected '<source_dir> [workspace_name]', got {line.strip()!r}")
+        repos.append((path.parent / fields[0], fields[1] if len(fields) > 1 else None))
+    return repos
+
+
+def assign_workspaces(repos: List[Tuple[Path, Optional[str]]], output_dir: Path) -> List[Tuple[Path, Path]]:
+    """Give every source directory its own workspace below the output directory.
+
+    Workspaces are named after the source directory unless named explicitly;
+    repeated names get a numeric suffix in list order.
+
+    Args:
+        repos: Source directories with optional workspace names
+        output_dir: Directory holding the workspaces
+
+    Returns:
+        Pairs of source directory and workspace directory
+
+    Raises:
+        ValueError: If a source directory or explicit workspace name is listed twice
+    """
+    explicit = [name for _, name in repos if name]
+    duplicates = sorted({name for name in explicit if explicit.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Workspace name used twice: {', '.join(duplicates)}")
+
+    seen = set()
+    used = set(explicit)
+    assigned = []
+    for source_dir, name in repos:
+        resolved = source_dir.resolve()
+        if resolved in seen:
+            raise ValueError(f"Source directory listed twice: {source_dir}")
+        seen.add(resolved)
+
+        if not name:
+            base = name = resolved.name or "repo"
+            suffix = 1
+            while name in used:
+                suffix += 1
+                name = f"{base}-{suffix}"
+            used.add(name)
+        assigned.append((source_dir, output_dir / name))
+    return assigned
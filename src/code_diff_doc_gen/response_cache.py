@@ -0,0 +1,98 @@
+"""In-process cache of validated model responses.
+
+Calls are keyed by everything the model sees: stage, response model, system
+prompt and user message. Identical source files, whether in one tree or in
+several trees processed by one run, therefore cost one call per stage. A call
+that is already in flight is awaited by later identical calls instead of
+being issued again.
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+def request_key(stage: str, response_model: Any, system_prompt: str, user_message: str) -> str:
+    """Hash the content of a request to its cache key."""
+    digest = hashlib.sha256()
+    for part in (stage, getattr(response_model, "__name__", str(response_model)), system_prompt, user_message):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """Single-flight LRU cache of responses by request key."""
+
+    def __init__(self, max_entries: int = 10000):
+        """Initialize cache.
+
+        Args:
+            max_entries: Completed responses kept before the least recently used are dropped
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, asyncio.Future]" = OrderedDict()
+
+    async def get(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        """Return the response for a key, calling at most once per key.
+
+        A failed call is not cached; its error is raised to every caller that
+        waited for it, and the next call with the key is issued again.
+
+        Args:
+            key: Request key from ``request_key``
+            call: Function making the call on a miss
+
+        Returns:
+            Copy of the response, so callers cannot change each other's results
+        """
+        while key in self._entries:
+            future = self._entries[key]
+            self._entries.move_to_end(key)
+            try:
+                response = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The caller making the call was cancelled; take over the call
+                continue
+            self.hits += 1
+            return _copy(response)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._entries[key] = future
+        try:
+            response = await call()
+        except BaseException as e:
+            del self._entries[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Waiters re-raise the error; mark it retrieved when there are none
+                future.exception()
+            raise
+        future.set_result(response)
+        self._evict()
+        return _copy(response)
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            key, future = next(iter(self._entries.items()))
+            if not future.done():
+                break
+            del self._entries[key]
+
+    def summary(self) -> Dict[str, int]:
+        """Get hit and miss counts."""
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+
+def _copy(response: Any) -> Any:
+    return response.model_copy(deep=True) if hasattr(response, "model_copy") else response
@@ -0,0 +1,68 @@
+"""Compact per-file status records for pipeline stages.
+
+Stage results only carry status and location. Artifact content stays in the
+workspace store and is read on demand, so holding results for every file of a
+large repository costs a few small objects per file.
+"""
+
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+from .store import WorkspaceStore
+
+STATUSES = ("generated", "analyzed", "skipped", "error")
+
+
+@dataclass(slots=True)
+class FileResult:
+    """Outcome of a pipeline stage for a single file."""
+
+    path: str
+    key: str
+    status: str
+    namespace: str = ""
+    error: Optional[str] = None
+
+    def read(self, store: WorkspaceStore) -> Optional[str]:
+        """Read the artifact produced for this file.
+
+        Args:
+            store: Workspace store holding the artifact
+
+        Returns:
+            Artifact content, or None if no artifact was produced
+        """
+        return store.read(self.namespace, self.key) if self.namespace else None
+
+
+class StatusCounts:
+    """Array-backed counters of stage results by status."""
+
+    __slots__ = ("_counts",)
+
+    def __init__(self, statuses: Iterable[str] = ()):
+        """Initialize counters.
+
+        Args:
+            statuses: Statuses to count immediately
+        """
+        self._counts = array("Q", [0] * len(STATUSES))
+        for status in statuses:
+            self.add(status)
+
+    def add(self, status: str) -> None:
+        """Count one result with the given status."""
+        self._counts[STATUSES.index(status)] += 1
+
+    def __getitem__(self, status: str) -> int:
+        return self._counts[STATUSES.index(status)]
+
+    @property
+    def total(self) -> int:
+        """Total number of counted results."""
+        return sum(self._counts)
+
+    def as_dict(self) -> Dict[str, int]:
+        """Return counts keyed by status."""
+        return dict(zip(STATUSES, self._counts))
@@ -0,0 +1,117 @@
+"""Model tiers, pricing and per-call model routing.
+
+Calls on small, simple files go to a fast model; everything else goes to the
+configured model. Complexity is scored locally from the source: AST node and
+branch counts for Python, keyword-based estimates for other languages.
+"""
+
+import ast
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+# Default model of the standard tier and fallback for unknown model ids
+DEFAULT_MODEL = "claude-3-7-sonnet-20250219"
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """Capabilities and pricing of a model, prices in USD per million tokens."""
+
+    input_price: float
+    output_price: float
+    cache_write_price: float
+    cache_read_price: float
+    thinking: bool
+    max_output: int
+
+
+MODELS: Dict[str, ModelSpec] = {
+    "claude-3-7-sonnet-20250219": ModelSpec(3.0, 15.0, 3.75, 0.30, thinking=True, max_output=128000),
+    "claude-3-5-sonnet-20241022": ModelSpec(3.0, 15.0, 3.75, 0.30, thinking=False, max_output=8192),
+    "claude-3-5-haiku-20241022": ModelSpec(0.80, 4.0, 1.0, 0.08, thinking=False, max_output=8192),
+}
+
+
+def model_spec(model: str) -> ModelSpec:
+    """Get the spec of a model, falling back to the default model's spec."""
+    return MODELS.get(model, MODELS[DEFAULT_MODEL])
+
+
+@dataclass(frozen=True)
+class Complexity:
+    """Cheap static complexity estimate of a source file."""
+
+    tokens: int
+    nodes: int
+    branches: int
+
+
+_BRANCH_PATTERN = re.compile(r"\b(?:if|elif|for|while|case|catch|except|guard|switch)\b|&&|\|\|")
+_TOKEN_PATTERN = re.compile(r"\w+|[^\s\w]")
+_BRANCH_NODES = (
+    ast.If,
+    ast.For,
+    ast.AsyncFor,
+    ast.While,
+    ast.ExceptHandler,
+    ast.IfExp,
+    ast.comprehension,
+    ast.Assert,
+)
+
+
+def score_complexity(content: str, suffix: str = "") -> Complexity:
+    """Estimate the complexity of source code.
+
+    Args:
+        content: Source code
+        suffix: File suffix, used to pick the parser
+
+    Returns:
+        Token, node and branch counts (branches approximate cyclomatic complexity)
+    """
+    tokens = len(content) // 4 + 1
+    if suffix == ".py":
+        try:
+            tree = ast.parse(content)
+        except (SyntaxError, ValueError):
+            pass
+        else:
+            nodes = branches = 0
+            for node in ast.walk(tree):
+                nodes += 1
+                if isinstance(node, _BRANCH_NODES):
+                    branches += 1
+                elif isinstance(node, ast.BoolOp):
+                    branches += len(node.values) - 1
+            return Complexity(tokens, nodes, branches)
+
+    return Complexity(tokens, len(_TOKEN_PATTERN.findall(content)), len(_BRANCH_PATTERN.findall(content)))
+
+
+def score_file(path: Path) -> Complexity:
+    """Read a source file and estimate its complexity."""
+    return score_complexity(path.read_text(encoding="utf-8", errors="replace"), path.suffix)
+
+
+def route_model(stage: str, source_tokens: int, complexity: Optional[Complexity], app_config) -> str:
+    """Pick the model for a call.
+
+    Args:
+        stage: Pipeline stage of the call
+        source_tokens: Estimated tokens of the source the call works on
+        complexity: Complexity of the source file, if scored
+        app_config: Application configuration with routing thresholds
+
+    Returns:
+        Model id to call
+    """
+    if not app_config.routing or stage not in app_config.fast_stages:
+        return app_config.model
+    if source_tokens > app_config.route_fast_max_tokens:
+        return app_config.model
+    if complexity is not None and complexity.branches > app_config.route_fast_max_branches:
+        return app_config.model
+    return app_config.fast_model
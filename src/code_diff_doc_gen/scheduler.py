@@ -0,0 +1,154 @@
+"""Cost estimates and largest-first scheduling of per-file work.
+
+A stage finishes when its slowest file finishes, so files are started in
+order of decreasing estimated cost (longest-processing-time-first). Costs come
+from the latency a file's stage took in earlier runs of the workspace, or are
+estimated from the file's token count when there is no history.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from tqdm import tqdm
+
+from .budget import estimate_tokens
+
+T = TypeVar("T")
+
+TIMINGS_KIND = "timings"
+
+# Seconds per call and per source token of each stage, used until history exists
+STAGE_COST_DEFAULTS: Dict[str, Tuple[float, float]] = {
+    "describe": (2.0, 0.005),
+    "generate": (5.0, 0.03),
+    "analyze": (3.0, 0.01),
+}
+
+# Faster completions were skipped or cached and say nothing about API latency
+MIN_OBSERVED_SECONDS = 0.5
+
+
+class CostModel:
+    """Estimated wall time of every stage for every file."""
+
+    def __init__(self, sizes: Optional[Dict[str, int]] = None, history: Optional[Dict[Tuple[str, str], float]] = None):
+        """Initialize cost model.
+
+        Args:
+            sizes: Source size in bytes by relative path
+            history: Seconds of the latest run of each (stage, path)
+        """
+        self.sizes = sizes or {}
+        self.history = history or {}
+        self.new_timings: List[Dict] = []
+        self._rates = self._learn_rates()
+
+    @classmethod
+    def from_records(cls, sizes: Dict[str, int], records: Iterable[Dict]) -> "CostModel":
+        """Build a cost model from source sizes and stored timing records.
+
+        Args:
+            sizes: Source size in bytes by relative path
+            records: Records of the ``timings`` log, oldest first
+
+        Returns:
+            Cost model using the latest timing of every file and stage
+        """
+        history = {(r["stage"], r["path"]): r["seconds"] for r in records}
+        return cls(sizes, history)
+
+    def _learn_rates(self) -> Dict[str, float]:
+        """Fit seconds per source token of each stage from the history."""
+        totals: Dict[str, List[float]] = {}
+        for (stage, path), seconds in self.history.items():
+            if path in self.sizes:
+                tokens = estimate_tokens(self.sizes[path])
+                stage_totals = totals.setdefault(stage, [0.0, 0.0])
+                stage_totals[0] += seconds
+                stage_totals[1] += tokens
+        return {stage: seconds / tokens for stage, (seconds, tokens) in totals.items() if tokens}
+
+    def estimate(self, stage: str, path: str) -> float:
+        """Estimate the wall time of a stage for a file.
+
+        Args:
+            stage: Pipeline stage name
+            path: Source path relative to the source directory
+
+        Returns:
+            Estimated seconds
+        """
+        seconds = self.history.get((stage, path))
+        if seconds is not None:
+            return seconds
+        tokens = estimate_tokens(self.sizes.get(path, 0))
+        if stage in self._rates:
+            return tokens * self._rates[stage]
+        base, per_token = STAGE_COST_DEFAULTS.get(stage, (1.0, 0.01))
+        return base + tokens * per_token
+
+    def remaining(self, stages: Iterable[str], path: str) -> float:
+        """Estimate the wall time of a file's remaining stages (its critical path)."""
+        return sum(self.estimate(stage, path) for stage in stages)
+
+    def observe(self, stage: str, path: str, seconds: float, round_num: Optional[int] = None) -> None:
+        """Record how long a stage took for a file.
+
+        Args:
+            stage: Pipeline stage name
+            path: Source path relative to the source directory
+            seconds: Observed wall time
+            round_num: Generation round (None for round-independent stages)
+        """
+        if seconds < MIN_OBSERVED_SECONDS:
+            return
+        self.history[(stage, path)] = seconds
+        self.new_timings.append({"stage": stage, "round": round_num, "path": path, "seconds": round(seconds, 3)})
+
+    def save(self, store) -> None:
+        """Append the timings observed in this run to the workspace store."""
+        for record in self.new_timings:
+            store.append_record(TIMINGS_KIND, record)
+        self.new_timings.clear()
+
+
+async def run_scheduled(
+    items: List[T],
+    worker: Callable[[T], Awaitable],
+    cost: Callable[[T], float],
+    concurrency: int,
+    desc: str,
+    on_done: Optional[Callable[[T, float], None]] = None,
+) -> List:
+    """Run work items largest-first with bounded concurrency.
+
+    Args:
+        items: Work items
+        worker: Coroutine function processing one item
+        cost: Estimated cost of an item
+        concurrency: Maximum items in flight
+        desc: Progress bar description
+        on_done: Callback receiving each item and its wall time
+
+    Returns:
+        Worker results in the order of ``items``
+    """
+    order = sorted(range(len(items)), key=lambda i: cost(items[i]), reverse=True)
+    results: List = [None] * len(items)
+    queue = iter(order)
+
+    with tqdm(total=len(items), desc=desc) as progress:
+
+        async def run_worker() -> None:
+            # The shared iterator hands every idle worker the most expensive remaining item
+            for index in queue:
+                start = time.monotonic()
+                results[index] = await worker(items[index])
+                if on_done:
+                    on_done(items[index], time.monotonic() - start)
+                progress.update()
+
+        await asyncio.gather(*(run_worker() for _ in range(min(concurrency, len(items)))))
+
+    return results
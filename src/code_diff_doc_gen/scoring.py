@@ -0,0 +1,224 @@
+"""Similarity scoring of generated code across rounds.
+
+Every original file and each round's generation of it is turned into a
+feature vector of hashed token n-gram counts. Cosine similarities between the
+original and each generation form a files x rounds matrix, which is computed
+with NumPy one block of files at a time on the CPU pool and saved as
+``scores.npz`` in the workspace. A summary with per-round statistics and a
+convergence verdict is saved as ``scores.json``. No API calls are made.
+
+NumPy is an optional dependency (``pip install code_diff_doc_gen[scoring]``).
+"""
+
+import io
+import math
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import config
+from .cpu import map_cpu
+from .fileio import atomic_write_bytes, run_io
+from .store import WorkspaceStore
+
+SCORES_FILE = "scores.npz"
+SCORES_META = "scores.json"
+
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+_NGRAM_PRIME = np.uint64(0x100000001B3)
+
+
+def token_hashes(text: str) -> np.ndarray:
+    """Hash the identifier, number and punctuation tokens of source text."""
+    tokens = _TOKEN.findall(text)
+    return np.fromiter((zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint64, count=len(tokens))
+
+
+def features(text: str, bits: int = 12, max_n: int = 3) -> np.ndarray:
+    """Build the hashed n-gram count vector of a text.
+
+    Args:
+        text: Source text
+        bits: Vector length as a power of two
+        max_n: Longest n-gram counted
+
+    Returns:
+        Float32 vector of ``2 ** bits`` n-gram counts
+    """
+    vector = np.zeros(1 << bits, dtype=np.float32)
+    hashes = token_hashes(text)
+    grams = hashes
+    shift = np.uint64(64 - bits)
+    with np.errstate(over="ignore"):
+        for n in range(1, max_n + 1):
+            if n > 1:
+                # Roll the previous (n-1)-gram hashes forward by one token
+                grams = grams[:-1] * _NGRAM_PRIME + hashes[n - 1 :]
+            if not len(grams):
+                break
+            buckets = ((grams + np.uint64(n)) * _MIX) >> shift
+            vector += np.bincount(buckets.astype(np.int64), minlength=1 << bits).astype(np.float32)
+    return vector
+
+
+def similarity_block(
+    originals: Sequence[str], generations: Sequence[Sequence[Optional[str]]], bits: int = 12
+) -> np.ndarray:
+    """Compute the cosine similarities of a block of files.
+
+    Args:
+        originals: Original content of each file
+        generations: Generated content of each file per round, None where missing
+        bits: Feature vector length as a power of two
+
+    Returns:
+        Float32 matrix of files x rounds, NaN where a generation is missing
+    """
+    rounds = max((len(g) for g in generations), default=0)
+    original = np.stack([features(text, bits) for text in originals]) if originals else np.zeros((0, 1 << bits), np.float32)
+    generated = np.zeros((len(originals), rounds, 1 << bits), dtype=np.float32)
+    present = np.zeros((len(originals), rounds), dtype=bool)
+    for row, texts in enumerate(generations):
+        for column, text in enumerate(texts):
+            if text is not None:
+                generated[row, column] = features(text, bits)
+                present[row, column] = True
+
+    dots = np.einsum("fd,frd->fr", original, generated)
+    original_norm = np.linalg.norm(original, axis=1)[:, None]
+    generated_norm = np.linalg.norm(generated, axis=2)
+    norms = original_norm * generated_norm
+    scores = np.where(norms > 0, dots / np.where(norms > 0, norms, 1.0), 0.0)
+    # Two empty files are identical
+    scores = np.where((original_norm == 0) & (generated_norm == 0), 1.0, scores)
+    return np.where(present, scores, np.nan).astype(np.float32)
+
+
+def find_rounds(store: WorkspaceStore) -> List[int]:
+    """List the consecutive rounds, starting at 0, that have generated code."""
+    rounds = []
+    while store.exists(f"generated/round_{len(rounds)}"):
+        rounds.append(len(rounds))
+    return rounds
+
+
+async def score_rounds(
+    source_dir: Path,
+    files: Sequence[str],
+    store: WorkspaceStore,
+    rounds: Sequence[int],
+    bits: int = 12,
+    block_size: int = 64,
+) -> np.ndarray:
+    """Score the generations of every file in every round against the original.
+
+    Args:
+        source_dir: Directory containing source files
+        files: Source paths relative to the source directory
+        store: Workspace store holding the generated code
+        rounds: Rounds to score
+        bits: Feature vector length as a power of two
+        block_size: Files per block sent to a worker
+
+    Returns:
+        Float32 matrix of files x rounds, NaN where a file has no generation
+    """
+
+    def read_block(keys: Sequence[str]) -> Tuple[List[str], List[List[Optional[str]]]]:
+        originals = [(source_dir / key).read_text(encoding="utf-8", errors="replace") for key in keys]
+        generations = [[store.read(f"generated/round_{r}", key) for r in rounds] for key in keys]
+        return originals, generations
+
+    blocks = [files[i : i + block_size] for i in range(0, len(files), block_size)]
+    results = []
+    # Read only as many blocks as the pool can score at once, so large trees are never held in memory
+    wave = max(1, config.cpu_workers) * 2
+    for start in range(0, len(blocks), wave):
+        items = []
+        for keys in blocks[start : start + wave]:
+            originals, generations = await run_io(read_block, keys)
+            items.append((originals, generations, bits))
+        results.extend(await map_cpu(similarity_block, items, chunk_size=1))
+    if not results:
+        return np.zeros((0, len(rounds)), dtype=np.float32)
+    return np.concatenate(results)
+
+
+def summarize(files: Sequence[str], rounds: Sequence[int], scores: np.ndarray, min_gain: float = 0.005) -> Dict:
+    """Summarize a similarity matrix per round and decide whether rounds converged.
+
+    A round's gain is the mean change of similarity over the files scored in
+    both it and the previous round. Rounds have converged when the latest gain
+    is below ``min_gain``.
+
+    Args:
+        files: Source paths of the matrix rows
+        rounds: Round numbers of the matrix columns
+        scores: Files x rounds similarity matrix
+        min_gain: Smallest mean gain that counts as improvement
+
+    Returns:
+        Summary document with per-round statistics, convergence and the weakest files
+    """
+
+    def stat(value: float) -> Optional[float]:
+        return None if math.isnan(value) else round(float(value), 4)
+
+    per_round = []
+    for column, round_num in enumerate(rounds):
+        values = scores[:, column]
+        scored = values[~np.isnan(values)]
+        entry = {
+            "round": round_num,
+            "files": int(scored.size),
+            "mean": stat(scored.mean()) if scored.size else None,
+            "median": stat(np.median(scored)) if scored.size else None,
+            "p10": stat(np.percentile(scored, 10)) if scored.size else None,
+        }
+        if column:
+            previous = scores[:, column - 1]
+            both = ~np.isnan(values) & ~np.isnan(previous)
+            delta = values[both] - previous[both]
+            entry["gain"] = stat(delta.mean()) if delta.size else None
+            entry["improved"] = int((delta > min_gain).sum())
+            entry["regressed"] = int((delta < -min_gain).sum())
+        per_round.append(entry)
+
+    latest_gain = per_round[-1].get("gain") if per_round else None
+    weakest = []
+    if rounds and len(files):
+        latest = scores[:, -1]
+        order = np.argsort(np.where(np.isnan(latest), np.inf, latest))[:10]
+        weakest = [{"file": files[i], "similarity": stat(latest[i])} for i in order if not np.isnan(latest[i])]
+
+    return {
+        "rounds": per_round,
+        "min_gain": min_gain,
+        "converged": latest_gain is not None and latest_gain < min_gain,
+        "weakest": weakest,
+    }
+
+
+def save_scores(store: WorkspaceStore, files: Sequence[str], rounds: Sequence[int], scores: np.ndarray, summary: Dict) -> None:
+    """Save the similarity matrix and its summary to the workspace."""
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, files=np.array(files, dtype=str), rounds=np.array(rounds, dtype=np.int32), scores=scores)
+    atomic_write_bytes(store.workspace_dir / SCORES_FILE, buffer.getvalue())
+    store.write_meta(SCORES_META, summary)
+
+
+def load_scores(workspace_dir: Path) -> Optional[Tuple[List[str], List[int], np.ndarray]]:
+    """Load a saved similarity matrix.
+
+    Returns:
+        Files, rounds and the files x rounds matrix, or None if no scores were saved
+    """
+    path = workspace_dir / SCORES_FILE
+    if not path.exists():
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return data["files"].tolist(), data["rounds"].tolist(), data["scores"]
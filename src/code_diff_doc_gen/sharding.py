@@ -0,0 +1,186 @@
+"""Deterministic sharding of the file set and merging of shard workspaces.
+
+Every machine hashes the same relative paths and keeps the files of its own
+shard, so shards never overlap and need no coordinator. Each shard writes its
+own workspace; ``merge_workspaces`` combines them afterwards.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple
+
+from loguru import logger
+
+from .manifest import MANIFEST_NAME
+from .store import WorkspaceStore, split_artifact_path
+
+SHARD_META = "shard.json"
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parse a shard specification.
+
+    Args:
+        spec: Shard as ``i/N`` with a zero-based index ``i`` below ``N``
+
+    Returns:
+        Tuple of shard index and shard count
+
+    Raises:
+        ValueError: If the specification is invalid
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected i/N (e.g. 0/4)") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}', index must be between 0 and {count - 1}")
+    return index, count
+
+
+def shard_of(path: str, count: int) -> int:
+    """Assign a relative source path to a shard by stable hash.
+
+    Args:
+        path: Source path relative to the source directory (POSIX form)
+        count: Number of shards
+
+    Returns:
+        Zero-based shard index
+    """
+    digest = hashlib.sha256(path.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def select_shard(paths: Iterable[str], index: int, count: int) -> List[str]:
+    """Keep the paths that belong to a shard, in input order."""
+    return [path for path in paths if shard_of(path, count) == index]
+
+
+def shard_dir_name(index: int, count: int) -> str:
+    """Name of the workspace directory of a shard."""
+    return f"shard-{index}-of-{count}"
+
+
+def _combine_meta(name: str, docs: List[Dict]) -> Dict:
+    """Combine the versions of a metadata document written by several shards."""
+    if name == MANIFEST_NAME:
+        # Rounds are complete for the merged tree only if every shard completed them
+        rounds = set(docs[0].get("rounds", []))
+        files: Dict = {}
+        for doc in docs:
+            rounds &= set(doc.get("rounds", []))
+            files.update(doc.get("files", {}))
+        return {"source_dir": docs[0].get("source_dir"), "rounds": sorted(rounds), "files": dict(sorted(files.items()))}
+    if name.endswith("/metadata.json"):
+        merged = dict(docs[0])
+        for doc in docs[1:]:
+            for field, value in doc.items():
+                if field != "round" and isinstance(value, (int, float)):
+                    merged[field] = merged.get(field, 0) + value
+        return merged
+    return docs[-1]
+
+
+def _merge_journals(shards: List[WorkspaceStore], dest: WorkspaceStore) -> int:
+    """Replace the destination journal with the combined plans and completions of the shard journals.
+
+    Completions count for the plan they follow, so the combined plans are
+    written first.
+
+    Returns:
+        Number of journal entries written
+    """
+    plans: Dict[int, List[str]] = {}
+    done: Dict[bytes, Dict] = {}
+    for shard in shards:
+        completed: Dict[bytes, Dict] = {}
+        for record in shard.iter_records("journal"):
+            if record.get("event") == "plan":
+                plans.setdefault(record["round"], []).extend(record["files"])
+                completed.clear()
+            else:
+                completed[_record_digest(record)] = record
+        done.update(completed)
+
+    dest.clear_records("journal")
+    for round_num, files in sorted(plans.items()):
+        dest.append_record("journal", {"event": "plan", "round": round_num, "files": sorted(set(files))})
+    for record in done.values():
+        dest.append_record("journal", record)
+    return len(plans) + len(done)
+
+
+def merge_workspaces(shards: List[WorkspaceStore], dest: WorkspaceStore) -> Dict[str, int]:
+    """Combine shard workspaces into one workspace.
+
+    Artifacts keep their modification times so freshness checks behave the
+    same in the merged workspace; when several shards hold the same artifact
+    the newest copy wins. Shards may start from a copy of an earlier merged
+    workspace, so metadata identical to the destination's and records already
+    present are treated as inherited and not merged again. The destination
+    journal is replaced by the shards' completions under one plan per round
+    covering the files of every shard.
+
+    Args:
+        shards: Shard workspace stores
+        dest: Destination workspace store
+
+    Returns:
+        Number of artifacts, records and metadata documents merged
+    """
+    counts = {"artifacts": 0, "records": 0, "meta": 0}
+
+    infos = [info for shard in shards if (info := shard.read_meta(SHARD_META))]
+    shard_counts = {info["count"] for info in infos}
+    if len(shard_counts) > 1:
+        logger.warning(f"Merged shards were run with different shard counts: {sorted(shard_counts)}")
+    elif shard_counts:
+        missing = sorted(set(range(shard_counts.pop())) - {info["index"] for info in infos})
+        if missing:
+            logger.warning(f"Shards missing from the merge: {', '.join(map(str, missing))}")
+
+    for shard in shards:
+        for path, content, mtime in shard.iter_artifacts():
+            namespace, key = split_artifact_path(path)
+            existing = dest.mtime(namespace, key)
+            if existing is None or existing < mtime:
+                dest.write(namespace, key, content, mtime)
+                counts["artifacts"] += 1
+
+    names = sorted({name for shard in shards for name in shard.meta_names()} - {SHARD_META})
+    for name in names:
+        existing = dest.read_meta(name)
+        docs = [doc for shard in shards if (doc := shard.read_meta(name)) is not None and doc != existing]
+        if docs:
+            dest.write_meta(name, _combine_meta(name, docs))
+            counts["meta"] += 1
+
+    # Records of every kind; journals are combined into one run
+    kinds = sorted({kind for shard in shards for kind in shard.record_kinds()})
+    for kind in kinds:
+        if kind == "journal":
+            counts["records"] += _merge_journals(shards, dest)
+            continue
+        seen: Set[bytes] = {_record_digest(r) for r in dest.iter_records(kind)}
+        for shard in shards:
+            for record in shard.iter_records(kind):
+                digest = _record_digest(record)
+                if digest not in seen:
+                    seen.add(digest)
+                    dest.append_record(kind, record)
+                    counts["records"] += 1
+
+    dest.flush()
+    return counts
+
+
+def _record_digest(record: Dict) -> bytes:
+    """Hash a record independently of key order."""
+    return hashlib.sha1(json.dumps(record, sort_keys=True, separators=(",", ":")).encode("utf-8")).digest()
+
+
+def find_shard_workspaces(root: Path) -> List[Path]:
+    """Find shard workspaces written under a workspace directory."""
+    return sorted(path for path in root.glob("shard-*-of-*") if path.is_dir())
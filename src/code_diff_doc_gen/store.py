@@ -0,0 +1,707 @@
+"""Workspace storage backends for descriptions, generations and analyses.
+
+Artifacts are addressed by a namespace (``descriptions``, ``generated/round_N``,
+``analysis/round_N``, ``prompts``) and a key, which for per-file artifacts is
+the source path relative to the source directory. Every backend maps an
+artifact to the same workspace-relative path, so any store can be exported to
+the mirrored directory layout.
+"""
+
+import abc
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from loguru import logger
+
+from .blobs import BLOB_DIR, BlobPool, Index, Pack, list_packs, pack_path, write_pack
+from .config import config
+from .fileio import atomic_write_text, atomic_writer, run_io
+
+ARTIFACT_SUFFIXES = {"descriptions": ".desc", "analysis": ".analysis"}
+REFS_DIR = "refs"
+# Archived rounds whose blobs a BlobStore keeps in memory at once
+LOADED_PACKS = 4
+
+
+def artifact_path(namespace: str, key: str) -> str:
+    """Map an artifact to its workspace-relative path.
+
+    Args:
+        namespace: Artifact namespace (e.g. ``analysis/round_0``)
+        key: Artifact key within the namespace
+
+    Returns:
+        Workspace-relative POSIX path of the artifact
+    """
+    suffix = ARTIFACT_SUFFIXES.get(namespace.split("/", 1)[0], "")
+    return f"{namespace}/{key}{suffix}"
+
+
+def split_artifact_path(path: str) -> Tuple[str, str]:
+    """Map a workspace-relative artifact path back to its namespace and key.
+
+    Args:
+        path: Path returned by ``artifact_path``
+
+    Returns:
+        Tuple of namespace and key
+    """
+    root, rest = path.split("/", 1)
+    namespace = root
+    if root in ("generated", "analysis"):
+        round_dir, rest = rest.split("/", 1)
+        namespace = f"{root}/{round_dir}"
+    suffix = ARTIFACT_SUFFIXES.get(root, "")
+    return namespace, rest[: len(rest) - len(suffix)] if suffix else rest
+
+
+class WorkspaceStore(abc.ABC):
+    """Interface shared by workspace storage backends."""
+
+    def __init__(self, workspace_dir: Path):
+        """Initialize store.
+
+        Args:
+            workspace_dir: Path to workspace directory
+        """
+        self.workspace_dir = workspace_dir
+
+    @abc.abstractmethod
+    def read(self, namespace: str, key: str) -> Optional[str]:
+        """Read an artifact, returning None if it does not exist."""
+
+    @abc.abstractmethod
+    def write(self, namespace: str, key: str, content: str, mtime: Optional[float] = None) -> None:
+        """Write an artifact, optionally with an explicit modification time."""
+
+    @contextlib.contextmanager
+    def open_writer(self, namespace: str, key: str) -> Iterator[TextIO]:
+        """Open a text stream that replaces an artifact when closed."""
+        buffer = io.StringIO()
+        yield buffer
+        self.write(namespace, key, buffer.getvalue())
+
+    @abc.abstractmethod
+    def mtime(self, namespace: str, key: str) -> Optional[float]:
+        """Get the modification time of an artifact, or None if missing."""
+
+    @abc.abstractmethod
+    def keys(self, namespace: str) -> Iterator[str]:
+        """Iterate over artifact keys in a namespace."""
+
+    @abc.abstractmethod
+    def exists(self, namespace: str) -> bool:
+        """Check whether a namespace holds any artifacts."""
+
+    @abc.abstractmethod
+    def iter_artifacts(self) -> Iterator[Tuple[str, str, float]]:
+        """Iterate over all artifacts as (path, content, mtime) tuples."""
+
+    @abc.abstractmethod
+    def write_meta(self, name: str, data: Dict) -> None:
+        """Write a JSON metadata document at a workspace-relative path."""
+
+    @abc.abstractmethod
+    def read_meta(self, name: str) -> Optional[Dict]:
+        """Read a JSON metadata document, returning None if missing."""
+
+    @abc.abstractmethod
+    def meta_names(self) -> List[str]:
+        """List the names of all metadata documents."""
+
+    @abc.abstractmethod
+    def append_record(self, kind: str, record: Dict) -> None:
+        """Append a record to an append-only record log."""
+
+    @abc.abstractmethod
+    def iter_records(self, kind: str) -> Iterator[Dict]:
+        """Iterate over records of a log in append order."""
+
+    @abc.abstractmethod
+    def clear_records(self, kind: str) -> None:
+        """Delete all records of a log."""
+
+    @abc.abstractmethod
+    def record_kinds(self) -> List[str]:
+        """List the names of all record logs."""
+
+    def flush(self) -> None:
+        """Persist any buffered writes."""
+
+    def close(self) -> None:
+        """Flush and release resources."""
+        self.flush()
+
+
+class FileStore(WorkspaceStore):
+    """Store artifacts as individual files in the mirrored directory layout."""
+
+    def _path(self, namespace: str, key: str) -> Path:
+        return self.workspace_dir / artifact_path(namespace, key)
+
+    def read(self, namespace: str, key: str) -> Optional[str]:
+        path = self._path(namespace, key)
+        return path.read_text() if path.exists() else None
+
+    def write(self, namespace: str, key: str, content: str, mtime: Optional[float] = None) -> None:
+        path = self._path(namespace, key)
+        atomic_write_text(path, content)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    @contextlib.contextmanager
+    def open_writer(self, namespace: str, key: str) -> Iterator[TextIO]:
+        with atomic_writer(self._path(namespace, key)) as f:
+            yield f
+
+    def mtime(self, namespace: str, key: str) -> Optional[float]:
+        try:
+            return self._path(namespace, key).stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def keys(self, namespace: str) -> Iterator[str]:
+        root = self.workspace_dir / namespace
+        suffix = ARTIFACT_SUFFIXES.get(namespace.split("/", 1)[0], "")
+        for path in sorted(root.rglob(f"*{suffix}")):
+            if path.is_file() and not path.name.startswith("."):
+                rel = path.relative_to(root).as_posix()
+                yield rel[: len(rel) - len(suffix)] if suffix else rel
+
+    def exists(self, namespace: str) -> bool:
+        return (self.workspace_dir / namespace).is_dir()
+
+    def iter_artifacts(self) -> Iterator[Tuple[str, str, float]]:
+        # Metadata documents and record logs live inside artifact directories too
+        skip = {*self.meta_names(), *(f"{kind}.jsonl" for kind in self.record_kinds())}
+        for namespace in ("descriptions", "generated", "analysis", "prompts"):
+            root = self.workspace_dir / namespace
+            for path in sorted(root.rglob("*")):
+                rel = path.relative_to(self.workspace_dir).as_posix()
+                if path.is_file() and not path.name.startswith(".") and rel not in skip:
+                    yield rel, path.read_text(), path.stat().st_mtime
+
+    def write_meta(self, name: str, data: Dict) -> None:
+        atomic_write_text(self.workspace_dir / name, json.dumps(data, indent=2))
+
+    def read_meta(self, name: str) -> Optional[Dict]:
+        path = self.workspace_dir / name
+        return json.loads(path.read_text()) if path.exists() else None
+
+    def meta_names(self) -> List[str]:
+        paths = [*self.workspace_dir.glob("*.json"), *self.workspace_dir.glob("generated/round_*/metadata.json")]
+        return sorted(p.relative_to(self.workspace_dir).as_posix() for p in paths)
+
+    def append_record(self, kind: str, record: Dict) -> None:
+        path = self.workspace_dir / f"{kind}.jsonl"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def iter_records(self, kind: str) -> Iterator[Dict]:
+        path = self.workspace_dir / f"{kind}.jsonl"
+        if not path.exists():
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line_num, line in enumerate(f, 1):
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring corrupt line {line_num} in {path}")
+
+    def clear_records(self, kind: str) -> None:
+        (self.workspace_dir / f"{kind}.jsonl").unlink(missing_ok=True)
+
+    def record_kinds(self) -> List[str]:
+        paths = [*self.workspace_dir.glob("*.jsonl"), *self.workspace_dir.glob("analysis/*.jsonl")]
+        return sorted(p.relative_to(self.workspace_dir).as_posix()[: -len(".jsonl")] for p in paths)
+
+
+class BlobStore(FileStore):
+    """Store each distinct artifact content once, addressed by its hash.
+
+    Contents live in a ``BlobPool`` under ``blobs/``, so artifacts repeated
+    across rounds or files cost no extra space. Each namespace is an
+    append-only reference log ``refs/<namespace>.jsonl`` of ``[key, hash,
+    mtime]`` entries in which the latest entry of a key wins; logs appended by
+    other processes are picked up on the next access. Metadata and record logs
+    are plain files as in ``FileStore``. Rounds retired with ``archive_round``
+    are read from their compressed archive, whose blobs are decompressed once
+    and kept in memory for the ``LOADED_PACKS`` most recently read rounds.
+    """
+
+    def __init__(self, workspace_dir: Path):
+        super().__init__(workspace_dir)
+        self.blobs = BlobPool(workspace_dir / BLOB_DIR)
+        self._lock = threading.RLock()
+        self._indexes: Dict[str, Index] = {}
+        # Inode and read offset of each reference log
+        self._positions: Dict[str, Tuple[int, int]] = {}
+        self._packs: Dict[int, Optional[Pack]] = {}
+        # Archived rounds with blobs in memory, least recently read first
+        self._loaded: List[Pack] = []
+
+    def _ref_path(self, namespace: str) -> Path:
+        return self.workspace_dir / REFS_DIR / f"{namespace}.jsonl"
+
+    def _index(self, namespace: str) -> Index:
+        """Get the index of a namespace, reading entries appended since the last access."""
+        with self._lock:
+            path = self._ref_path(namespace)
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                self._indexes.pop(namespace, None)
+                self._positions.pop(namespace, None)
+                return {}
+            inode, offset = self._positions.get(namespace, (stat.st_ino, 0))
+            if inode != stat.st_ino:
+                # The log was compacted, so read it from the start
+                self._indexes.pop(namespace, None)
+                offset = 0
+            index = self._indexes.setdefault(namespace, {})
+            if stat.st_size > offset:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    data = f.read(stat.st_size - offset)
+                # A line still being appended by another process is read on a later access
+                end = data.rfind(b"\n") + 1
+                for line in data[:end].splitlines():
+                    key, digest, mtime = json.loads(line)
+                    index[key] = (digest, mtime)
+                offset += end
+            self._positions[namespace] = (stat.st_ino, offset)
+            return index
+
+    def _pack(self, namespace: str) -> Optional[Pack]:
+        """Get the archive holding a round namespace, if the round was archived."""
+        root, _, round_dir = namespace.partition("/")
+        if root not in ("generated", "analysis") or not round_dir.startswith("round_"):
+            return None
+        round_num = int(round_dir[len("round_") :])
+        with self._lock:
+            if round_num not in self._packs:
+                path = pack_path(self.workspace_dir, round_num)
+                self._packs[round_num] = Pack(path) if path.exists() else None
+            return self._packs[round_num]
+
+    def _entry(self, namespace: str, key: str) -> Tuple[Optional[Tuple[str, float]], Optional[Pack]]:
+        """Find the blob of an artifact, in the live index or in the round archive."""
+        entry = self._index(namespace).get(key)
+        if entry is not None:
+            return entry, None
+        pack = self._pack(namespace)
+        if pack is not None and key in pack.indexes.get(namespace, {}):
+            return pack.indexes[namespace][key], pack
+        return None, None
+
+    def read(self, namespace: str, key: str) -> Optional[str]:
+        entry, pack = self._entry(namespace, key)
+        if entry is None:
+            return None
+        if pack is None:
+            return self.blobs.get(entry[0])
+        with self._lock:
+            if pack in self._loaded:
+                self._loaded.remove(pack)
+            self._loaded.append(pack)
+            for stale in self._loaded[:-LOADED_PACKS]:
+                stale.release()
+            del self._loaded[:-LOADED_PACKS]
+        return pack.read(entry[0])
+
+    def write(self, namespace: str, key: str, content: str, mtime: Optional[float] = None) -> None:
+        digest = self.blobs.put(content)
+        line = json.dumps([key, digest, time.time() if mtime is None else mtime], separators=(",", ":")) + "\n"
+        path = self._ref_path(namespace)
+        with self._lock:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._index(namespace)
+
+    open_writer = WorkspaceStore.open_writer
+
+    def mtime(self, namespace: str, key: str) -> Optional[float]:
+        entry, _ = self._entry(namespace, key)
+        return entry[1] if entry else None
+
+    def keys(self, namespace: str) -> Iterator[str]:
+        pack = self._pack(namespace)
+        archived = pack.indexes.get(namespace, {}) if pack else {}
+        yield from sorted({*archived, *self._index(namespace)})
+
+    def exists(self, namespace: str) -> bool:
+        return next(self.keys(namespace), None) is not None
+
+    def namespaces(self) -> List[str]:
+        """List the namespaces with live or archived artifacts."""
+        refs = self.workspace_dir / REFS_DIR
+        live = {path.relative_to(refs).as_posix()[: -len(".jsonl")] for path in refs.rglob("*.jsonl")}
+        archived = {ns for path in list_packs(self.workspace_dir) for ns in Pack(path).indexes}
+        return sorted(live | archived)
+
+    def live_rounds(self) -> List[int]:
+        """List the rounds that still have reference logs, in ascending order."""
+        rounds = set()
+        for root in ("generated", "analysis"):
+            for path in (self.workspace_dir / REFS_DIR / root).glob("round_*.jsonl"):
+                rounds.add(int(path.stem[len("round_") :]))
+        return sorted(rounds)
+
+    def iter_artifacts(self) -> Iterator[Tuple[str, str, float]]:
+        for namespace in self.namespaces():
+            index = self._index(namespace)
+            pack = self._pack(namespace)
+            archived = pack.indexes.get(namespace, {}) if pack else {}
+            pack_blobs = pack.blobs() if archived.keys() - index.keys() else {}
+            for key in sorted({*archived, *index}):
+                digest, mtime = index.get(key) or archived[key]
+                content = self.blobs.get(digest) if key in index else pack_blobs[digest]
+                yield artifact_path(namespace, key), content, mtime
+
+    def archive_round(self, round_num: int) -> int:
+        """Move the artifacts of a round into a compressed archive.
+
+        The round's reference logs are replaced by ``archive/round_N.tar.xz``,
+        which holds their indexes and blobs. Archiving a round again adds
+        artifacts written since to its archive. Blobs no longer referenced by
+        live rounds are freed by ``gc``.
+
+        Args:
+            round_num: Round to archive
+
+        Returns:
+            Number of blobs in the archive
+
+        Raises:
+            ValueError: If the round has no live artifacts
+        """
+        with self._lock:
+            namespaces = [ns for ns in (f"generated/round_{round_num}", f"analysis/round_{round_num}") if self._index(ns)]
+            if not namespaces:
+                raise ValueError(f"Round {round_num} has no live artifacts to archive")
+            path = pack_path(self.workspace_dir, round_num)
+            previous = Pack(path) if path.exists() else None
+            indexes = {ns: dict(index) for ns, index in (previous.indexes if previous else {}).items()}
+            for ns in namespaces:
+                indexes.setdefault(ns, {}).update(self._index(ns))
+            archived_blobs = previous.blobs() if previous else {}
+
+            def read(digest: str) -> str:
+                return archived_blobs[digest] if digest in archived_blobs else self.blobs.get(digest)
+
+            count = write_pack(path, indexes, read)
+            for ns in namespaces:
+                self._ref_path(ns).unlink()
+                self._index(ns)
+            stale = self._packs.pop(round_num, None)
+            if stale in self._loaded:
+                self._loaded.remove(stale)
+        logger.info(f"Archived round {round_num} ({count} blobs) to {path}")
+        return count
+
+    def gc(self) -> Dict[str, int]:
+        """Compact reference logs and delete blobs no live namespace refers to.
+
+        Must not run while another process writes to the workspace.
+
+        Returns:
+            Numbers of compacted logs, removed blobs and freed bytes
+        """
+        stats = {"compacted": 0, "removed": 0, "freed": 0}
+        with self._lock:
+            live = set()
+            refs = self.workspace_dir / REFS_DIR
+            for path in sorted(refs.rglob("*.jsonl")):
+                namespace = path.relative_to(refs).as_posix()[: -len(".jsonl")]
+                index = self._index(namespace)
+                live.update(digest for digest, _ in index.values())
+                lines = "".join(
+                    json.dumps([key, digest, mtime], separators=(",", ":")) + "\n"
+                    for key, (digest, mtime) in sorted(index.items())
+                )
+                if len(lines) < path.stat().st_size:
+                    atomic_write_text(path, lines)
+                    self._index(namespace)
+                    stats["compacted"] += 1
+            for digest in list(self.blobs.digests()):
+                if digest not in live:
+                    stats["freed"] += self.blobs.remove(digest)
+                    stats["removed"] += 1
+        return stats
+
+
+class SQLiteStore(WorkspaceStore):
+    """Store the whole workspace in a single indexed SQLite database.
+
+    Writes are buffered and committed in batched transactions, either when the
+    buffer reaches ``batch_size`` entries, when ``flush_interval`` seconds have
+    passed since the last commit, or on an explicit flush. Artifacts and records
+    are committed together, so a journal entry is never durable without the
+    artifact it refers to.
+    """
+
+    def __init__(self, workspace_dir: Path, batch_size: int = 200, flush_interval: float = 2.0):
+        """Initialize store.
+
+        Args:
+            workspace_dir: Path to workspace directory
+            batch_size: Number of buffered writes that triggers a commit
+            flush_interval: Maximum seconds between commits while writing
+        """
+        super().__init__(workspace_dir)
+        self.db_path = workspace_dir / "workspace.db"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        workspace_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        # Worker processes may share the database, so wait for their commits instead of failing
+        self._conn = sqlite3.connect(self.db_path, timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                path TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                content TEXT NOT NULL,
+                mtime REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS artifacts_namespace ON artifacts (namespace, key);
+            CREATE TABLE IF NOT EXISTS meta (
+                name TEXT PRIMARY KEY,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS records_kind ON records (kind, id);
+            """
+        )
+
+        self._artifacts: Dict[str, Tuple[str, str, str, float]] = {}
+        self._meta: Dict[str, str] = {}
+        self._records: List[Tuple[str, str]] = []
+        self._last_flush = time.monotonic()
+
+    def _pending_count(self) -> int:
+        return len(self._artifacts) + len(self._meta) + len(self._records)
+
+    def _maybe_flush(self) -> None:
+        if self._pending_count() >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def read(self, namespace: str, key: str) -> Optional[str]:
+        path = artifact_path(namespace, key)
+        with self._lock:
+            if path in self._artifacts:
+                return self._artifacts[path][2]
+            row = self._conn.execute("SELECT content FROM artifacts WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def write(self, namespace: str, key: str, content: str, mtime: Optional[float] = None) -> None:
+        path = artifact_path(namespace, key)
+        with self._lock:
+            self._artifacts[path] = (namespace, key, content, time.time() if mtime is None else mtime)
+            self._maybe_flush()
+
+    def mtime(self, namespace: str, key: str) -> Optional[float]:
+        path = artifact_path(namespace, key)
+        with self._lock:
+            if path in self._artifacts:
+                return self._artifacts[path][3]
+            row = self._conn.execute("SELECT mtime FROM artifacts WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else None
+
+    def keys(self, namespace: str) -> Iterator[str]:
+        with self._lock:
+            self.flush()
+            rows = self._conn.execute(
+                "SELECT key FROM artifacts WHERE namespace = ? ORDER BY key", (namespace,)
+            ).fetchall()
+        for (key,) in rows:
+            yield key
+
+    def exists(self, namespace: str) -> bool:
+        with self._lock:
+            self.flush()
+            row = self._conn.execute(
+                "SELECT 1 FROM artifacts WHERE namespace = ? OR namespace LIKE ? LIMIT 1",
+                (namespace, f"{namespace}/%"),
+            ).fetchone()
+        return row is not None
+
+    def iter_artifacts(self) -> Iterator[Tuple[str, str, float]]:
+        with self._lock:
+            self.flush()
+            cursor = self._conn.execute("SELECT path, content, mtime FROM artifacts ORDER BY path")
+            while rows := cursor.fetchmany(256):
+                yield from rows
+
+    def write_meta(self, name: str, data: Dict) -> None:
+        with self._lock:
+            self._meta[name] = json.dumps(data)
+            self._maybe_flush()
+
+    def read_meta(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            if name in self._meta:
+                return json.loads(self._meta[name])
+            row = self._conn.execute("SELECT data FROM meta WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def meta_names(self) -> List[str]:
+        with self._lock:
+            self.flush()
+            return [row[0] for row in self._conn.execute("SELECT name FROM meta ORDER BY name")]
+
+    def append_record(self, kind: str, record: Dict) -> None:
+        with self._lock:
+            self._records.append((kind, json.dumps(record, separators=(",", ":"))))
+            self._maybe_flush()
+
+    def iter_records(self, kind: str) -> Iterator[Dict]:
+        with self._lock:
+            self.flush()
+            cursor = self._conn.execute("SELECT data FROM records WHERE kind = ? ORDER BY id", (kind,))
+            while rows := cursor.fetchmany(1024):
+                for (data,) in rows:
+                    yield json.loads(data)
+
+    def clear_records(self, kind: str) -> None:
+        with self._lock:
+            self.flush()
+            self._conn.execute("DELETE FROM records WHERE kind = ?", (kind,))
+
+    def record_kinds(self) -> List[str]:
+        with self._lock:
+            self.flush()
+            return [row[0] for row in self._conn.execute("SELECT DISTINCT kind FROM records ORDER BY kind")]
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._pending_count():
+                self._conn.execute("BEGIN")
+                try:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO artifacts (path, namespace, key, content, mtime) VALUES (?, ?, ?, ?, ?)",
+                        [(path, *values) for path, values in self._artifacts.items()],
+                    )
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO meta (name, data) VALUES (?, ?)", list(self._meta.items())
+                    )
+                    self._conn.executemany("INSERT INTO records (kind, data) VALUES (?, ?)", self._records)
+                    self._conn.execute("COMMIT")
+                except BaseException:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self._artifacts.clear()
+                self._meta.clear()
+                self._records.clear()
+            self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            self._conn.close()
+
+
+STORE_BACKENDS = {"files": FileStore, "sqlite": SQLiteStore, "blobs": BlobStore}
+
+
+def detect_backend(workspace_dir: Path) -> str:
+    """Detect the backend of an existing workspace from its files."""
+    if (workspace_dir / "workspace.db").exists():
+        return "sqlite"
+    return "blobs" if (workspace_dir / REFS_DIR).is_dir() else "files"
+
+
+def open_store(workspace_dir: Path, backend: Optional[str] = None) -> WorkspaceStore:
+    """Open a workspace store.
+
+    Args:
+        workspace_dir: Path to workspace directory
+        backend: Backend name, ``files``, ``sqlite`` or ``blobs`` (default: config.store)
+
+    Returns:
+        Workspace store instance
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    backend = backend or config.store
+    if backend not in STORE_BACKENDS:
+        raise ValueError(f"Unknown workspace store '{backend}', expected one of: {', '.join(STORE_BACKENDS)}")
+    return STORE_BACKENDS[backend](workspace_dir)
+
+
+@contextlib.asynccontextmanager
+async def workspace_store(workspace_dir: Path, store: Optional[WorkspaceStore] = None) -> AsyncIterator[WorkspaceStore]:
+    """Use the given store, or open the workspace's store for the duration of the context.
+
+    Args:
+        workspace_dir: Path to workspace directory
+        store: Store owned by the caller, which is left open
+
+    Yields:
+        The given store, or the workspace's store with its backend detected
+    """
+    if store is not None:
+        yield store
+        return
+    store = await run_io(lambda: open_store(workspace_dir, detect_backend(workspace_dir)))
+    try:
+        yield store
+    finally:
+        await run_io(store.close)
+
+
+async def ensure_workspace(workspace_dir: Path, backend: str = "files"):
+    """Create workspace directories."""
+    subdirs = ["descriptions", "generated", "analysis", "prompts"] if backend == "files" else []
+    for path in [workspace_dir, *(workspace_dir / subdir for subdir in subdirs)]:
+        await run_io(path.mkdir, parents=True, exist_ok=True)
+
+
+def export_workspace(store: WorkspaceStore, dest_dir: Path) -> int:
+    """Materialize a store as the mirrored directory layout.
+
+    Artifact modification times are preserved so that freshness checks behave
+    the same against the exported tree.
+
+    Args:
+        store: Source workspace store
+        dest_dir: Destination workspace directory
+
+    Returns:
+        Number of artifacts written
+    """
+    exported = FileStore(dest_dir)
+    count = 0
+    for path, content, mtime in store.iter_artifacts():
+        target = dest_dir / path
+        atomic_write_text(target, content)
+        os.utime(target, (mtime, mtime))
+        count += 1
+
+    for name in store.meta_names():
+        exported.write_meta(name, store.read_meta(name))
+
+    for kind in store.record_kinds():
+        target = dest_dir / f"{kind}.jsonl"
+        lines = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in store.iter_records(kind))
+        atomic_write_text(target, lines)
+
+    return count
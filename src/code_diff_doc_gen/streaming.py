@@ -0,0 +1,349 @@
+"""Streaming API calls with early validation of structured output.
+
+The tool-call JSON of a streamed response is scanned as it arrives, so a
+response that starts going wrong (unknown fields, invalid JSON) is aborted
+immediately instead of after the whole completion has been paid for. The value
+of one string field can be spooled to a file while it is being generated.
+"""
+
+import contextlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from .fileio import run_io
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_SCALAR = set("0123456789+-.eEtruefalsn")
+_WHITESPACE = set(" \t\r\n")
+
+
+class StreamError(Exception):
+    """Streamed response was aborted before producing a valid result."""
+
+    usage: Any = None
+
+
+class MalformedOutputError(StreamError):
+    """Streamed tool input is not valid for the response model."""
+
+
+class TruncatedOutputError(StreamError):
+    """Streamed response stopped before the tool input was complete."""
+
+
+class ToolInputScanner:
+    """Incremental scanner for the JSON object passed to a streamed tool call.
+
+    Only the top level of the object is parsed. Field names are checked against
+    the response model as soon as they complete, nested values are skipped, and
+    the decoded value of one string field can be forwarded chunk by chunk.
+    """
+
+    def __init__(self, fields: Set[str], capture: Optional[str] = None, on_capture: Optional[Callable[[str], None]] = None):
+        """Initialize scanner.
+
+        Args:
+            fields: Field names allowed at the top level
+            capture: Name of a string field whose value should be forwarded
+            on_capture: Callback receiving decoded text of the captured field
+        """
+        self.fields = fields
+        self.capture = capture
+        self.on_capture = on_capture
+        self.seen: List[str] = []
+        self._state = "start"
+        self._key: List[str] = []
+        self._hex = ""
+        self._high_surrogate: Optional[int] = None
+        self._capturing = False
+        self._depth = 0
+        self._nested_string = False
+        self._nested_escape = False
+
+    @property
+    def complete(self) -> bool:
+        """Whether the closing brace of the object has been seen."""
+        return self._state == "done"
+
+    def _fail(self, message: str) -> None:
+        raise MalformedOutputError(f"{message} (fields so far: {', '.join(self.seen) or 'none'})")
+
+    def feed(self, chunk: str) -> None:
+        """Scan the next chunk of tool input JSON.
+
+        Args:
+            chunk: Partial JSON text
+
+        Raises:
+            MalformedOutputError: If the input can no longer become valid
+        """
+        out: List[str] = []
+        for ch in chunk:
+            state = self._state
+            if state == "string":
+                if ch == "\\":
+                    self._state = "escape"
+                elif ch == '"':
+                    self._state = "after_value"
+                    self._capturing = False
+                elif ch < " ":
+                    self._fail("Control character in string value")
+                elif self._capturing:
+                    out.append(ch)
+            elif state == "escape":
+                if ch == "u":
+                    self._hex = ""
+                    self._state = "unicode"
+                elif ch in _ESCAPES:
+                    if self._capturing:
+                        out.append(_ESCAPES[ch])
+                    self._state = "string"
+                else:
+                    self._fail(f"Invalid escape '\\{ch}'")
+            elif state == "unicode":
+                self._hex += ch
+                if len(self._hex) == 4:
+                    try:
+                        code = int(self._hex, 16)
+                    except ValueError:
+                        self._fail(f"Invalid unicode escape '\\u{self._hex}'")
+                    if self._capturing:
+                        out.append(self._decode_codepoint(code))
+                    self._state = "string"
+            elif state == "nested":
+                self._scan_nested(ch)
+            elif state == "key":
+                if ch == '"':
+                    key = "".join(self._key)
+                    if key not in self.fields:
+                        self._fail(f"Unexpected field '{key}'")
+                    self.seen.append(key)
+                    self._state = "colon"
+                else:
+                    self._key.append(ch)
+            elif ch in _WHITESPACE:
+                if state == "scalar":
+                    self._state = "after_value"
+            elif state == "start":
+                if ch != "{":
+                    self._fail("Tool input is not a JSON object")
+                self._state = "key_or_end"
+            elif state in ("key_or_end", "next_key"):
+                if ch == '"':
+                    self._key = []
+                    self._state = "key"
+                elif ch == "}" and state == "key_or_end":
+                    self._state = "done"
+                else:
+                    self._fail(f"Expected field name, got '{ch}'")
+            elif state == "colon":
+                if ch != ":":
+                    self._fail(f"Expected ':', got '{ch}'")
+                self._state = "value"
+            elif state == "value":
+                if ch == '"':
+                    self._capturing = self.seen[-1] == self.capture
+                    self._state = "string"
+                elif ch in "{[":
+                    self._depth = 1
+                    self._state = "nested"
+                elif ch in _SCALAR:
+                    self._state = "scalar"
+                else:
+                    self._fail(f"Invalid value start '{ch}'")
+            elif state in ("scalar", "after_value"):
+                if ch == ",":
+                    self._state = "next_key"
+                elif ch == "}":
+                    self._state = "done"
+                elif state == "scalar" and ch in _SCALAR:
+                    pass
+                else:
+                    self._fail(f"Expected ',' or '}}', got '{ch}'")
+            else:
+                self._fail(f"Unexpected '{ch}' after end of object")
+
+        if out and self.on_capture:
+            self.on_capture("".join(out))
+
+    def _decode_codepoint(self, code: int) -> str:
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code) if not 0xD800 <= code < 0xE000 else "�"
+
+    def _scan_nested(self, ch: str) -> None:
+        if self._nested_string:
+            if self._nested_escape:
+                self._nested_escape = False
+            elif ch == "\\":
+                self._nested_escape = True
+            elif ch == '"':
+                self._nested_string = False
+        elif ch == '"':
+            self._nested_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                self._state = "after_value"
+
+
+class PartialWriter:
+    """Spool a streamed string field to a file while it is generated.
+
+    Text is buffered in memory and appended to the file in blocks on the I/O
+    thread pool. The file is removed once the final artifact has been stored
+    and kept when the call fails, so partial output can be inspected.
+    """
+
+    def __init__(self, path: Path, field: str, block_size: int = 16384):
+        """Initialize writer.
+
+        Args:
+            path: File to spool partial output to
+            field: Name of the response model field to capture
+            block_size: Buffered characters that trigger a write
+        """
+        self.path = path
+        self.field = field
+        self.block_size = block_size
+        self.written = 0
+        self._buffer: List[str] = []
+        self._buffered = 0
+        self._truncate = True
+
+    def write(self, text: str) -> None:
+        """Buffer decoded text of the captured field."""
+        self._buffer.append(text)
+        self._buffered += len(text)
+
+    @property
+    def should_flush(self) -> bool:
+        """Whether enough text is buffered to write a block."""
+        return self._buffered >= self.block_size
+
+    def _append(self, text: str, truncate: bool) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w" if truncate else "a", encoding="utf-8") as f:
+            f.write(text)
+
+    async def flush(self) -> None:
+        """Append buffered text to the spool file."""
+        if not self._buffer and not self._truncate:
+            return
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._buffered = 0
+        await run_io(self._append, text, self._truncate)
+        self._truncate = False
+        self.written += len(text)
+
+    def reset(self) -> None:
+        """Discard spooled output before a retry."""
+        self._buffer.clear()
+        self._buffered = 0
+        self._truncate = True
+        self.written = 0
+
+    async def discard(self) -> None:
+        """Remove the spool file."""
+        with contextlib.suppress(FileNotFoundError):
+            await run_io(os.unlink, self.path)
+
+
+async def stream_structured(
+    client: Any,
+    response_model: Any,
+    system: List[Dict],
+    messages: List[Dict],
+    partial: Optional[PartialWriter] = None,
+    **create_kwargs: Any,
+) -> Tuple[Any, Any, Optional[float]]:
+    """Stream a tool-call completion and validate it as it arrives.
+
+    The request uses the same tool definition and system prompt suffix as the
+    non-streaming instructor call, so both paths produce the same outputs.
+
+    Args:
+        client: Raw async Anthropic client
+        response_model: Pydantic model for response validation
+        system: System prompt blocks
+        messages: Conversation messages
+        partial: Optional spool for the value of one string field
+        **create_kwargs: Model, token limits and other request parameters
+
+    Returns:
+        Tuple of the validated response, the usage and the time to first token
+
+    Raises:
+        MalformedOutputError: If the tool input is invalid for the model
+        TruncatedOutputError: If the response hit the token limit
+    """
+    from instructor import Mode
+    from instructor.process_response import handle_response_model
+    from pydantic import ValidationError
+
+    _, request = handle_response_model(
+        response_model, Mode.ANTHROPIC_REASONING_TOOLS, system=system, messages=messages
+    )
+    tool_name = request["tools"][0]["name"]
+    scanner = ToolInputScanner(
+        set(response_model.model_fields),
+        capture=partial.field if partial else None,
+        on_capture=partial.write if partial else None,
+    )
+
+    chunks: List[str] = []
+    ttft: Optional[float] = None
+    start = time.monotonic()
+    async with client.beta.messages.stream(**request, **create_kwargs) as stream:
+        try:
+            async for event in stream:
+                if event.type == "content_block_start" and event.content_block.type == "tool_use":
+                    if event.content_block.name != tool_name:
+                        raise MalformedOutputError(f"Unexpected tool '{event.content_block.name}'")
+                elif event.type == "content_block_delta":
+                    if ttft is None:
+                        ttft = time.monotonic() - start
+                    if event.delta.type == "input_json_delta":
+                        chunks.append(event.delta.partial_json)
+                        scanner.feed(event.delta.partial_json)
+                        if partial and partial.should_flush:
+                            await partial.flush()
+        except StreamError as e:
+            # Leaving the stream context closes the connection, so the rest of the response is never generated
+            e.usage = stream.current_message_snapshot.usage
+            raise
+        message = await stream.get_final_message()
+
+    if partial:
+        await partial.flush()
+
+    if message.stop_reason == "max_tokens":
+        error = TruncatedOutputError(f"Response hit the {create_kwargs.get('max_tokens')} token limit")
+        error.usage = message.usage
+        raise error
+    if not chunks or not scanner.complete:
+        error = MalformedOutputError(f"Response ended without a complete '{tool_name}' tool call")
+        error.usage = message.usage
+        raise error
+
+    try:
+        response = response_model.model_validate(json.loads("".join(chunks)))
+    except (ValueError, ValidationError) as e:
+        error = MalformedOutputError(f"Invalid '{tool_name}' tool input: {e}")
+        error.usage = message.usage
+        raise error from e
+
+    logger.debug(f"Streamed {tool_name} with first token after {ttft or 0:.2f}s")
+    return response, message.usage, ttft
@@ -0,0 +1,195 @@
+"""Shared HTTP transport for API calls with pool instrumentation."""
+
+import asyncio
+import importlib.util
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+from loguru import logger
+
+from .config import AppConfig
+
+
+@dataclass
+class PoolStats:
+    """Connection pool utilization counters."""
+
+    max_connections: int
+    requests: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    waited: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    busy_sum: int = 0
+
+    def summary(self) -> Dict[str, float]:
+        """Summarize pool utilization and wait time.
+
+        Returns:
+            Request count, peak and mean utilization, wait counts and times
+        """
+        mean_busy = self.busy_sum / self.requests if self.requests else 0.0
+        return {
+            "requests": self.requests,
+            "peak_in_flight": self.peak_in_flight,
+            "mean_utilization": round(mean_busy / self.max_connections, 3),
+            "waited": self.waited,
+            "mean_wait_ms": round(self.total_wait / self.requests * 1000, 2) if self.requests else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+        }
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response stream that frees its pool slot once the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """Transport that admits at most ``max_connections`` concurrent requests.
+
+    Requests queue on a semaphore instead of timing out inside the connection
+    pool, and the time spent queued is recorded as pool wait time.
+    """
+
+    def __init__(self, inner: httpx.AsyncBaseTransport, max_connections: int):
+        """Initialize transport.
+
+        Args:
+            inner: Transport that performs the requests
+            max_connections: Maximum concurrent requests (matches the pool size)
+        """
+        self._inner = inner
+        self._slots = asyncio.Semaphore(max_connections)
+        self.stats = PoolStats(max_connections=max_connections)
+
+    def _release(self) -> None:
+        self.stats.in_flight -= 1
+        self._slots.release()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.monotonic()
+        await self._slots.acquire()
+        wait = time.monotonic() - start
+
+        stats = self.stats
+        stats.requests += 1
+        stats.in_flight += 1
+        stats.busy_sum += stats.in_flight
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        stats.total_wait += wait
+        stats.max_wait = max(stats.max_wait, wait)
+        if wait > 0.001:
+            stats.waited += 1
+
+        try:
+            response = await self._inner.handle_async_request(request)
+        except BaseException:
+            self._release()
+            raise
+
+        released = False
+
+        def release_once() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self._release()
+
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release_once),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+
+def http2_available() -> bool:
+    """Check whether the optional h2 package needed for HTTP/2 is installed."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def build_timeout(app_config: AppConfig) -> httpx.Timeout:
+    """Build request timeouts from the application config."""
+    return httpx.Timeout(
+        connect=app_config.connect_timeout,
+        read=app_config.read_timeout,
+        write=app_config.connect_timeout,
+        pool=app_config.read_timeout,
+    )
+
+
+def build_http_client(app_config: AppConfig) -> httpx.AsyncClient:
+    """Build the HTTP client shared by all API calls.
+
+    Args:
+        app_config: Application configuration with transport settings
+
+    Returns:
+        Async HTTP client with tuned limits, keep-alive and HTTP/2 if available
+    """
+    http2 = app_config.http2
+    if http2 and not http2_available():
+        logger.warning("HTTP/2 requested but the 'h2' package is not installed, using HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=app_config.max_connections,
+        max_keepalive_connections=app_config.max_keepalive_connections,
+        keepalive_expiry=app_config.keepalive_expiry,
+    )
+    inner = httpx.AsyncHTTPTransport(http2=http2, limits=limits)
+    return httpx.AsyncClient(
+        transport=PooledTransport(inner, app_config.max_connections),
+        timeout=build_timeout(app_config),
+    )
+
+
+async def prewarm(http_client: httpx.AsyncClient, base_url: str, connections: int) -> None:
+    """Open connections ahead of the first API calls.
+
+    Issues lightweight concurrent requests so TLS handshakes happen before the
+    first batch of real calls. Responses and errors are ignored.
+
+    Args:
+        http_client: Shared HTTP client
+        base_url: API base URL to connect to
+        connections: Number of connections to open
+    """
+    if connections <= 0:
+        return
+
+    async def touch() -> None:
+        try:
+            response = await http_client.head(base_url)
+            await response.aclose()
+        except httpx.HTTPError as e:
+            logger.debug(f"Connection pre-warm failed: {e}")
+
+    start = time.monotonic()
+    await asyncio.gather(*(touch() for _ in range(connections)))
+    logger.debug(f"Pre-warmed {connections} connections in {time.monotonic() - start:.2f}s")
+
+
+def pool_stats(http_client: Optional[httpx.AsyncClient]) -> Optional[PoolStats]:
+    """Get pool statistics of a client built by ``build_http_client``."""
+    transport = getattr(http_client, "_transport", None)
+    return transport.stats if isinstance(transport, PooledTransport) else None
@@ -0,0 +1,156 @@
+"""Watch mode: continuously regenerate files as they change.
+
+The source tree is polled with the same stat-only scan as the manifest fast
+path. Changed files are collected until the tree has been quiet for the
+debounce interval, so a burst of saves becomes one batch, and the batch runs
+through the per-file pipeline. The store, API clients, connection pool and
+cost model stay alive between batches.
+"""
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from .fileio import run_io
+from .journal import Journal
+from .llm import generate_system_prompt_from_analyses
+from .manifest import load_manifest, save_manifest, scan_sources
+from .pipeline import PIPELINE_STAGES, run_pipeline
+from .scheduler import CostModel
+from .store import WorkspaceStore
+
+
+class ChangeTracker:
+    """Detect changed source files between scans and debounce bursts of changes."""
+
+    def __init__(self, known: Dict[str, Tuple[int, int]], debounce: float = 0.5):
+        """Initialize tracker.
+
+        Args:
+            known: Scan of the files that are already processed
+            debounce: Seconds without changes before pending files are released
+        """
+        self.known = dict(known)
+        self.debounce = debounce
+        self.pending: Dict[str, float] = {}
+        self._quiet_at = 0.0
+
+    def update(self, scan: Dict[str, Tuple[int, int]], now: float) -> List[str]:
+        """Compare a new scan with the previous one.
+
+        Args:
+            scan: Current scan of the source directory
+            now: Monotonic time of the scan
+
+        Returns:
+            Files that changed or appeared since the previous scan
+        """
+        changed = [path for path, stat in scan.items() if self.known.get(path) != stat]
+        for path in self.known.keys() - scan.keys():
+            self.pending.pop(path, None)
+        for path in changed:
+            self.pending[path] = now
+        if changed:
+            self._quiet_at = now + self.debounce
+        self.known = dict(scan)
+        return changed
+
+    def retry(self, paths: List[str], delay: float, now: float) -> None:
+        """Queue files again after a delay, e.g. after they failed."""
+        for path in paths:
+            self.pending[path] = now + delay
+
+    def ready(self, now: float) -> List[str]:
+        """Release the pending files that are due once the tree is quiet."""
+        if now < self._quiet_at:
+            return []
+        batch = sorted(path for path, due in self.pending.items() if due <= now)
+        for path in batch:
+            del self.pending[path]
+        return batch
+
+
+async def watch_sources(
+    source_dir: Path,
+    round_num: int,
+    workspace_dir: Path,
+    store: WorkspaceStore,
+    journal: Optional[Journal] = None,
+    costs: Optional[CostModel] = None,
+    interval: float = 1.0,
+    debounce: float = 0.5,
+    retry_delay: float = 60.0,
+    stop: Optional[asyncio.Event] = None,
+) -> int:
+    """Process changed files of a round until stopped.
+
+    On start, every file that changed since the manifest was last saved is
+    processed. After each batch the next round's system prompt is rebuilt
+    from the latest analyses, and once every file is up to date the manifest
+    is saved, so a later ``run`` of the round takes the fast path. Files whose
+    stages fail are retried after ``retry_delay`` seconds.
+
+    Args:
+        source_dir: Directory containing source files
+        round_num: Generation round number
+        workspace_dir: Path to workspace directory
+        store: Workspace store
+        journal: Optional run journal to record completion in
+        costs: Cost model used to prioritize work
+        interval: Seconds between scans of the source tree
+        debounce: Seconds without changes before a batch starts
+        retry_delay: Seconds before failed files are retried
+        stop: Event that ends watching when set
+
+    Returns:
+        Number of batches processed
+    """
+    costs = costs or CostModel()
+    stop = stop or asyncio.Event()
+    manifest = await run_io(load_manifest, store)
+    known: Dict[str, Tuple[int, int]] = {}
+    if manifest and manifest.get("source_dir") == str(source_dir.resolve()) and round_num in manifest.get("rounds", []):
+        known = {path: tuple(stat) for path, stat in manifest.get("files", {}).items()}
+    tracker = ChangeTracker(known, debounce)
+    analysis_ns = f"analysis/round_{round_num}"
+
+    batches = 0
+    logger.info(f"Watching {source_dir} for changes (round {round_num}, Ctrl+C to stop)")
+    while not stop.is_set():
+        scan = await run_io(scan_sources, source_dir)
+        now = time.monotonic()
+        tracker.update(scan, now)
+        batch = tracker.ready(now)
+        if batch:
+            batches += 1
+            logger.info(f"Processing {len(batch)} changed files: {', '.join(batch[:5])}{' ...' if len(batch) > 5 else ''}")
+            paths = [source_dir / path for path in batch]
+            costs.sizes.update((path, scan[path][0]) for path in batch)
+            counts = await run_pipeline(
+                source_dir, round_num, workspace_dir, {stage: paths for stage in PIPELINE_STAGES}, store, journal, costs
+            )
+            if counts["analyze"]["analyzed"]:
+                await generate_system_prompt_from_analyses(round_num, workspace_dir, store)
+
+            # A file is done once its analysis is newer than the source, as in the analyze stage
+            def stale(path: str) -> bool:
+                analyzed = store.mtime(analysis_ns, path)
+                return analyzed is None or analyzed <= scan[path][1] / 1e9
+
+            failed = [path for path in batch if await run_io(stale, path)]
+            if failed:
+                logger.warning(f"{len(failed)} files failed, retrying in {retry_delay:.0f}s")
+                tracker.retry(failed, retry_delay, time.monotonic())
+            elif not tracker.pending:
+                await run_io(save_manifest, store, source_dir, round_num, tracker.known, manifest)
+                manifest = await run_io(load_manifest, store)
+
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            pass
+
+    return batches
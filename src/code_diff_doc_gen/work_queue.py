@@ -0,0 +1,312 @@
+"""Lease-based task queue shared by worker processes.
+
+The queue lives in ``queue.db`` in the workspace. Each task is one source file
+of one round; a worker claims the most expensive pending task under a lease,
+renews the lease while it works and marks the task done or failed. Leases of
+crashed workers expire and their tasks are handed to the next worker that
+asks, so no coordinator process is needed.
+
+The database uses SQLite's rollback journal rather than WAL, which needs shared
+memory and so does not work on network filesystems. Every transaction is also
+made under ``queue.lock``, a lock file created with ``O_EXCL``, which is atomic
+on network filesystems too, so workers on hosts that share the workspace can
+never claim the same task. A lock left behind by a process that died inside a
+transaction is removed once it is older than ``LOCK_STALE_SECONDS``.
+
+A task is queued once per round and source file. When a finished file's source
+changed since it was queued, offering it again queues it anew.
+"""
+
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+QUEUE_DB = "queue.db"
+QUEUE_LOCK = "queue.lock"
+# Transactions take milliseconds; an older lock belongs to a dead process
+LOCK_STALE_SECONDS = 60.0
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS tasks (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        round INTEGER NOT NULL,
+        path TEXT NOT NULL,
+        priority REAL NOT NULL DEFAULT 0,
+        source_mtime REAL NOT NULL DEFAULT 0,
+        state TEXT NOT NULL DEFAULT 'pending',
+        owner TEXT,
+        lease_until REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        error TEXT,
+        result TEXT,
+        UNIQUE (round, path)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (round, state, priority)",
+    """
+    CREATE TABLE IF NOT EXISTS rounds (
+        round INTEGER PRIMARY KEY,
+        finalized_by TEXT NOT NULL,
+        finalized_at REAL NOT NULL
+    )
+    """,
+)
+
+
+@dataclass
+class Task:
+    """A claimed per-file task."""
+
+    id: int
+    round: int
+    path: str
+    attempts: int
+
+
+class WorkQueue:
+    """SQLite-backed queue of per-file tasks with expiring leases."""
+
+    def __init__(
+        self, workspace_dir: Path, lease_seconds: float = 600.0, max_attempts: int = 3, lock_timeout: float = 30.0
+    ):
+        """Initialize queue.
+
+        Args:
+            workspace_dir: Workspace directory holding the queue database
+            lease_seconds: Seconds a claim stays valid without renewal
+            max_attempts: Claims per task before it is marked failed
+            lock_timeout: Seconds to wait for the queue lock before giving up
+        """
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock_timeout = lock_timeout
+        workspace_dir.mkdir(parents=True, exist_ok=True)
+        self._lock_path = workspace_dir / QUEUE_LOCK
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            workspace_dir / QUEUE_DB, timeout=lock_timeout, check_same_thread=False, isolation_level=None
+        )
+        with self._locked():
+            self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._transaction(self._create_schema)
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> None:
+        for statement in SCHEMA:
+            conn.execute(statement)
+        # Queues created before source times were recorded
+        if "source_mtime" not in {row[1] for row in conn.execute("PRAGMA table_info(tasks)")}:
+            conn.execute("ALTER TABLE tasks ADD COLUMN source_mtime REAL NOT NULL DEFAULT 0")
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Hold the thread lock and the queue lock file shared by all workers."""
+        with self._lock:
+            deadline = time.monotonic() + self.lock_timeout
+            while True:
+                try:
+                    fd = os.open(self._lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                    break
+                except FileExistsError:
+                    try:
+                        stale = time.time() - self._lock_path.stat().st_mtime > LOCK_STALE_SECONDS
+                    except FileNotFoundError:
+                        continue
+                    if stale:
+                        with contextlib.suppress(FileNotFoundError):
+                            self._lock_path.unlink()
+                        continue
+                    if time.monotonic() > deadline:
+                        raise TimeoutError(f"Queue lock {self._lock_path} held for over {self.lock_timeout}s")
+                    time.sleep(0.005)
+            os.close(fd)
+            try:
+                yield
+            finally:
+                with contextlib.suppress(FileNotFoundError):
+                    self._lock_path.unlink()
+
+    def _transaction(self, body):
+        """Run a function inside an immediate (write-locked) transaction."""
+        with self._locked():
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = body(self._conn)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def enqueue(self, round_num: int, tasks: Iterable[Tuple[str, float, float]]) -> int:
+        """Add tasks for a round, ignoring files that are already queued.
+
+        A finished (done or failed) task whose source changed since it was
+        queued is queued again, and its round is no longer finalized.
+
+        Args:
+            round_num: Generation round number
+            tasks: Tuples of relative source path, priority (higher runs first)
+                and source modification time in nanoseconds
+
+        Returns:
+            Number of newly queued or requeued tasks
+        """
+        rows = [(round_num, path, priority, mtime_ns) for path, priority, mtime_ns in tasks]
+
+        def insert(conn: sqlite3.Connection) -> int:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT INTO tasks (round, path, priority, source_mtime) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (round, path) DO UPDATE SET state = 'pending', priority = excluded.priority, "
+                "source_mtime = excluded.source_mtime, owner = NULL, lease_until = NULL, attempts = 0, "
+                "error = NULL, result = NULL "
+                "WHERE tasks.state IN ('done', 'failed') AND excluded.source_mtime > tasks.source_mtime",
+                rows,
+            )
+            queued = conn.total_changes - before
+            if queued:
+                conn.execute("DELETE FROM rounds WHERE round = ?", (round_num,))
+            return queued
+
+        return self._transaction(insert)
+
+    def claim(self, round_num: int, owner: str) -> Optional[Task]:
+        """Claim the highest-priority available task of a round.
+
+        Pending tasks and tasks whose lease expired are available.
+
+        Args:
+            round_num: Generation round number
+            owner: Worker id
+
+        Returns:
+            Claimed task, or None if nothing is available right now
+        """
+
+        def take(conn: sqlite3.Connection) -> Optional[Task]:
+            now = time.time()
+            # Expired tasks that used up their attempts are failed rather than retried forever
+            conn.execute(
+                "UPDATE tasks SET state = 'failed', error = COALESCE(error, 'lease expired') "
+                "WHERE round = ? AND state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (round_num, now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT id, path, attempts FROM tasks WHERE round = ? "
+                "AND (state = 'pending' OR (state = 'leased' AND lease_until < ?)) "
+                "ORDER BY priority DESC, id LIMIT 1",
+                (round_num, now),
+            ).fetchone()
+            if row is None:
+                return None
+            task_id, path, attempts = row
+            conn.execute(
+                "UPDATE tasks SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (owner, now + self.lease_seconds, task_id),
+            )
+            return Task(task_id, round_num, path, attempts + 1)
+
+        return self._transaction(take)
+
+    def renew(self, task: Task, owner: str) -> bool:
+        """Extend the lease of a claimed task.
+
+        Returns:
+            False if the task was reclaimed by another worker in the meantime
+        """
+
+        def extend(conn: sqlite3.Connection) -> bool:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_until = ? WHERE id = ? AND owner = ? AND state = 'leased'",
+                (time.time() + self.lease_seconds, task.id, owner),
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(extend)
+
+    def complete(self, task: Task, owner: str, result: Optional[str] = None) -> None:
+        """Mark a claimed task as done.
+
+        Args:
+            task: Claimed task
+            owner: Worker id
+            result: Generation status of the file, counted in ``results``
+        """
+        self._transaction(
+            lambda conn: conn.execute(
+                "UPDATE tasks SET state = 'done', lease_until = NULL, error = NULL, result = ? WHERE id = ? AND owner = ?",
+                (result, task.id, owner),
+            )
+        )
+
+    def fail(self, task: Task, owner: str, error: str) -> None:
+        """Release a claimed task after an error, failing it once attempts run out."""
+        state = "failed" if task.attempts >= self.max_attempts else "pending"
+        self._transaction(
+            lambda conn: conn.execute(
+                "UPDATE tasks SET state = ?, lease_until = NULL, error = ? WHERE id = ? AND owner = ?",
+                (state, error, task.id, owner),
+            )
+        )
+
+    def counts(self, round_num: int) -> Dict[str, int]:
+        """Count the tasks of a round by state."""
+        rows = self._transaction(
+            lambda conn: conn.execute(
+                "SELECT state, COUNT(*) FROM tasks WHERE round = ? GROUP BY state", (round_num,)
+            ).fetchall()
+        )
+        return {"pending": 0, "leased": 0, "done": 0, "failed": 0, **dict(rows)}
+
+    def results(self, round_num: int) -> Dict[str, int]:
+        """Count the generation statuses of a round, with failed tasks as errors."""
+        rows = self._transaction(
+            lambda conn: conn.execute(
+                "SELECT CASE WHEN state = 'failed' THEN 'error' ELSE result END, COUNT(*) FROM tasks "
+                "WHERE round = ? AND state IN ('done', 'failed') GROUP BY 1",
+                (round_num,),
+            ).fetchall()
+        )
+        return {status: count for status, count in rows if status}
+
+    def reset(self, round_num: int) -> None:
+        """Forget the tasks and finalization of a round so it can be queued again."""
+
+        def clear(conn: sqlite3.Connection) -> None:
+            conn.execute("DELETE FROM tasks WHERE round = ?", (round_num,))
+            conn.execute("DELETE FROM rounds WHERE round = ?", (round_num,))
+
+        self._transaction(clear)
+
+    def try_finalize(self, round_num: int, owner: str) -> bool:
+        """Claim the one-time finalization of a drained round.
+
+        Returns:
+            True for exactly one worker, once every task is done or failed
+        """
+
+        def finalize(conn: sqlite3.Connection) -> bool:
+            open_tasks = conn.execute(
+                "SELECT COUNT(*) FROM tasks WHERE round = ? AND state IN ('pending', 'leased')", (round_num,)
+            ).fetchone()[0]
+            if open_tasks:
+                return False
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO rounds (round, finalized_by, finalized_at) VALUES (?, ?, ?)",
+                (round_num, owner, time.time()),
+            )
+            return cursor.rowcount == 1
+
+        return self._transaction(finalize)
+
+    def close(self) -> None:
+        """Close the queue database."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,115 @@
+"""Worker processes that share one workspace through the task queue.
+
+Any number of ``worker`` processes, on one machine or on hosts that share the
+workspace filesystem, claim files from the workspace's ``WorkQueue`` and run
+all stages of a claimed file. A worker renews its lease while it works, so a
+file is only handed to another worker when its owner stopped renewing, i.e.
+crashed or lost the filesystem.
+"""
+
+import asyncio
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+from tqdm import tqdm
+
+from .config import config
+from .fileio import run_io
+from .journal import Journal
+from .llm import load_system_prompt
+from .pipeline import PIPELINE_STAGES, run_file_stage
+from .results import StatusCounts
+from .scheduler import CostModel
+from .store import WorkspaceStore
+from .work_queue import Task, WorkQueue
+
+
+async def run_worker(
+    source_dir: Path,
+    round_num: int,
+    workspace_dir: Path,
+    store: WorkspaceStore,
+    queue: WorkQueue,
+    worker_id: str,
+    journal: Optional[Journal] = None,
+    costs: Optional[CostModel] = None,
+    poll_interval: float = 5.0,
+) -> Dict[str, StatusCounts]:
+    """Claim and process files of a round until its queue is drained.
+
+    Args:
+        source_dir: Directory containing source files
+        round_num: Generation round number
+        workspace_dir: Path to workspace directory
+        store: Workspace store
+        queue: Task queue of the workspace
+        worker_id: Id of this worker, unique across processes
+        journal: Optional run journal to record completion in
+        costs: Cost model updated with observed stage timings
+        poll_interval: Seconds to wait for leases of other workers to finish or expire
+
+    Returns:
+        Status counts by stage of the files processed by this worker
+    """
+    costs = costs or CostModel()
+    prompt = await run_io(load_system_prompt, round_num, workspace_dir, store)
+    counts = {stage: StatusCounts() for stage in PIPELINE_STAGES}
+
+    async def keep_lease(task: Task) -> None:
+        while True:
+            await asyncio.sleep(queue.lease_seconds / 3)
+            if not await run_io(queue.renew, task, worker_id):
+                logger.warning(f"Lease on {task.path} was lost to another worker")
+                return
+
+    async def process(task: Task) -> Tuple[Optional[str], Optional[str]]:
+        """Run every stage of a file, returning its generation status and any error."""
+        path = source_dir / task.path
+        generated = None
+        for stage in PIPELINE_STAGES:
+            start = time.monotonic()
+            status = await run_file_stage(stage, path, source_dir, round_num, prompt, store, journal)
+            costs.observe(stage, task.path, time.monotonic() - start, None if stage == "describe" else round_num)
+            counts[stage].add(status)
+            if status == "error":
+                return generated, f"{stage} stage failed"
+            if stage == "generate":
+                generated = status
+        return generated, None
+
+    with tqdm(desc=f"Worker {worker_id}", unit="file") as progress:
+
+        async def slot() -> None:
+            while True:
+                task = await run_io(queue.claim, round_num, worker_id)
+                if task is None:
+                    open_tasks = await run_io(queue.counts, round_num)
+                    if not open_tasks["pending"] and not open_tasks["leased"]:
+                        return
+                    # Files leased by other workers finish or come back when the lease expires
+                    await asyncio.sleep(poll_interval)
+                    continue
+
+                renewal = asyncio.create_task(keep_lease(task))
+                try:
+                    generated, error = await process(task)
+                except Exception as e:
+                    logger.exception(f"Error processing {task.path}: {e}")
+                    error = str(e)
+                finally:
+                    renewal.cancel()
+
+                # Outputs must be visible to other workers before the task counts as done
+                await run_io(store.flush)
+                if error:
+                    await run_io(queue.fail, task, worker_id, error)
+                else:
+                    await run_io(queue.complete, task, worker_id, generated)
+                progress.update()
+
+        await asyncio.gather(*(slot() for _ in range(max(1, config.max_concurrency))))
+
+    await run_io(costs.save, store)
+    return counts
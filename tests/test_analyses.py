@@ -0,0 +1,88 @@
+"""Tests for structured analysis records and prompt aggregation."""
+
+import io
+from pathlib import Path
+
+from code_diff_doc_gen.analyses import iter_latest_pairs, record_analysis, write_prompt
+from code_diff_doc_gen.llm import generate_system_prompt_from_analyses
+from code_diff_doc_gen.models import CodePair
+from code_diff_doc_gen.store import FileStore
+
+
+def test_latest_analysis_wins(tmp_path: Path) -> None:
+    """Test re-analyzed files only contribute their latest pairs."""
+    store = FileStore(tmp_path)
+    record_analysis(store, 0, "a.swift", "swift", "orig", "gen1", [CodePair(bad_code="old", good_code="fix")])
+    record_analysis(store, 0, "b.swift", "swift", "orig", "gen", [CodePair(bad_code="b", good_code="B")])
+    record_analysis(store, 0, "a.swift", "swift", "orig", "gen2", [CodePair(bad_code="new", good_code="fix")])
+
+    pairs = list(iter_latest_pairs(store, 0))
+
+    assert [(p["file"], p["bad_code"]) for p in pairs] == [("b.swift", "b"), ("a.swift", "new")]
+
+
+def test_filtering_and_deduplication(tmp_path: Path) -> None:
+    """Test language filters, per-file caps and duplicate pairs."""
+    store = FileStore(tmp_path)
+    same = CodePair(bad_code="var x", good_code="let x")
+    record_analysis(store, 0, "a.swift", "swift", "a", "a", [same, CodePair(bad_code="1", good_code="2")])
+    record_analysis(store, 0, "b.swift", "swift", "b", "b", [same])
+    record_analysis(store, 0, "c.py", "python", "c", "c", [CodePair(bad_code="3", good_code="4")])
+
+    assert len(list(iter_latest_pairs(store, 0))) == 3
+    assert len(list(iter_latest_pairs(store, 0, max_pairs_per_file=1))) == 2
+    assert [p["file"] for p in iter_latest_pairs(store, 0, languages={"python"})] == ["c.py"]
+
+
+def test_write_prompt_streams_examples(tmp_path: Path) -> None:
+    """Test prompt output contains the previous prompt and examples."""
+    store = FileStore(tmp_path)
+    record_analysis(store, 0, "a.swift", "swift", "a", "a", [CodePair(bad_code="var x", good_code="let x")])
+
+    out = io.StringIO()
+    count = write_prompt(out, "Base prompt", 0, store)
+
+    assert count == 1
+    assert out.getvalue().startswith("Base prompt\n\n# Examples from round 0:")
+    assert "// Bad Code\nvar x" in out.getvalue()
+
+
+def test_write_prompt_legacy_analysis_files(tmp_path: Path) -> None:
+    """Test workspaces without records fall back to analysis markdown."""
+    store = FileStore(tmp_path)
+    store.write("analysis/round_0", "a.swift", "legacy analysis")
+
+    out = io.StringIO()
+    count = write_prompt(out, "Base prompt", 0, store)
+
+    assert count == 1
+    assert "legacy analysis" in out.getvalue()
+
+
+def test_write_prompt_partly_migrated(tmp_path: Path) -> None:
+    """Test files without records contribute their analysis markdown next to recorded files."""
+    store = FileStore(tmp_path)
+    record_analysis(store, 0, "a.swift", "swift", "a", "a", [CodePair(bad_code="var x", good_code="let x")])
+    store.write("analysis/round_0", "a.swift", "markdown of a")
+    store.write("analysis/round_0", "b.swift", "legacy analysis of b")
+
+    out = io.StringIO()
+    count = write_prompt(out, "Base prompt", 0, store)
+
+    assert count == 2
+    assert "// Bad Code\nvar x" in out.getvalue()
+    assert "legacy analysis of b" in out.getvalue()
+    assert "markdown of a" not in out.getvalue()
+
+
+async def test_next_prompt_is_returned(tmp_path: Path) -> None:
+    """Test the next round's prompt is written and returned, and the current one is returned without analyses."""
+    store = FileStore(tmp_path)
+    store.write("prompts", "system_1.md", "Round one prompt")
+    record_analysis(store, 1, "a.swift", "swift", "a", "a", [CodePair(bad_code="var x", good_code="let x")])
+
+    prompt = await generate_system_prompt_from_analyses(1, tmp_path)
+
+    assert prompt == store.read("prompts", "system_2.md")
+    assert prompt.startswith("Round one prompt\n\n# Examples from round 1:")
+    assert await generate_system_prompt_from_analyses(2, tmp_path) == prompt
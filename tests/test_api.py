@@ -0,0 +1,145 @@
+"""Tests for the async library API."""
+
+import asyncio
+import contextlib
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from code_diff_doc_gen import llm, run_round
+from code_diff_doc_gen.budget import TokenPolicy
+from code_diff_doc_gen.config import config, state
+from code_diff_doc_gen.models import CodeAnalysisResult, CodePair, FileDescription, GeneratedCode
+from code_diff_doc_gen.response_cache import ResponseCache
+from code_diff_doc_gen.store import FileStore
+
+
+def fake_client(calls: List[str], slow: str = "", generate_tokens: int = 10) -> SimpleNamespace:
+    """Build an instructor-like client answering every stage, slowly for messages containing ``slow``."""
+
+    async def create_with_completion(response_model, messages, **kwargs):
+        text = messages[0]["content"][0]["text"]
+        calls.append(response_model.__name__)
+        if slow and slow in text:
+            await asyncio.sleep(10)
+        output_tokens = generate_tokens if response_model is GeneratedCode else 10
+        usage = SimpleNamespace(input_tokens=10, output_tokens=output_tokens, cache_creation_input_tokens=0, cache_read_input_tokens=0)
+        if response_model is FileDescription:
+            response = FileDescription(description=f"Build {text.strip()}")
+        elif response_model is GeneratedCode:
+            response = GeneratedCode(implementation="struct Generated {}\n")
+        else:
+            response = CodeAnalysisResult(pairs=[CodePair(bad_code="struct Generated {}", good_code="struct A {}")])
+        return response, SimpleNamespace(usage=usage)
+
+    return SimpleNamespace(messages=SimpleNamespace(create_with_completion=create_with_completion))
+
+
+@pytest.fixture(autouse=True)
+def plain_calls(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Make calls without streaming, plain-text output, routing or cost limit."""
+    for name, value in (("stream", False), ("raw_output", False), ("routing", False), ("max_cost", None)):
+        monkeypatch.setattr(config, name, value)
+    monkeypatch.setattr(state, "total_usage", dict(state.total_usage))
+    monkeypatch.setattr(llm, "get_key_pool", lambda: pytest.fail("a bound client must bypass the key pool"))
+
+
+async def test_round_streams_events(tmp_path: Path) -> None:
+    """Test every stage of every file is reported with its output, using the given client and cache."""
+    source_dir = tmp_path / "src"
+    source_dir.mkdir()
+    (source_dir / "a.swift").write_text("struct A {}\n")
+    (source_dir / "b.swift").write_text("struct A {}\n")
+    calls: List[str] = []
+    cache = ResponseCache()
+
+    events = [e async for e in run_round(source_dir, tmp_path / "ws", client=fake_client(calls), cache=cache)]
+
+    assert sorted((e.path, e.stage) for e in events) == [
+        (path, stage) for path in ("a.swift", "b.swift") for stage in ("analyze", "describe", "generate")
+    ]
+    by_stage = {(e.path, e.stage): e for e in events}
+    assert by_stage["a.swift", "describe"].output == "Build struct A {}"
+    assert by_stage["b.swift", "generate"].output == "struct Generated {}\n"
+    assert "struct Generated {}" in by_stage["a.swift", "analyze"].output
+    # Identical describe and analyze requests are answered once through the given cache
+    assert sorted(calls) == ["CodeAnalysisResult", "FileDescription", "GeneratedCode", "GeneratedCode"]
+    assert cache.hits == 2
+    assert llm._bound_client.get() is None
+    assert FileStore(tmp_path / "ws").read("prompts", "system_1.md")
+
+    # A second round over the same workspace skips the finished stages
+    again = [e async for e in run_round(source_dir, tmp_path / "ws", client=fake_client(calls), files=["a.swift"])]
+    assert [e.status for e in again if e.stage != "describe"] == ["skipped", "skipped"]
+
+
+async def test_deadlines_and_cancellation(tmp_path: Path) -> None:
+    """Test a file over its deadline fails alone and closing the iterator cancels calls in flight."""
+    source_dir = tmp_path / "src"
+    source_dir.mkdir()
+    (source_dir / "fast.swift").write_text("struct Fast {}\n")
+    (source_dir / "slow.swift").write_text("struct Slow {}\n")
+    calls: List[str] = []
+    client = fake_client(calls, slow="Slow")
+
+    events = [e async for e in run_round(source_dir, tmp_path / "ws", client=client, file_timeout=0.5)]
+    failed = [e for e in events if e.status == "error"]
+    assert [(e.path, e.stage) for e in failed] == [("slow.swift", "describe")]
+    assert "Deadline" in failed[0].error and failed[0].output is None
+    assert {e.stage for e in events if e.path == "fast.swift"} == {"describe", "generate", "analyze"}
+
+    # The slow file is still pending and its call is in flight when the iterator closes
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    async with contextlib.aclosing(run_round(source_dir, tmp_path / "ws", client=client)) as stream:
+        async for _ in stream:
+            break
+    assert loop.time() - start < 5
+    assert [t for t in asyncio.all_tasks() if t is not asyncio.current_task()] == []
+
+
+async def test_budget_exhausted_during_generate(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test hitting the cost limit partway through generation fails the remaining files and the round still finishes."""
+    source_dir = tmp_path / "src"
+    source_dir.mkdir()
+    for name in ("a", "b", "c"):
+        (source_dir / f"{name}.swift").write_text(f"struct {name.upper()} {{}}\n")
+    monkeypatch.setattr(config, "max_cost", 1.0)
+    monkeypatch.setattr(state, "total_usage", dict(state.total_usage, cost=0.0))
+    monkeypatch.setattr(state, "tokens", TokenPolicy())
+    calls: List[str] = []
+
+    # The first generation alone costs more than the limit
+    client = fake_client(calls, generate_tokens=1_000_000)
+    events = [e async for e in run_round(source_dir, tmp_path / "ws", client=client, concurrency=1)]
+
+    generated = [e for e in events if e.stage == "generate"]
+    assert sorted(e.status for e in generated) == ["error", "error", "generated"]
+    assert {e.status for e in events if e.stage == "describe"} == {"generated"}
+    assert calls.count("GeneratedCode") == 1
+    metadata = FileStore(tmp_path / "ws").read_meta("generated/round_0/metadata.json")
+    assert metadata["errors"] == 2 and metadata["newly_generated"] == 1
+
+
+async def test_single_file_skips_tree_scan(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test given files are processed without scanning the tree and missing files are rejected."""
+    from code_diff_doc_gen import api
+
+    source_dir = tmp_path / "src"
+    (source_dir / "nested").mkdir(parents=True)
+    (source_dir / "nested/one.swift").write_text("struct One {}\n")
+    (source_dir / "other.swift").write_text("struct Other {}\n")
+    monkeypatch.setattr(api, "scan_sources", lambda source_dir: pytest.fail("the tree must not be scanned"))
+    calls: List[str] = []
+
+    stream = run_round(source_dir, tmp_path / "ws", files=["nested/one.swift"], client=fake_client(calls), next_prompt=False)
+    events = [e async for e in stream]
+    assert {(e.path, e.status) for e in events} == {("nested/one.swift", "generated"), ("nested/one.swift", "analyzed")}
+    assert len(calls) == 3
+    assert FileStore(tmp_path / "ws").read("prompts", "system_1.md") is None
+
+    with pytest.raises(ValueError, match="not found"):
+        async for _ in run_round(source_dir, tmp_path / "ws", files=["missing.swift"], client=fake_client(calls)):
+            pass
@@ -0,0 +1,85 @@
+"""Tests for size-adaptive token budgets."""
+
+from types import SimpleNamespace
+
+import pytest
+from instructor.exceptions import IncompleteOutputException, InstructorRetryException
+
+from code_diff_doc_gen import llm
+from code_diff_doc_gen.budget import MIN_THINKING_BUDGET, TokenPolicy
+from code_diff_doc_gen.config import AppConfig, state
+from code_diff_doc_gen.models import FileDescription
+
+
+def test_plan_scales_with_source_size() -> None:
+    """Test small files get small budgets and large files hit the caps."""
+    cfg = AppConfig()
+    policy = TokenPolicy()
+
+    small_tokens, small_thinking = policy.plan("describe", 50, cfg)
+    assert small_thinking == MIN_THINKING_BUDGET
+    assert small_tokens == MIN_THINKING_BUDGET + cfg.stage_min_output["describe"]
+
+    large_tokens, large_thinking = policy.plan("generate", 50000, cfg)
+    assert large_thinking == cfg.thinking_budget
+    assert large_tokens == cfg.max_tokens
+    assert large_tokens > large_thinking
+
+
+def test_plan_uses_learned_ratios() -> None:
+    """Test ratios from earlier runs replace the defaults once enough exist."""
+    cfg = AppConfig()
+    policy = TokenPolicy(min_samples=3)
+    default_tokens, _ = policy.plan("generate", 4000, cfg)
+
+    records = [
+        {"stage": "generate", "source_tokens": 1000, "output_tokens": 1500, "max_tokens": 8000, "truncated": False}
+        for _ in range(3)
+    ]
+    records.append({"stage": "generate", "source_tokens": 10, "output_tokens": 9000, "max_tokens": 9000, "truncated": True})
+    assert policy.load(records) == 4
+    assert policy.learned_ratio("generate") == 1.5
+
+    learned_tokens, _ = policy.plan("generate", 4000, cfg)
+    assert learned_tokens == int(4000 * 1.5 * cfg.token_headroom)
+    assert learned_tokens < default_tokens
+
+
+def test_plan_disabled_uses_global_settings() -> None:
+    """Test the global settings are used when adaptive budgets are off."""
+    cfg = AppConfig(adaptive_tokens=False)
+    assert TokenPolicy().plan("describe", 10, cfg) == (cfg.max_tokens, cfg.thinking_budget)
+
+
+def test_escalate_is_capped() -> None:
+    """Test escalation doubles the cap up to the ceiling."""
+    cfg = AppConfig(max_output_tokens=30000)
+    assert TokenPolicy.escalate(8000, 2000, cfg) == (16000, 2000)
+    assert TokenPolicy.escalate(20000, 2000, cfg) == (30000, 2000)
+
+
+async def test_truncated_call_escalates(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a call that hits its output cap is retried with a larger cap."""
+    usage = SimpleNamespace(input_tokens=10, output_tokens=100, cache_creation_input_tokens=0, cache_read_input_tokens=0)
+    caps = []
+
+    async def create_with_completion(**kwargs):
+        caps.append(kwargs["max_tokens"])
+        if len(caps) == 1:
+            truncated = IncompleteOutputException(last_completion=SimpleNamespace(usage=usage))
+            raise InstructorRetryException(truncated, n_attempts=1, total_usage=0)
+        return FileDescription(description="ok"), SimpleNamespace(usage=usage)
+
+    client = SimpleNamespace(messages=SimpleNamespace(create_with_completion=create_with_completion))
+    monkeypatch.setattr(llm, "get_client", lambda endpoint=None: client)
+    monkeypatch.setattr(state, "tokens", TokenPolicy())
+    monkeypatch.setattr(state, "keys", {})
+
+    result = await llm.call_anthropic_model("system", "x" * 40, FileDescription, stage="describe")
+
+    assert result.description == "ok"
+    assert caps[1] == caps[0] * 2
+    assert [o["truncated"] for o in state.tokens.new_observations] == [True, False]
+    # The truncated call's tokens count toward the key that served it
+    (key_usage,) = state.keys.values()
+    assert key_usage["calls"] == 2 and key_usage["output_tokens"] == 200
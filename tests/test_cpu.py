@@ -0,0 +1,95 @@
+"""Tests for the process pool for CPU-bound work."""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from code_diff_doc_gen import cpu, diff, generator, llm
+from code_diff_doc_gen.analyses import hash_analysis, iter_latest_pairs
+from code_diff_doc_gen.config import config
+from code_diff_doc_gen.models import CodeAnalysisResult, CodePair, FileDescription, GeneratedCode
+from code_diff_doc_gen.routing import score_complexity
+from code_diff_doc_gen.store import FileStore
+
+
+@pytest.fixture
+def pool(monkeypatch: pytest.MonkeyPatch):
+    """Run with a two-process pool and fresh statistics."""
+    monkeypatch.setattr(config, "cpu_workers", 2)
+    monkeypatch.setattr(cpu, "stats", cpu.PoolStats())
+    yield cpu.stats
+    cpu.shutdown_cpu_executor()
+
+
+async def test_concurrent_calls_share_chunks(pool: cpu.PoolStats) -> None:
+    """Test calls made together reach the pool as one chunk and keep their own results and errors."""
+    sources = [f"def f{i}(x):\n" + "    if x:\n        return x\n" * i + "    return 0\n" for i in range(10)]
+    results = await asyncio.gather(*(cpu.run_cpu(score_complexity, source, ".py") for source in sources))
+    assert [r.branches for r in results] == list(range(10))
+    assert pool.calls == 10 and pool.chunks == 1
+
+    with pytest.raises(TypeError):
+        await cpu.run_cpu(score_complexity, None, ".py")
+    assert (await cpu.run_cpu(score_complexity, "x = 1\n", ".py")).branches == 0
+
+
+async def test_map_cpu_chunks_in_order(pool: cpu.PoolStats, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test batch calls are chunked, return in input order, and run on threads without a pool."""
+    items = [(f"if a {'and b ' * i}:\n    pass\n", ".py") for i in range(7)]
+    expected = [1 + i for i in range(7)]
+    assert [c.branches for c in await cpu.map_cpu(score_complexity, items, chunk_size=3)] == expected
+    assert pool.chunks == 3
+
+    monkeypatch.setattr(config, "cpu_workers", 0)
+    assert [c.branches for c in await cpu.map_cpu(score_complexity, items)] == expected
+    assert pool.chunks == 3
+
+
+async def test_stages_score_complexity_on_pool(pool: cpu.PoolStats, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the describe and generate stages parse sources for routing on the process pool."""
+    source = tmp_path / "a.py"
+    source.write_text("def f(x):\n    if x:\n        return x\n    return 0\n")
+    store = FileStore(tmp_path / "ws")
+    store.write("descriptions", "a.py", "# Task: f")
+    monkeypatch.setattr(config, "routing", True)
+    monkeypatch.setattr(config, "stream", False)
+    branches = []
+
+    async def call_anthropic_model(response_model, complexity=None, **kwargs):
+        branches.append(complexity.branches)
+        return FileDescription(description="d")
+
+    async def generate_code_from_description(description, path, prompt, partial, source_chars, complexity):
+        branches.append(complexity.branches)
+        return GeneratedCode(implementation="def f(x): ...\n")
+
+    monkeypatch.setattr(llm, "call_anthropic_model", call_anthropic_model)
+    monkeypatch.setattr(generator, "generate_code_from_description", generate_code_from_description)
+
+    await llm.generate_file_description(source.read_text(), source)
+    result = await generator.generate_file(source, 0, "prompt", store, tmp_path)
+
+    assert result.status == "generated"
+    assert branches == [1, 1]
+    assert pool.calls == 2
+
+
+async def test_analysis_hashing_on_pool(pool: cpu.PoolStats, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the analyze stage hashes contents on the process pool and records the same hashes as before."""
+    source = tmp_path / "a.swift"
+    source.write_text("let x = 1\n")
+    store = FileStore(tmp_path / "ws")
+    store.write("generated/round_0", "a.swift", "var x = 1\n")
+    pairs = [CodePair(bad_code="var x = 1", good_code="let x = 1")]
+
+    async def analyze_code_differences(original, generated):
+        return CodeAnalysisResult(pairs=pairs)
+
+    monkeypatch.setattr(diff, "analyze_code_differences", analyze_code_differences)
+
+    result = await diff._compare_single_file(source, Path("a.swift"), 0, store)
+
+    assert result.pairs == 1 and pool.calls == 1
+    (record,) = iter_latest_pairs(store, 0)
+    assert record["pair_hash"] == hash_analysis("let x = 1\n", "var x = 1\n", [("var x = 1", "let x = 1")])[2][0]
@@ -0,0 +1,112 @@
+"""Tests for latency tracking and request hedging."""
+
+import asyncio
+
+import pytest
+
+from code_diff_doc_gen.hedging import HedgeStats, LatencyTracker, hedged_call, size_class
+
+
+def test_latency_tracker_percentile_requires_samples() -> None:
+    """Test percentiles are only reported once enough samples exist."""
+    tracker = LatencyTracker(window=100, min_samples=10)
+    for i in range(9):
+        tracker.observe("generate", 3, float(i))
+    assert tracker.percentile("generate", 3, 0.95) is None
+
+    tracker.observe("generate", 3, 9.0)
+    assert tracker.percentile("generate", 3, 0.95) == 9.0
+    assert tracker.percentile("generate", 3, 0.5) == 5.0
+    assert tracker.percentile("describe", 3, 0.95) is None
+
+
+def test_size_class_buckets() -> None:
+    """Test prompt sizes map to power-of-two classes."""
+    assert size_class(0) == 0
+    assert size_class(4400) == size_class(5000)
+    assert size_class(40000) > size_class(4000)
+
+
+async def test_fast_call_is_not_hedged() -> None:
+    """Test a call finishing before the delay issues no hedge."""
+    stats = HedgeStats()
+    calls = []
+
+    async def make_call():
+        calls.append(1)
+        return "ok"
+
+    result, hedged = await hedged_call(make_call, 0.5, stats, max_rate=1.0)
+    assert (result, hedged) == ("ok", False)
+    assert len(calls) == 1
+    assert stats.hedged == 0
+
+
+async def test_slow_call_is_hedged_and_loser_cancelled() -> None:
+    """Test a stalled primary is hedged and cancelled once the hedge wins."""
+    stats = HedgeStats()
+    cancelled = asyncio.Event()
+    attempts = 0
+
+    async def make_call():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "primary"
+        return "hedge"
+
+    result, hedged = await hedged_call(make_call, 0.01, stats, max_rate=1.0)
+    await asyncio.wait_for(cancelled.wait(), 1)
+    assert (result, hedged) == ("hedge", True)
+    assert stats.hedged == 1
+    assert stats.hedge_wins == 1
+
+
+async def test_hedge_rate_is_capped() -> None:
+    """Test no hedge is issued once the rate cap is reached."""
+    stats = HedgeStats(calls=9, hedged=1)
+    attempts = 0
+
+    async def make_call():
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    result, hedged = await hedged_call(make_call, 0.01, stats, max_rate=0.1)
+    assert (result, hedged) == ("ok", False)
+    assert attempts == 1
+
+
+async def test_failed_primary_falls_back_to_hedge() -> None:
+    """Test an error from one request does not fail a hedged call."""
+    stats = HedgeStats()
+    attempts = 0
+
+    async def make_call():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            await asyncio.sleep(0.05)
+            raise RuntimeError("boom")
+        await asyncio.sleep(0.1)
+        return "hedge"
+
+    result, hedged = await hedged_call(make_call, 0.01, stats, max_rate=1.0)
+    assert (result, hedged) == ("hedge", True)
+
+
+async def test_all_requests_failing_raises() -> None:
+    """Test the error propagates when every request fails."""
+
+    async def make_call():
+        await asyncio.sleep(0.02)
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await hedged_call(make_call, 0.01, HedgeStats(), max_rate=1.0)
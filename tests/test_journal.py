@@ -0,0 +1,76 @@
+"""Tests for the run journal and atomic file writes."""
+
+from pathlib import Path
+
+from code_diff_doc_gen.fileio import atomic_write_text
+from code_diff_doc_gen.journal import Journal
+from code_diff_doc_gen.store import FileStore
+
+
+def test_atomic_write_text(tmp_path: Path) -> None:
+    """Test atomic writes create parents and leave no temp files."""
+    target = tmp_path / "nested" / "file.swift.desc"
+
+    atomic_write_text(target, "first")
+    atomic_write_text(target, "second")
+
+    assert target.read_text() == "second"
+    assert [p.name for p in target.parent.iterdir()] == ["file.swift.desc"]
+
+
+def test_journal_replay(tmp_path: Path) -> None:
+    """Test journal replay reconstructs plans and completions."""
+    journal = Journal(FileStore(tmp_path))
+    journal.record_plan(0, ["a.swift", "b.swift", "c.swift"])
+    journal.record("describe", "a.swift")
+    journal.record("describe", "b.swift")
+    journal.record("generate", "a.swift", 0)
+
+    state = journal.load()
+
+    assert state.plans[0] == ["a.swift", "b.swift", "c.swift"]
+    assert ("describe", None, "a.swift") in state.done
+    assert state.pending("generate", 1, ["a.swift"]) == ["a.swift"]
+    assert state.pending("describe", None, state.plans[0]) == ["c.swift"]
+    assert state.pending("generate", 0, state.plans[0]) == ["b.swift", "c.swift"]
+
+
+def test_journal_scopes_completions_to_plan(tmp_path: Path) -> None:
+    """Test a new plan discards completions of earlier runs and their entries."""
+    store = FileStore(tmp_path)
+    journal = Journal(store)
+    journal.record_plan(0, ["a.swift", "b.swift"])
+    journal.record("describe", "a.swift")
+    journal.record("generate", "a.swift", 0)
+    journal.record_plan(0, ["a.swift", "b.swift"])
+    journal.record("describe", "b.swift")
+
+    state = journal.load()
+
+    assert state.pending("describe", None, state.plans[0]) == ["a.swift"]
+    assert state.pending("generate", 0, state.plans[0]) == ["a.swift", "b.swift"]
+    assert len(list(store.iter_records("journal"))) == 2
+
+    # Journals written before plans started a new log are scoped the same way
+    store.append_record("journal", {"event": "plan", "round": 1, "files": ["a.swift"]})
+    assert journal.load().done == set()
+
+
+def test_journal_ignores_torn_line(tmp_path: Path) -> None:
+    """Test a truncated final line from a crash is ignored."""
+    journal = Journal(FileStore(tmp_path))
+    journal.record("describe", "a.swift")
+    with open(tmp_path / "journal.jsonl", "a") as f:
+        f.write('{"event":"done","stage":"desc')
+
+    state = journal.load()
+
+    assert state.done == {("describe", None, "a.swift")}
+
+
+def test_journal_missing(tmp_path: Path) -> None:
+    """Test loading a journal that does not exist yet."""
+    state = Journal(FileStore(tmp_path)).load()
+
+    assert state.plans == {}
+    assert state.done == set()
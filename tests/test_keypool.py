@@ -0,0 +1,99 @@
+"""Tests for the API key pool and dispatch over several endpoints."""
+
+import time
+
+import httpx
+import pytest
+
+from code_diff_doc_gen import llm
+from code_diff_doc_gen.config import config, state
+from code_diff_doc_gen.keypool import KeyPool, parse_endpoints
+from code_diff_doc_gen.models import FileDescription
+
+
+def test_parse_endpoints() -> None:
+    """Test keys with and without base URLs and the single-key default."""
+    endpoints = parse_endpoints(["sk-one-1111", " sk-two-2222@http://localhost:8080 ", ""])
+    assert [(e.name, e.api_key, e.base_url) for e in endpoints] == [
+        ("...1111", "sk-one-1111", None),
+        ("...2222@localhost:8080", "sk-two-2222", "http://localhost:8080"),
+    ]
+    assert [(e.name, e.api_key) for e in parse_endpoints([], "sk-env")] == [("default", "sk-env")]
+    with pytest.raises(ValueError):
+        parse_endpoints(["sk-dup", "sk-dup@http://localhost"])
+
+
+async def test_least_loaded_dispatch_and_cooldown() -> None:
+    """Test calls spread over keys and throttled keys are skipped until they recover."""
+    pool = KeyPool(parse_endpoints(["sk-a-aaaa", "sk-b-bbbb"]), cooldown=30.0)
+
+    first = await pool.acquire()
+    second = await pool.acquire()
+    assert {first.name, second.name} == {"...aaaa", "...bbbb"}
+    pool.release(first)
+    assert (await pool.acquire()) == first
+
+    pool.observe("sk-b-bbbb", 429, {"retry-after": "0.05"})
+    assert pool.stats["...bbbb"].throttled == 1
+    assert pool.pick() == first
+
+    # A key whose request window is used up rests until the window resets
+    reset = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(time.time() + 120))
+    pool.observe("sk-a-aaaa", 200, {"anthropic-ratelimit-requests-remaining": "0", "anthropic-ratelimit-requests-reset": reset})
+    assert pool.stats["...aaaa"].requests_remaining == 0
+
+    # With every key cooling down, acquire waits for the earliest to recover
+    start = time.monotonic()
+    assert (await pool.acquire()) == second
+    assert time.monotonic() - start >= 0.03
+
+
+async def test_throttled_call_moves_to_another_key(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a call throttled on one fake endpoint is served by the other."""
+    hosts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hosts.append(request.url.host)
+        if request.url.host == "throttled.test":
+            return httpx.Response(
+                429,
+                headers={"retry-after": "60"},
+                json={"type": "error", "error": {"type": "rate_limit_error", "message": "slow down"}},
+            )
+        return httpx.Response(
+            200,
+            headers={"anthropic-ratelimit-requests-remaining": "99"},
+            json={
+                "id": "msg_1",
+                "type": "message",
+                "role": "assistant",
+                "model": config.model,
+                "content": [
+                    {"type": "tool_use", "id": "tool_1", "name": "FileDescription", "input": {"description": "ok"}}
+                ],
+                "stop_reason": "tool_use",
+                "stop_sequence": None,
+                "usage": {"input_tokens": 10, "output_tokens": 5},
+            },
+        )
+
+    monkeypatch.setattr(config, "endpoints", ("sk-slow-aaaa@http://throttled.test", "sk-fast-bbbb@http://healthy.test"))
+    monkeypatch.setattr(config, "hedge", False)
+    monkeypatch.setattr(config, "stream", False)
+    monkeypatch.setattr(llm, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(llm, "_clients", {})
+    monkeypatch.setattr(llm, "_key_pool", None)
+    monkeypatch.setattr(state, "keys", {})
+
+    result = await llm.call_anthropic_model("system", "describe this", FileDescription, stage="describe")
+    assert result.description == "ok"
+
+    pool = llm.get_key_pool()
+    assert hosts == ["throttled.test", "healthy.test"]
+    assert pool.stats["...aaaa@throttled.test"].throttled == 1
+    assert pool.stats["...bbbb@healthy.test"].requests_remaining == 99
+    assert state.keys["...bbbb@healthy.test"]["calls"] == 1
+
+    # The throttled key stays out of rotation during its cooldown
+    await llm.call_anthropic_model("system", "describe that", FileDescription, stage="describe")
+    assert hosts[-1] == "healthy.test" and hosts.count("throttled.test") == 1
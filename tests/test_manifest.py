@@ -0,0 +1,73 @@
+"""Tests for the source manifest."""
+
+import os
+from pathlib import Path
+
+from code_diff_doc_gen.manifest import is_up_to_date, load_manifest, save_manifest, scan_sources
+from code_diff_doc_gen.processor import discover_source_files
+from code_diff_doc_gen.store import FileStore
+
+
+def _make_sources(root: Path) -> Path:
+    source_dir = root / "src"
+    (source_dir / "Views").mkdir(parents=True)
+    (source_dir / "App.swift").write_text("struct App {}")
+    (source_dir / "Views" / "Counter.swift").write_text("struct Counter {}")
+    (source_dir / ".hidden").write_text("ignored")
+    return source_dir
+
+
+def test_scan_sources(tmp_path: Path) -> None:
+    """Test scanning finds nested non-hidden files."""
+    source_dir = _make_sources(tmp_path)
+
+    files = scan_sources(source_dir)
+
+    assert sorted(files) == ["App.swift", "Views/Counter.swift"]
+    assert files["App.swift"][0] == len("struct App {}")
+
+
+def test_scan_sources_matches_rglob_on_symlinks(tmp_path: Path) -> None:
+    """Test symlinked files are listed and symlinked directories, even cyclic ones, are not followed."""
+    source_dir = _make_sources(tmp_path)
+    (source_dir / "Link.swift").symlink_to(source_dir / "App.swift")
+    (source_dir / "Views" / "Loop").symlink_to(source_dir, target_is_directory=True)
+
+    files = scan_sources(source_dir)
+
+    assert sorted(files) == ["App.swift", "Link.swift", "Views/Counter.swift"]
+    assert sorted(files) == sorted(p.relative_to(source_dir).as_posix() for p in discover_source_files(source_dir))
+
+
+def test_manifest_up_to_date(tmp_path: Path) -> None:
+    """Test a completed round is up to date until a source changes."""
+    source_dir = _make_sources(tmp_path)
+    store = FileStore(tmp_path / ".codediff")
+
+    assert not is_up_to_date(load_manifest(store), source_dir, 0, scan_sources(source_dir))
+
+    save_manifest(store, source_dir, 0, scan_sources(source_dir))
+    manifest = load_manifest(store)
+    assert is_up_to_date(manifest, source_dir, 0, scan_sources(source_dir))
+    assert not is_up_to_date(manifest, source_dir, 1, scan_sources(source_dir))
+
+    counter = source_dir / "Views" / "Counter.swift"
+    stat = counter.stat()
+    os.utime(counter, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert not is_up_to_date(manifest, source_dir, 0, scan_sources(source_dir))
+
+
+def test_manifest_keeps_rounds_for_unchanged_tree(tmp_path: Path) -> None:
+    """Test completed rounds accumulate only while sources are unchanged."""
+    source_dir = _make_sources(tmp_path)
+    store = FileStore(tmp_path / ".codediff")
+    files = scan_sources(source_dir)
+
+    save_manifest(store, source_dir, 0, files)
+    save_manifest(store, source_dir, 1, files, load_manifest(store))
+    assert load_manifest(store)["rounds"] == [0, 1]
+
+    (source_dir / "New.swift").write_text("struct New {}")
+    files = scan_sources(source_dir)
+    save_manifest(store, source_dir, 1, files, load_manifest(store))
+    assert load_manifest(store)["rounds"] == [1]
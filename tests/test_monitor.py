@@ -0,0 +1,33 @@
+"""Tests for event loop monitoring and non-blocking file I/O."""
+
+import asyncio
+import threading
+import time
+from pathlib import Path
+
+from code_diff_doc_gen.fileio import run_io
+from code_diff_doc_gen.monitor import LoopLagMonitor
+
+
+async def test_loop_lag_monitor_reports_stall() -> None:
+    """Test a blocking call on the loop is reported as a stall."""
+    async with LoopLagMonitor(interval=0.01, threshold=0.05) as monitor:
+        await asyncio.sleep(0.03)
+        time.sleep(0.1)
+        await asyncio.sleep(0.03)
+
+    summary = monitor.summary()
+    assert summary["stalls"] >= 1
+    assert summary["max_lag_ms"] >= 50
+
+
+async def test_run_io_uses_worker_thread(tmp_path: Path) -> None:
+    """Test blocking I/O runs off the event loop thread."""
+    target = tmp_path / "file.txt"
+    target.write_text("content")
+
+    thread_name = await run_io(lambda: threading.current_thread().name)
+    content = await run_io(target.read_text, encoding="utf-8")
+
+    assert thread_name.startswith("codediff-io")
+    assert content == "content"
@@ -0,0 +1,65 @@
+"""Tests for dry-run planning of a round."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from code_diff_doc_gen.budget import TokenPolicy
+from code_diff_doc_gen.config import AppConfig, config
+from code_diff_doc_gen.manifest import scan_sources
+from code_diff_doc_gen.planner import pending_calls, plan_round, project_wall_time
+from code_diff_doc_gen.scheduler import CostModel
+from code_diff_doc_gen.store import FileStore
+
+
+async def test_plan_applies_freshness_checks(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test only stale stages and everything downstream of them are planned and priced."""
+    monkeypatch.setattr(config, "cpu_workers", 0)
+    source_dir = tmp_path / "src"
+    source_dir.mkdir()
+    for name in ("done.swift", "edited.swift", "new.swift", "stale.swift"):
+        (source_dir / name).write_text("struct A {}\n" * 100)
+    store = FileStore(tmp_path / "ws")
+    for name in ("done.swift", "edited.swift", "stale.swift"):
+        store.write("descriptions", name, "# Task: A\n")
+        store.write("generated/round_0", name, "struct A {}\n")
+        store.write("analysis/round_0", name, "{}")
+    os.utime(source_dir / "edited.swift", (2e9, 2e9))
+    # A generation older than its description is redone, and so is its analysis
+    old = os.stat(source_dir / "done.swift").st_mtime - 10
+    os.utime(store.workspace_dir / "generated/round_0/stale.swift", (old, old))
+
+    sources = scan_sources(source_dir)
+    pending = pending_calls(source_dir, 0, store, sources)
+    assert pending == {
+        "describe": ["edited.swift", "new.swift"],
+        "generate": ["edited.swift", "new.swift", "stale.swift"],
+        "analyze": ["edited.swift", "new.swift", "stale.swift"],
+    }
+    assert all(len(keys) == 4 for keys in pending_calls(source_dir, 0, None, sources).values())
+
+    app_config = AppConfig()
+    costs = CostModel({key: size for key, (size, _) in sources.items()})
+    plan = await plan_round(source_dir, 0, store, sources, costs, TokenPolicy(), app_config)
+    assert [plan.stages[s].calls for s in ("describe", "generate", "analyze")] == [2, 3, 3]
+    assert plan.stages["generate"].up_to_date == 1 and plan.calls == 8
+    assert len(plan.chains) == 3 and plan.cost > 0
+
+    # Routing small files to the fast model makes the same calls cheaper
+    app_config.routing = True
+    routed = await plan_round(source_dir, 0, store, sources, CostModel(), TokenPolicy(), app_config)
+    assert routed.calls == plan.calls and routed.cost < plan.cost
+    assert routed.stages["describe"].models == {app_config.fast_model: 2}
+
+
+def test_wall_time_projection() -> None:
+    """Test stage-by-stage runs wait for each stage's slowest file and pipelines overlap stages."""
+    chains = [[("describe", 1.0), ("generate", 10.0)], [("describe", 10.0), ("generate", 1.0)]]
+
+    wall, per_stage = project_wall_time(chains, 2, pipelined=False)
+    assert per_stage == {"describe": 10.0, "generate": 10.0, "analyze": 0.0}
+    assert wall == 20.0
+    assert project_wall_time(chains, 2, pipelined=True) == (11.0, {})
+    # One worker runs everything in sequence
+    assert project_wall_time(chains, 1, pipelined=True)[0] == 22.0
@@ -0,0 +1,61 @@
+"""Tests for per-stage profiling."""
+
+import asyncio
+import json
+import pstats
+import time
+from pathlib import Path
+
+from code_diff_doc_gen.fileio import run_io
+from code_diff_doc_gen.profiling import PROFILE_DIR, STACKS_FILE, TASKS_FILE, Profiler
+
+
+def spin(seconds: float) -> None:
+    """Keep the current thread busy."""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def busy_task() -> None:
+    """Hold the event loop, then wait on a thread."""
+    spin(0.05)
+    await run_io(spin, 0.05)
+
+
+async def test_stage_profiles(tmp_path: Path) -> None:
+    """Test each stage gets a deterministic profile, sampled stacks and task timings."""
+    profiler = Profiler(interval=0.001)
+    with profiler.stage("first"):
+        await asyncio.gather(*(asyncio.create_task(busy_task()) for _ in range(2)))
+    with profiler.stage("second"):
+        spin(0.02)
+    (tmp_path / PROFILE_DIR).mkdir()
+    (tmp_path / PROFILE_DIR / "old.prof").write_bytes(b"")
+
+    profile_dir = await run_io(profiler.save, tmp_path)
+
+    assert sorted(p.name for p in profile_dir.glob("*.prof")) == ["first.prof", "second.prof"]
+    stats = pstats.Stats(str(profile_dir / "first.prof"))
+    assert any(func[2] == "spin" for func in stats.stats)
+
+    tasks = json.loads((profile_dir / TASKS_FILE).read_text())
+    timing = tasks["first"]["tasks"]["busy_task"]
+    assert timing["tasks"] == 2 and timing["busy_seconds"] >= 0.09
+    assert timing["max_wall_seconds"] >= 0.1 and tasks["second"]["tasks"] == {}
+
+    lines = (profile_dir / STACKS_FILE).read_text().splitlines()
+    stages = {line.split(";")[0] for line in lines}
+    assert stages == {"first", "second"}
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    # Work on the I/O pool is sampled with the thread it ran on
+    assert any("spin (test_profiling.py)" in line and ";MainThread;" not in line for line in lines)
+
+
+def test_disabled_profiler_writes_nothing(tmp_path: Path) -> None:
+    """Test a disabled profiler measures and writes nothing."""
+    profiler = Profiler(enabled=False)
+    with profiler.stage("discover"):
+        spin(0.001)
+    assert profiler.save(tmp_path) is None
+    assert not (tmp_path / PROFILE_DIR).exists()
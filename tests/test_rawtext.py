@@ -0,0 +1,80 @@
+"""Tests for plain-text responses with fenced code blocks."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from code_diff_doc_gen import llm
+from code_diff_doc_gen.config import config, state
+from code_diff_doc_gen.models import GeneratedCode
+from code_diff_doc_gen.rawtext import RawFormatError, parse_code_pairs, parse_fenced_blocks, parse_generated_code
+
+
+def test_fenced_blocks_keep_code_verbatim() -> None:
+    """Test code is returned unescaped and shorter inner fences do not close a block."""
+    text = (
+        "Overview of the approach.\n\n"
+        "````swift\n"
+        'let path = "C:\\\\temp\\n"\n'
+        "let doc = \"\"\"\n```\nnot a fence\n```\n\"\"\"\n"
+        "````\n"
+    )
+    blocks = parse_fenced_blocks(text)
+    assert blocks == [("swift", 'let path = "C:\\\\temp\\n"\nlet doc = """\n```\nnot a fence\n```\n"""')]
+    assert parse_generated_code(text).implementation == blocks[0][1]
+
+    with pytest.raises(RawFormatError):
+        parse_fenced_blocks("```swift\nstruct A {}\n")
+    with pytest.raises(RawFormatError):
+        parse_generated_code("I could not generate this file.")
+
+
+def test_code_pairs() -> None:
+    """Test bad/good block pairs, the empty answer and malformed pairs."""
+    result = parse_code_pairs("```bad swift\nold()\n```\n```good\nnew()\n```\n")
+    assert [(p.bad_code, p.good_code) for p in result.pairs] == [("old()", "new()")]
+    assert parse_code_pairs("NONE").pairs == []
+
+    with pytest.raises(RawFormatError):
+        parse_code_pairs("```good\nnew()\n```\n```bad\nold()\n```\n")
+    with pytest.raises(RawFormatError):
+        parse_code_pairs("```bad\nold()\n```\n")
+
+
+def _usage() -> SimpleNamespace:
+    return SimpleNamespace(input_tokens=10, output_tokens=10, cache_creation_input_tokens=0, cache_read_input_tokens=0)
+
+
+async def test_unparseable_text_falls_back_to_structured(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test plain-text output is used when it parses and repeated as a tool call when it does not."""
+    replies = ["```swift\nstruct A {}\n```", "Sorry, no code."]
+    structured = []
+
+    async def create(**kwargs):
+        assert "tools" not in kwargs and "fenced code block" in kwargs["system"][-1]["text"]
+        text = replies.pop(0)
+        return SimpleNamespace(
+            content=[SimpleNamespace(type="text", text=text)], stop_reason="end_turn", usage=_usage()
+        )
+
+    async def create_with_completion(**kwargs):
+        structured.append(kwargs)
+        return GeneratedCode(implementation="struct B {}"), SimpleNamespace(usage=_usage())
+
+    client = SimpleNamespace(
+        client=SimpleNamespace(beta=SimpleNamespace(messages=SimpleNamespace(create=create))),
+        messages=SimpleNamespace(create_with_completion=create_with_completion),
+    )
+    monkeypatch.setattr(llm, "get_client", lambda endpoint=None: client)
+    monkeypatch.setattr(config, "raw_output", True)
+    monkeypatch.setattr(config, "stream", False)
+    monkeypatch.setattr(state, "raw_output", {"calls": 0, "fallbacks": 0})
+
+    first = await llm.generate_code_from_description("A struct", "A.swift")
+    second = await llm.generate_code_from_description("B struct", "B.swift")
+
+    assert first.implementation == "struct A {}"
+    assert second.implementation == "struct B {}"
+    assert len(structured) == 1
+    assert state.raw_output == {"calls": 1, "fallbacks": 1}
+
@@ -0,0 +1,125 @@
+"""Tests for multi-repository runs and the shared response cache."""
+
+import asyncio
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from code_diff_doc_gen import llm, pipeline
+from code_diff_doc_gen.budget import BudgetExceededError
+from code_diff_doc_gen.config import config, state
+from code_diff_doc_gen.models import FileDescription
+from code_diff_doc_gen.pipeline import PipelineJob
+from code_diff_doc_gen.repos import assign_workspaces, load_repo_list
+from code_diff_doc_gen.response_cache import ResponseCache
+from code_diff_doc_gen.scheduler import CostModel
+from code_diff_doc_gen.store import FileStore
+
+
+def test_repo_list_and_workspaces(tmp_path: Path) -> None:
+    """Test list files resolve relative paths and repeated names get distinct workspaces."""
+    repo_list = tmp_path / "repos.txt"
+    repo_list.write_text("# services\napi\n\nteam/api\nweb  frontend\n")
+    repos = load_repo_list(repo_list)
+    assert repos == [(tmp_path / "api", None), (tmp_path / "team/api", None), (tmp_path / "web", "frontend")]
+
+    workspaces = assign_workspaces(repos, tmp_path / "out")
+    assert [w.name for _, w in workspaces] == ["api", "api-2", "frontend"]
+
+    with pytest.raises(ValueError):
+        assign_workspaces([(tmp_path / "api", None), (tmp_path / "api", None)], tmp_path / "out")
+    with pytest.raises(ValueError):
+        repo_list.write_text("api one two\n")
+        load_repo_list(repo_list)
+
+
+async def test_response_cache_single_flight() -> None:
+    """Test concurrent identical calls are made once and failures are not cached."""
+    cache = ResponseCache()
+    calls: List[str] = []
+
+    async def call() -> FileDescription:
+        calls.append("call")
+        await asyncio.sleep(0.01)
+        return FileDescription(description="shared")
+
+    results = await asyncio.gather(*(cache.get("key", call) for _ in range(3)))
+    assert [r.description for r in results] == ["shared"] * 3
+    assert results[0] is not results[1]
+    assert len(calls) == 1 and cache.hits == 2
+
+    async def fail() -> FileDescription:
+        calls.append("fail")
+        raise RuntimeError("boom")
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await cache.get("other", fail)
+    assert calls.count("fail") == 2
+
+
+async def test_identical_files_share_calls(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test identical requests from different trees reach the model once and the cost limit stops new calls."""
+    calls: List[str] = []
+
+    async def create_with_completion(**kwargs):
+        calls.append(kwargs["messages"][0]["content"][0]["text"])
+        usage = SimpleNamespace(input_tokens=1000, output_tokens=1000, cache_creation_input_tokens=0, cache_read_input_tokens=0)
+        return FileDescription(description="a task"), SimpleNamespace(usage=usage)
+
+    client = SimpleNamespace(messages=SimpleNamespace(create_with_completion=create_with_completion))
+    monkeypatch.setattr(llm, "get_client", lambda endpoint=None: client)
+    monkeypatch.setattr(llm, "_response_cache", None)
+    monkeypatch.setattr(config, "stream", False)
+    monkeypatch.setattr(config, "raw_output", False)
+    monkeypatch.setattr(config, "max_cost", 0.01)
+    monkeypatch.setattr(state, "total_usage", {**state.total_usage, "cost": 0.0})
+
+    first, second = await asyncio.gather(
+        llm.generate_file_description("struct Shared {}", "a/Shared.swift"),
+        llm.generate_file_description("struct Shared {}", "b/Shared.swift"),
+    )
+    assert first.description == second.description == "a task"
+    assert calls == ["struct Shared {}"]
+
+    # The first call spent the limit, so only cached answers remain
+    with pytest.raises(BudgetExceededError):
+        await llm.generate_file_description("struct Other {}", "a/Other.swift")
+    assert (await llm.generate_file_description("struct Shared {}", "c/Shared.swift")).description == "a task"
+
+
+async def test_pipelines_share_workers(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test files of several trees are scheduled together by critical path."""
+    order: List[str] = []
+
+    async def run_file_stage(stage, path, source_dir, *args):
+        order.append(f"{stage}:{source_dir.name}/{path.name}")
+        return "generated" if stage != "analyze" else "analyzed"
+
+    monkeypatch.setattr(pipeline, "run_file_stage", run_file_stage)
+    monkeypatch.setattr(config, "max_concurrency", 1)
+
+    jobs = []
+    for name, sizes in (("small", {"a.swift": 100}), ("large", {"b.swift": 100000, "c.swift": 10})):
+        source_dir = tmp_path / name
+        files = [source_dir / key for key in sizes]
+        jobs.append(
+            PipelineJob(
+                source_dir,
+                0,
+                tmp_path / "ws" / name,
+                {"describe": files, "generate": files, "analyze": files},
+                FileStore(tmp_path / "ws" / name),
+                costs=CostModel(sizes),
+            )
+        )
+
+    counts = await pipeline.run_pipelines(jobs)
+
+    assert order[:3] == ["describe:large/b.swift", "generate:large/b.swift", "analyze:large/b.swift"]
+    # The small tree's file outranks the large tree's smaller file
+    assert order[3] == "describe:small/a.swift"
+    assert order.index("describe:small/a.swift") < order.index("describe:large/c.swift")
+    assert [c["analyze"]["analyzed"] for c in counts] == [1, 2]
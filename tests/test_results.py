@@ -0,0 +1,35 @@
+"""Tests for compact stage result records."""
+
+from pathlib import Path
+
+import pytest
+
+from code_diff_doc_gen.results import FileResult, StatusCounts
+from code_diff_doc_gen.store import FileStore
+
+
+def test_file_result_reads_lazily(tmp_path: Path) -> None:
+    """Test results load artifact content from the store on demand."""
+    store = FileStore(tmp_path)
+    store.write("generated/round_0", "a.swift", "struct A {}")
+
+    result = FileResult("src/a.swift", "a.swift", "generated", "generated/round_0")
+    failed = FileResult("src/b.swift", "b.swift", "error", error="boom")
+
+    assert not hasattr(result, "__dict__")
+    assert result.read(store) == "struct A {}"
+    assert failed.read(store) is None
+
+
+def test_status_counts() -> None:
+    """Test counting results by status."""
+    counts = StatusCounts(["generated", "skipped", "generated"])
+    counts.add("error")
+
+    assert counts["generated"] == 2
+    assert counts["analyzed"] == 0
+    assert counts.total == 4
+    assert counts.as_dict() == {"generated": 2, "analyzed": 0, "skipped": 1, "error": 1}
+
+    with pytest.raises(ValueError):
+        counts.add("unknown")
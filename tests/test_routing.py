@@ -0,0 +1,85 @@
+"""Tests for model routing and per-model pricing."""
+
+from types import SimpleNamespace
+
+import pytest
+from instructor.exceptions import InstructorRetryException
+
+from code_diff_doc_gen import llm
+from code_diff_doc_gen.config import AppConfig, config, usage_cost
+from code_diff_doc_gen.models import FileDescription
+from code_diff_doc_gen.routing import Complexity, route_model, score_complexity
+
+BRANCHY_PY = """
+def classify(x):
+    if x > 10 and x < 20:
+        return "mid"
+    for i in range(x):
+        while i:
+            i -= 1
+    try:
+        pass
+    except ValueError:
+        pass
+    return [y for y in range(x) if y]
+"""
+
+
+def test_score_complexity_python_counts_branches() -> None:
+    """Test Python sources are scored from their AST."""
+    result = score_complexity(BRANCHY_PY, ".py")
+    # if, and, for, while, except, comprehension
+    assert result.branches == 6
+    assert result.nodes > 30
+
+
+def test_score_complexity_other_languages() -> None:
+    """Test other languages are scored from branch keywords."""
+    swift = "struct A { func f() { if a && b { } guard let x else { return } switch y { case 1: break } } }"
+    assert score_complexity(swift, ".swift").branches == 5
+    assert score_complexity("let x = 1", ".swift").branches == 0
+
+
+def test_route_model_rules() -> None:
+    """Test only small, simple files in fast stages go to the fast model."""
+    cfg = AppConfig(routing=True)
+    simple = Complexity(tokens=100, nodes=50, branches=1)
+    branchy = Complexity(tokens=100, nodes=50, branches=cfg.route_fast_max_branches + 1)
+
+    assert route_model("describe", 100, simple, cfg) == cfg.fast_model
+    assert route_model("describe", 100, branchy, cfg) == cfg.model
+    assert route_model("describe", cfg.route_fast_max_tokens + 1, simple, cfg) == cfg.model
+    assert route_model("analyze", 100, simple, cfg) == cfg.model
+    assert route_model("describe", 100, simple, AppConfig()) == cfg.model
+
+
+def test_usage_cost_uses_model_pricing() -> None:
+    """Test cost is computed from the pricing of the serving model."""
+    usage = SimpleNamespace(
+        input_tokens=1_000_000, output_tokens=0, cache_creation_input_tokens=0, cache_read_input_tokens=0
+    )
+    assert usage_cost(usage, "claude-3-7-sonnet-20250219") == pytest.approx(3.0)
+    assert usage_cost(usage, "claude-3-5-haiku-20241022") == pytest.approx(0.8)
+
+
+async def test_fast_model_falls_back_on_validation_failure(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test output that fails validation on the fast model is retried on the standard model."""
+    usage = SimpleNamespace(input_tokens=10, output_tokens=10, cache_creation_input_tokens=0, cache_read_input_tokens=0)
+    requests = []
+
+    async def create_with_completion(**kwargs):
+        requests.append(kwargs)
+        if kwargs["model"] == config.fast_model:
+            raise InstructorRetryException("invalid", n_attempts=1, total_usage=0)
+        return FileDescription(description="ok"), SimpleNamespace(usage=usage)
+
+    client = SimpleNamespace(messages=SimpleNamespace(create_with_completion=create_with_completion))
+    monkeypatch.setattr(llm, "get_client", lambda endpoint=None: client)
+    monkeypatch.setattr(config, "routing", True)
+
+    result = await llm.generate_file_description("X = 1\n", "consts.py")
+
+    assert result.description == "ok"
+    assert [r["model"] for r in requests] == [config.fast_model, config.model]
+    assert "thinking" not in requests[0]
+    assert requests[0]["max_tokens"] <= 8192
@@ -0,0 +1,89 @@
+"""Tests for cost-based scheduling and the pipelined run mode."""
+
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from code_diff_doc_gen import pipeline
+from code_diff_doc_gen.config import config
+from code_diff_doc_gen.scheduler import STAGE_COST_DEFAULTS, CostModel, run_scheduled
+from code_diff_doc_gen.store import FileStore
+
+
+def test_cost_model_prefers_history_then_learned_rates() -> None:
+    """Test file history wins over rates learned from other files and the defaults."""
+    sizes = {"a.swift": 4000, "b.swift": 8000, "c.swift": 400}
+    records = [
+        {"stage": "generate", "path": "a.swift", "seconds": 10.0},
+        {"stage": "generate", "path": "a.swift", "seconds": 20.0},
+    ]
+    costs = CostModel.from_records(sizes, records)
+
+    assert costs.estimate("generate", "a.swift") == 20.0
+    # 20s for ~1000 tokens, so ~2001 tokens take about twice as long
+    assert costs.estimate("generate", "b.swift") == pytest.approx(40.0, rel=0.01)
+
+    base, per_token = STAGE_COST_DEFAULTS["describe"]
+    assert costs.estimate("describe", "c.swift") == base + 101 * per_token
+    assert costs.remaining(["describe", "generate"], "a.swift") == costs.estimate("describe", "a.swift") + 20.0
+
+
+def test_cost_model_ignores_skipped_work(tmp_path: Path) -> None:
+    """Test near-instant completions are not recorded as timings."""
+    costs = CostModel()
+    costs.observe("generate", "a.swift", 0.01, 0)
+    costs.observe("generate", "b.swift", 12.0, 0)
+    assert costs.new_timings == [{"stage": "generate", "round": 0, "path": "b.swift", "seconds": 12.0}]
+
+    store = FileStore(tmp_path)
+    costs.save(store)
+    assert list(store.iter_records("timings")) == [{"stage": "generate", "round": 0, "path": "b.swift", "seconds": 12.0}]
+
+
+async def test_run_scheduled_starts_largest_first() -> None:
+    """Test items start in decreasing cost order and results keep input order."""
+    started: List[str] = []
+    sizes = {"small": 1, "large": 100, "medium": 10}
+
+    async def worker(item: str) -> str:
+        started.append(item)
+        return item.upper()
+
+    results = await run_scheduled(list(sizes), worker, sizes.get, concurrency=1, desc="test")
+
+    assert started == ["large", "medium", "small"]
+    assert results == ["SMALL", "LARGE", "MEDIUM"]
+
+
+async def test_pipeline_follows_critical_path(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the pipeline runs the file with the longest remaining path first."""
+    source_dir = tmp_path / "src"
+    files = [source_dir / "small.swift", source_dir / "large.swift"]
+    order: List[str] = []
+
+    async def read_file(path, *args):
+        order.append(f"describe:{path.name}")
+        return SimpleNamespace(status="generated")
+
+    async def generate_file(path, *args):
+        order.append(f"generate:{path.name}")
+        return SimpleNamespace(status="generated")
+
+    async def compare(path, *args):
+        order.append(f"analyze:{path.name}")
+        return SimpleNamespace(error=None, skipped=False)
+
+    monkeypatch.setattr(pipeline, "read_file", read_file)
+    monkeypatch.setattr(pipeline, "generate_file", generate_file)
+    monkeypatch.setattr(pipeline, "_compare_single_file", compare)
+    monkeypatch.setattr(config, "max_concurrency", 1)
+
+    costs = CostModel({"small.swift": 100, "large.swift": 100000})
+    pending = {"describe": files, "generate": files, "analyze": files}
+    counts = await pipeline.run_pipeline(source_dir, 0, tmp_path / "ws", pending, FileStore(tmp_path / "ws"), costs=costs)
+
+    assert order[:3] == ["describe:large.swift", "generate:large.swift", "analyze:large.swift"]
+    assert counts["generate"]["generated"] == 2
+    assert counts["analyze"]["analyzed"] == 2
@@ -0,0 +1,61 @@
+"""Tests for cross-round similarity scoring."""
+
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from code_diff_doc_gen.config import config
+from code_diff_doc_gen.scoring import find_rounds, load_scores, save_scores, score_rounds, similarity_block, summarize
+from code_diff_doc_gen.store import FileStore
+
+ORIGINAL = "func total(items: [Int]) -> Int {\n    return items.reduce(0, +)\n}\n"
+
+
+def test_similarity_block() -> None:
+    """Test identical code scores 1, edits score lower, and missing generations are NaN."""
+    renamed = ORIGINAL.replace("items", "values")
+    unrelated = "class Cache { var entries = [String: Data]() }\n"
+    scores = similarity_block([ORIGINAL, ""], [[ORIGINAL, renamed, unrelated], ["", None]])
+
+    assert scores.shape == (2, 3)
+    assert scores[0, 0] == pytest.approx(1.0)
+    assert 0.3 < scores[0, 1] < 0.95
+    assert scores[0, 2] < scores[0, 1]
+    assert scores[1, 0] == 1.0 and np.isnan(scores[1, 1]) and np.isnan(scores[1, 2])
+
+
+async def test_score_rounds_and_convergence(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the files x rounds matrix, its summary and the saved binary form."""
+    monkeypatch.setattr(config, "cpu_workers", 0)
+    source_dir = tmp_path / "src"
+    source_dir.mkdir()
+    files = [f"f{i}.swift" for i in range(5)]
+    for key in files:
+        (source_dir / key).write_text(ORIGINAL.replace("total", key[:2]))
+
+    store = FileStore(tmp_path / "ws")
+    for key in files:
+        original = (source_dir / key).read_text()
+        store.write("generated/round_0", key, "struct Placeholder {}\n")
+        store.write("generated/round_1", key, original.replace("items", "list"))
+        if key != "f4.swift":
+            store.write("generated/round_2", key, original.replace("items", "list"))
+
+    rounds = find_rounds(store)
+    assert rounds == [0, 1, 2]
+    scores = await score_rounds(source_dir, files, store, rounds, block_size=2)
+    assert scores.shape == (5, 3) and np.isnan(scores[4, 2])
+
+    summary = summarize(files, rounds, scores)
+    assert summary["rounds"][1]["improved"] == 5
+    assert summary["rounds"][2]["files"] == 4 and summary["rounds"][2]["gain"] == 0.0
+    assert summary["converged"]
+    assert not summarize(files, rounds[:2], scores[:, :2])["converged"]
+
+    save_scores(store, files, rounds, scores, summary)
+    loaded_files, loaded_rounds, loaded = load_scores(store.workspace_dir)
+    assert loaded_files == files and loaded_rounds == rounds
+    np.testing.assert_array_equal(loaded, scores)
+    assert store.read_meta("scores.json")["converged"] is True
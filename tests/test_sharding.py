@@ -0,0 +1,82 @@
+"""Tests for deterministic sharding and merging of shard workspaces."""
+
+from pathlib import Path
+
+import pytest
+
+from code_diff_doc_gen.journal import Journal
+from code_diff_doc_gen.sharding import SHARD_META, merge_workspaces, parse_shard, select_shard, shard_of
+from code_diff_doc_gen.store import FileStore, SQLiteStore
+
+
+def test_parse_shard() -> None:
+    """Test shard specifications are validated."""
+    assert parse_shard("0/4") == (0, 4)
+    assert parse_shard("3/4") == (3, 4)
+    for spec in ("4/4", "-1/4", "1", "a/b", "0/0"):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+def test_shards_partition_paths() -> None:
+    """Test every path lands in exactly one shard, stably."""
+    paths = [f"Views/View{i}.swift" for i in range(200)]
+    shards = [select_shard(paths, i, 4) for i in range(4)]
+
+    assert sorted(p for shard in shards for p in shard) == sorted(paths)
+    assert all(shards)
+    assert shard_of("Views/View7.swift", 4) == shard_of("Views/View7.swift", 4)
+
+
+def write_shard(store, index: int, files, round_num: int = 0) -> None:
+    """Populate a shard workspace as a run of one shard would."""
+    journal = Journal(store)
+    journal.record_plan(round_num, files)
+    for path in files:
+        store.write("descriptions", path, f"desc {path}", mtime=1000.0 + index)
+        store.write(f"generated/round_{round_num}", path, f"code {path}", mtime=2000.0 + index)
+        journal.record("generate", path, round_num)
+    store.append_record("analysis/round_0", {"type": "file", "file": files[0], "analysis_id": str(index)})
+    store.write_meta(SHARD_META, {"index": index, "count": 2, "files": len(files)})
+    store.write_meta(
+        "generated/round_0/metadata.json",
+        {"round": 0, "total": len(files), "successful": len(files), "newly_generated": len(files), "skipped": 0, "errors": 0},
+    )
+    store.write_meta(
+        "manifest.json",
+        {"source_dir": "/src", "rounds": [0] if index == 0 else [0, 1], "files": {p: [1, 1] for p in files}},
+    )
+    store.append_record("usage", {"round": 0, "cost": 0.5, "ts": 1.0})
+    store.flush()
+
+
+def test_merge_workspaces(tmp_path: Path) -> None:
+    """Test shard artifacts, records and metadata are combined."""
+    first = FileStore(tmp_path / "shard-0-of-2")
+    second = SQLiteStore(tmp_path / "shard-1-of-2")
+    write_shard(first, 0, ["a.swift", "b.swift"])
+    write_shard(second, 1, ["c.swift"])
+    dest = FileStore(tmp_path / "merged")
+
+    counts = merge_workspaces([first, second], dest)
+
+    assert counts["artifacts"] == 6
+    assert dest.read("generated/round_0", "c.swift") == "code c.swift"
+    assert dest.mtime("descriptions", "a.swift") == pytest.approx(1000.0)
+
+    meta = dest.read_meta("generated/round_0/metadata.json")
+    assert meta["total"] == 3 and meta["round"] == 0
+    manifest = dest.read_meta("manifest.json")
+    assert manifest["rounds"] == [0]
+    assert sorted(manifest["files"]) == ["a.swift", "b.swift", "c.swift"]
+
+    state = Journal(dest).load()
+    assert state.plans[0] == ["a.swift", "b.swift", "c.swift"]
+    assert ("generate", 0, "c.swift") in state.done
+    # Identical usage records of both shards collapse into one
+    assert len(list(dest.iter_records("usage"))) == 1
+    assert len(list(dest.iter_records("analysis/round_0"))) == 2
+
+    # Merging again adds nothing new
+    assert merge_workspaces([first, second], dest)["artifacts"] == 0
+    second.close()
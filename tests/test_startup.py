@@ -0,0 +1,52 @@
+"""Startup-time budget checks for the CLI."""
+
+import subprocess
+import sys
+
+# Cumulative import time budget for the CLI module, in microseconds
+IMPORT_BUDGET_US = 500_000
+
+HEAVY_MODULES = ("anthropic", "instructor", "httpx", "tqdm", "pydantic")
+
+
+def _import_times(module: str) -> dict:
+    """Import a module in a fresh interpreter and parse -X importtime output."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_skips_api_stack() -> None:
+    """Test importing the CLI does not load the API client stack."""
+    times = _import_times("code_diff_doc_gen.main")
+
+    loaded = [name for name in times if name.split(".")[0] in HEAVY_MODULES]
+    assert loaded == []
+
+
+def test_cli_import_budget() -> None:
+    """Test the CLI module imports within the startup budget."""
+    times = _import_times("code_diff_doc_gen.main")
+
+    assert times["code_diff_doc_gen.main"] < IMPORT_BUDGET_US
+
+
+def test_import_keeps_application_logging() -> None:
+    """Test importing the package leaves the application's log handlers in place."""
+    code = (
+        "import sys; from loguru import logger; logger.remove(); logger.add(sys.stdout, format='{message}'); "
+        "import code_diff_doc_gen.main; logger.info('kept')"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert result.stdout == "kept\n"
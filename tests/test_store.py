@@ -0,0 +1,201 @@
+"""Tests for the workspace store backends."""
+
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from code_diff_doc_gen.blobs import Pack
+from code_diff_doc_gen.store import (
+    LOADED_PACKS,
+    BlobStore,
+    FileStore,
+    SQLiteStore,
+    artifact_path,
+    export_workspace,
+    open_store,
+    split_artifact_path,
+    WorkspaceStore,
+    workspace_store,
+)
+
+
+@pytest.fixture(params=["files", "sqlite", "blobs"])
+def store(request: pytest.FixtureRequest, tmp_path: Path):
+    """Open each store backend in a temporary workspace."""
+    store = open_store(tmp_path / ".codediff", request.param)
+    yield store
+    store.close()
+
+
+def test_artifact_roundtrip(store) -> None:
+    """Test writing and reading artifacts by namespace and key."""
+    store.write("descriptions", "Views/Counter.swift", "A counter view")
+    store.write("analysis/round_0", "Views/Counter.swift", "pairs")
+
+    assert store.read("descriptions", "Views/Counter.swift") == "A counter view"
+    assert store.read("descriptions", "Missing.swift") is None
+    assert store.mtime("descriptions", "Views/Counter.swift") is not None
+    assert store.mtime("descriptions", "Missing.swift") is None
+    assert list(store.keys("analysis/round_0")) == ["Views/Counter.swift"]
+    assert store.exists("analysis/round_0")
+    assert not store.exists("analysis/round_1")
+
+
+def test_records_and_meta(store) -> None:
+    """Test append-only records and metadata documents."""
+    store.append_record("journal", {"event": "done", "path": "a.swift"})
+    store.append_record("journal", {"event": "done", "path": "b.swift"})
+    store.write_meta("generated/round_0/metadata.json", {"round": 0})
+
+    assert [r["path"] for r in store.iter_records("journal")] == ["a.swift", "b.swift"]
+    assert store.read_meta("generated/round_0/metadata.json") == {"round": 0}
+    assert store.record_kinds() == ["journal"]
+
+    store.append_record("journal", {"event": "done", "path": "c.swift"})
+    store.clear_records("journal")
+    assert list(store.iter_records("journal")) == []
+
+
+def test_incomplete_backend_fails_on_open(tmp_path: Path) -> None:
+    """Test a backend missing part of the interface cannot be instantiated."""
+
+    class PartialStore(WorkspaceStore):
+        def read(self, namespace, key):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStore(tmp_path)
+
+
+def test_sqlite_batches_until_flush(tmp_path: Path) -> None:
+    """Test buffered SQLite writes are visible before and after commit."""
+    store = SQLiteStore(tmp_path, batch_size=1000, flush_interval=3600)
+    store.write("descriptions", "a.swift", "A")
+
+    assert store.read("descriptions", "a.swift") == "A"
+    reopened = SQLiteStore(tmp_path)
+    assert reopened.read("descriptions", "a.swift") is None
+
+    store.flush()
+    assert reopened.read("descriptions", "a.swift") == "A"
+    store.close()
+    reopened.close()
+
+
+def test_export_workspace(tmp_path: Path) -> None:
+    """Test exporting a SQLite store to the mirrored directory layout."""
+    store = SQLiteStore(tmp_path / "db")
+    store.write("descriptions", "Views/Counter.swift", "A counter view")
+    store.write("generated/round_0", "Views/Counter.swift", "struct Counter {}")
+    store.write_meta("generated/round_0/metadata.json", {"round": 0})
+    store.append_record("journal", {"event": "done"})
+
+    dest = tmp_path / "exported"
+    count = export_workspace(store, dest)
+    store.close()
+
+    assert count == 2
+    assert (dest / "descriptions" / "Views" / "Counter.swift.desc").read_text() == "A counter view"
+    assert (dest / "generated" / "round_0" / "Views" / "Counter.swift").read_text() == "struct Counter {}"
+    assert json.loads((dest / "generated" / "round_0" / "metadata.json").read_text()) == {"round": 0}
+    assert list(FileStore(dest).iter_records("journal")) == [{"event": "done"}]
+
+
+def test_split_artifact_path_roundtrip() -> None:
+    """Test artifact paths map back to their namespace and key."""
+    for namespace, key in [
+        ("descriptions", "Views/Counter.swift"),
+        ("generated/round_2", "Views/Counter.swift"),
+        ("analysis/round_0", "App.swift"),
+        ("prompts", "system_1.md"),
+    ]:
+        assert split_artifact_path(artifact_path(namespace, key)) == (namespace, key)
+
+
+def test_write_with_explicit_mtime(store) -> None:
+    """Test artifacts can be written with a preserved modification time."""
+    store.write("generated/round_0", "App.swift", "code", mtime=1_700_000_000.0)
+    store.flush()
+    assert store.mtime("generated/round_0", "App.swift") == pytest.approx(1_700_000_000.0)
+
+
+def test_blob_store_deduplicates_across_rounds(tmp_path: Path) -> None:
+    """Test identical artifacts share one blob and other processes' writes are visible."""
+    store = BlobStore(tmp_path)
+    other = BlobStore(tmp_path)
+    for round_num in range(3):
+        store.write(f"generated/round_{round_num}", "A.swift", "struct A {}")
+    store.write("generated/round_2", "A.swift", "struct A2 {}")
+
+    assert len(list(store.blobs.digests())) == 2
+    assert other.read("generated/round_0", "A.swift") == "struct A {}"
+    assert other.read("generated/round_2", "A.swift") == "struct A2 {}"
+    assert store.live_rounds() == [0, 1, 2]
+
+
+def test_blob_store_archive_and_gc(tmp_path: Path) -> None:
+    """Test archived rounds stay readable and gc frees blobs only they used."""
+    store = BlobStore(tmp_path)
+    store.write("generated/round_0", "A.swift", "struct Old {}", mtime=100.0)
+    store.write("analysis/round_0", "A.swift", "old pairs")
+    store.write("generated/round_1", "A.swift", "struct New {}")
+    store.write("generated/round_1", "A.swift", "struct Newer {}")
+
+    assert store.archive_round(0) == 2
+    assert store.live_rounds() == [1]
+    stats = store.gc()
+    assert stats == {"compacted": 1, "removed": 3, "freed": stats["freed"]}
+    assert len(list(store.blobs.digests())) == 1
+
+    reopened = BlobStore(tmp_path)
+    assert reopened.read("generated/round_0", "A.swift") == "struct Old {}"
+    assert reopened.mtime("generated/round_0", "A.swift") == 100.0
+    assert reopened.read("generated/round_1", "A.swift") == "struct Newer {}"
+    assert list(reopened.keys("analysis/round_0")) == ["A.swift"]
+    assert {path for path, _, _ in reopened.iter_artifacts()} == {
+        "generated/round_0/A.swift",
+        "analysis/round_0/A.swift.analysis",
+        "generated/round_1/A.swift",
+    }
+    with pytest.raises(ValueError):
+        reopened.archive_round(0)
+
+
+def test_blob_store_reads_archives_once(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test archived blobs are decompressed once per round and only recent rounds stay in memory."""
+    store = BlobStore(tmp_path)
+    for round_num in range(LOADED_PACKS + 1):
+        for i in range(20):
+            store.write(f"generated/round_{round_num}", f"F{i}.swift", f"struct F{i}R{round_num} {{}}")
+        store.archive_round(round_num)
+    loads = []
+    blobs = Pack.blobs
+    monkeypatch.setattr(Pack, "blobs", lambda pack: loads.append(pack.path.name) or blobs(pack))
+
+    for round_num in range(LOADED_PACKS + 1):
+        for i in range(20):
+            assert store.read(f"generated/round_{round_num}", f"F{i}.swift") == f"struct F{i}R{round_num} {{}}"
+
+    assert loads == [f"round_{round_num}.tar.xz" for round_num in range(LOADED_PACKS + 1)]
+    assert [store._packs[r].loaded for r in range(LOADED_PACKS + 1)] == [False] + [True] * LOADED_PACKS
+    assert store.read("generated/round_0", "F0.swift") == "struct F0R0 {}"
+    assert not store._packs[1].loaded
+
+
+async def test_workspace_store_detects_and_closes(tmp_path: Path) -> None:
+    """Test a borrowed store stays open and an opened one uses the workspace's backend and is closed."""
+    owned = SQLiteStore(tmp_path)
+    owned.write("prompts", "system_1.md", "prompt")
+
+    async with workspace_store(tmp_path, owned) as store:
+        assert store is owned
+    assert owned.read("prompts", "system_1.md") == "prompt"
+    owned.close()
+
+    async with workspace_store(tmp_path) as store:
+        assert isinstance(store, SQLiteStore)
+        assert store.read("prompts", "system_1.md") == "prompt"
+    with pytest.raises(sqlite3.ProgrammingError):
+        store.read("prompts", "system_1.md")
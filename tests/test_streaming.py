@@ -0,0 +1,162 @@
+"""Tests for streamed responses with early validation."""
+
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from code_diff_doc_gen.models import CodeAnalysisResult, GeneratedCode
+from code_diff_doc_gen.streaming import (
+    MalformedOutputError,
+    PartialWriter,
+    ToolInputScanner,
+    TruncatedOutputError,
+    stream_structured,
+)
+
+
+def chunked(text: str, size: int) -> List[str]:
+    """Split text into fixed-size chunks."""
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def test_scanner_captures_decoded_field_across_chunks() -> None:
+    """Test escapes split across chunks are decoded into the captured text."""
+    value = 'let s = "a\\b"\n\tprint(s) // ✓ 😀'
+    captured: List[str] = []
+    scanner = ToolInputScanner({"implementation"}, "implementation", captured.append)
+    for chunk in chunked(json.dumps({"implementation": value}), 3):
+        scanner.feed(chunk)
+
+    assert scanner.complete
+    assert "".join(captured) == value
+
+
+def test_scanner_skips_nested_values() -> None:
+    """Test nested arrays and objects with tricky strings are skipped."""
+    payload = json.dumps({"pairs": [{"bad_code": "}]\"", "good_code": "{["}]})
+    scanner = ToolInputScanner({"pairs"})
+    for chunk in chunked(payload, 2):
+        scanner.feed(chunk)
+    assert scanner.complete
+
+
+def test_scanner_rejects_unknown_field_early() -> None:
+    """Test an unexpected field aborts before its value arrives."""
+    scanner = ToolInputScanner({"implementation"})
+    with pytest.raises(MalformedOutputError, match="code"):
+        scanner.feed('{"code": ')
+
+
+def test_scanner_rejects_invalid_json() -> None:
+    """Test structurally invalid input is rejected."""
+    with pytest.raises(MalformedOutputError):
+        ToolInputScanner({"implementation"}).feed('{"implementation" "x"}')
+    with pytest.raises(MalformedOutputError):
+        ToolInputScanner({"implementation"}).feed("implementation")
+
+
+class FakeStream:
+    """Async stream of message events mimicking the SDK stream helper."""
+
+    def __init__(self, deltas: List[str], stop_reason: str = "tool_use", tool: str = "GeneratedCode"):
+        self.deltas = deltas
+        self.tool = tool
+        self.stop_reason = stop_reason
+        self.closed = False
+        self.sent = 0
+        usage = SimpleNamespace(input_tokens=10, output_tokens=1, cache_creation_input_tokens=0, cache_read_input_tokens=0)
+        self.current_message_snapshot = SimpleNamespace(usage=usage)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.closed = True
+
+    async def __aiter__(self):
+        yield SimpleNamespace(type="content_block_start", content_block=SimpleNamespace(type="tool_use", name=self.tool))
+        for delta in self.deltas:
+            self.sent += 1
+            yield SimpleNamespace(
+                type="content_block_delta", delta=SimpleNamespace(type="input_json_delta", partial_json=delta)
+            )
+
+    async def get_final_message(self):
+        return SimpleNamespace(stop_reason=self.stop_reason, usage=self.current_message_snapshot.usage)
+
+
+def fake_client(stream: FakeStream):
+    """Build a client whose beta messages stream returns the fake stream."""
+    return SimpleNamespace(beta=SimpleNamespace(messages=SimpleNamespace(stream=lambda **kwargs: stream)))
+
+
+async def test_stream_structured_spools_partial_output(tmp_path: Path) -> None:
+    """Test the implementation is spooled to disk while it streams."""
+    code = "struct ContentView: View {}\n" * 50
+    stream = FakeStream(chunked(json.dumps({"implementation": code}), 7))
+    partial = PartialWriter(tmp_path / "gen" / "View.swift.partial", "implementation", block_size=64)
+
+    response, usage, ttft = await stream_structured(
+        fake_client(stream), GeneratedCode, [], [], partial, model="m", max_tokens=100
+    )
+
+    assert response.implementation == code
+    assert usage.input_tokens == 10
+    assert ttft is not None
+    assert partial.path.read_text() == code
+    await partial.discard()
+    assert not partial.path.exists()
+
+
+async def test_stream_structured_aborts_malformed_output() -> None:
+    """Test a malformed response is aborted before the stream finishes."""
+    stream = FakeStream(['{"bad', '_field": "x"', *['"'] * 100])
+
+    with pytest.raises(MalformedOutputError) as e:
+        await stream_structured(fake_client(stream), GeneratedCode, [], [], model="m", max_tokens=100)
+
+    assert stream.closed
+    assert stream.sent == 2
+    assert e.value.usage.input_tokens == 10
+
+
+async def test_stream_structured_reports_truncation() -> None:
+    """Test a response cut off by the token limit raises a truncation error."""
+    stream = FakeStream(['{"pairs": [{"bad_code": "x'], stop_reason="max_tokens", tool="CodeAnalysisResult")
+
+    with pytest.raises(TruncatedOutputError):
+        await stream_structured(fake_client(stream), CodeAnalysisResult, [], [], model="m", max_tokens=100)
+
+
+async def test_retried_call_keeps_spooling(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test a call retried after truncation spools its output again, starting from an empty spool."""
+    from code_diff_doc_gen import llm
+    from code_diff_doc_gen.budget import TokenPolicy
+    from code_diff_doc_gen.config import config, state
+
+    for name, value in (("stream", True), ("raw_output", False), ("hedge", False), ("response_cache", False)):
+        monkeypatch.setattr(config, name, value)
+    monkeypatch.setattr(state, "tokens", TokenPolicy())
+    monkeypatch.setattr(llm, "get_client", lambda endpoint=None: SimpleNamespace(client=None))
+    usage = SimpleNamespace(input_tokens=10, output_tokens=10, cache_creation_input_tokens=0, cache_read_input_tokens=0)
+    spools = []
+
+    async def stream_with_retries(client, key, system, messages, response_model, stage, partial, request):
+        spools.append(partial)
+        partial.write("struct Partial")
+        if len(spools) == 1:
+            raise TruncatedOutputError("cut off")
+        return GeneratedCode(implementation="struct Done {}"), usage
+
+    monkeypatch.setattr(llm, "_stream_with_retries", stream_with_retries)
+    partial = PartialWriter(tmp_path / "A.swift.partial", "implementation")
+
+    result = await llm.call_anthropic_model("system", "x" * 40, GeneratedCode, stage="generate", partial=partial)
+
+    assert result.implementation == "struct Done {}"
+    assert spools == [partial, partial]
+    await partial.flush()
+    assert (tmp_path / "A.swift.partial").read_text() == "struct Partial"
@@ -0,0 +1,53 @@
+"""Tests for the shared HTTP transport."""
+
+import asyncio
+
+import httpx
+
+from code_diff_doc_gen.config import AppConfig
+from code_diff_doc_gen.transport import PooledTransport, build_http_client, pool_stats
+
+
+async def test_pooled_transport_limits_concurrency() -> None:
+    """Test requests beyond the pool size wait for a free slot."""
+    active = 0
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return httpx.Response(200, json={"ok": True})
+
+    transport = PooledTransport(httpx.MockTransport(handler), max_connections=2)
+    async with httpx.AsyncClient(transport=transport, base_url="http://fake") as client:
+        responses = await asyncio.gather(*(client.get("/") for _ in range(6)))
+
+    assert all(r.status_code == 200 for r in responses)
+    assert peak == 2
+
+    summary = transport.stats.summary()
+    assert summary["requests"] == 6
+    assert summary["peak_in_flight"] == 2
+    assert summary["waited"] >= 4
+    assert transport.stats.in_flight == 0
+
+
+async def test_streamed_response_holds_slot_until_closed() -> None:
+    """Test a streamed response keeps its slot until the body is closed."""
+    transport = PooledTransport(httpx.MockTransport(lambda r: httpx.Response(200, text="body")), max_connections=1)
+    async with httpx.AsyncClient(transport=transport, base_url="http://fake") as client:
+        async with client.stream("GET", "/") as response:
+            assert transport.stats.in_flight == 1
+            await response.aread()
+        assert transport.stats.in_flight == 0
+
+
+def test_build_http_client_uses_config() -> None:
+    """Test the shared client is built with the configured pool."""
+    client = build_http_client(AppConfig(max_connections=7, http2=False, read_timeout=42.0))
+
+    assert pool_stats(client).max_connections == 7
+    assert client.timeout.read == 42.0
@@ -0,0 +1,95 @@
+"""Tests for watch mode."""
+
+import asyncio
+import os
+from pathlib import Path
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from code_diff_doc_gen import pipeline, watch
+from code_diff_doc_gen.manifest import load_manifest
+from code_diff_doc_gen.store import FileStore
+from code_diff_doc_gen.watch import ChangeTracker
+
+
+def test_change_tracker_debounces_bursts() -> None:
+    """Test changed files are held back until the tree has been quiet long enough."""
+    tracker = ChangeTracker({"a.swift": (1, 1), "b.swift": (1, 1)}, debounce=0.5)
+
+    assert tracker.update({"a.swift": (2, 2), "b.swift": (1, 1)}, now=10.0) == ["a.swift"]
+    assert tracker.ready(10.2) == []
+    assert tracker.update({"a.swift": (2, 2), "b.swift": (1, 1), "c.swift": (1, 3)}, now=10.3) == ["c.swift"]
+    assert tracker.ready(10.6) == []
+    assert tracker.ready(10.8) == ["a.swift", "c.swift"]
+    assert tracker.ready(11.0) == []
+
+    # Failed files come back after the retry delay; removed files are dropped
+    tracker.retry(["a.swift", "c.swift"], delay=5.0, now=11.0)
+    tracker.update({"a.swift": (2, 2), "b.swift": (1, 1)}, now=12.0)
+    assert tracker.ready(12.0) == []
+    assert tracker.ready(16.0) == ["a.swift"]
+
+
+async def _until(condition, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def test_watch_processes_changed_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the initial catch-up, an edited file, a retried failure and the saved manifest."""
+    source_dir = tmp_path / "src"
+    source_dir.mkdir()
+    for name in ("a.swift", "b.swift"):
+        (source_dir / name).write_text(f"// {name}\n")
+        os.utime(source_dir / name, (1_000_000_000, 1_000_000_000))
+    store = FileStore(tmp_path / "ws")
+    analyzed: List[str] = []
+    prompts: List[int] = []
+    failures = {"b.swift": 1}
+
+    async def read_file(path, *args):
+        return SimpleNamespace(status="generated")
+
+    async def generate_file(path, *args):
+        return SimpleNamespace(status="generated")
+
+    async def compare(path, *args):
+        if failures.get(path.name):
+            failures[path.name] -= 1
+            return SimpleNamespace(error="rate limited", skipped=False)
+        store.write("analysis/round_0", path.name, "")
+        analyzed.append(path.name)
+        return SimpleNamespace(error=None, skipped=False)
+
+    async def generate_prompt(round_num, *args):
+        prompts.append(round_num)
+
+    monkeypatch.setattr(pipeline, "read_file", read_file)
+    monkeypatch.setattr(pipeline, "generate_file", generate_file)
+    monkeypatch.setattr(pipeline, "_compare_single_file", compare)
+    monkeypatch.setattr(watch, "generate_system_prompt_from_analyses", generate_prompt)
+
+    stop = asyncio.Event()
+    task = asyncio.create_task(
+        watch.watch_sources(
+            source_dir, 0, tmp_path / "ws", store, interval=0.01, debounce=0.05, retry_delay=0.1, stop=stop
+        )
+    )
+
+    # Catch-up batch; the failed file is retried and then the round is recorded
+    await _until(lambda: sorted(analyzed) == ["a.swift", "b.swift"])
+    await _until(lambda: load_manifest(store) is not None)
+    assert set(load_manifest(store)["files"]) == {"a.swift", "b.swift"}
+
+    # An edit regenerates only the edited file
+    (source_dir / "a.swift").write_text("// edited\n")
+    await _until(lambda: len(analyzed) == 3)
+    assert analyzed[-1] == "a.swift"
+
+    stop.set()
+    assert await asyncio.wait_for(task, 1.0) == 3
+    assert prompts == [0, 0, 0]
@@ -0,0 +1,86 @@
+"""Tests for the lease-based work queue."""
+
+import time
+from pathlib import Path
+
+from code_diff_doc_gen.work_queue import WorkQueue
+
+
+def test_claims_are_exclusive_and_largest_first(tmp_path: Path) -> None:
+    """Test two workers never receive the same task and big files go first."""
+    queue = WorkQueue(tmp_path)
+    other = WorkQueue(tmp_path)
+    assert queue.enqueue(0, [("small.swift", 1.0, 1), ("large.swift", 50.0, 1), ("medium.swift", 10.0, 1)]) == 3
+    # Offering the same files again, as every starting worker does, queues nothing
+    assert other.enqueue(0, [("small.swift", 1.0, 1)]) == 0
+
+    claimed = [queue.claim(0, "a"), other.claim(0, "b"), queue.claim(0, "a")]
+    assert [task.path for task in claimed] == ["large.swift", "medium.swift", "small.swift"]
+    assert queue.claim(0, "a") is None
+    assert queue.counts(0)["leased"] == 3
+
+
+def test_expired_leases_are_reclaimed(tmp_path: Path) -> None:
+    """Test the task of a worker that stopped renewing goes to another worker."""
+    queue = WorkQueue(tmp_path, lease_seconds=0.05, max_attempts=2)
+    queue.enqueue(0, [("a.swift", 1.0, 1)])
+
+    crashed = queue.claim(0, "crashed")
+    time.sleep(0.1)
+    reclaimed = queue.claim(0, "b")
+    assert reclaimed.path == "a.swift" and reclaimed.attempts == 2
+    # The original owner can no longer renew or complete the task
+    assert not queue.renew(crashed, "crashed")
+    queue.complete(crashed, "crashed", "generated")
+    assert queue.counts(0)["done"] == 0
+
+    # Once its attempts are used up an expired task fails instead of coming back
+    time.sleep(0.1)
+    assert queue.claim(0, "c") is None
+    assert queue.counts(0)["failed"] == 1
+    assert queue.try_finalize(0, "c")
+
+
+def test_failures_retry_and_round_finalizes_once(tmp_path: Path) -> None:
+    """Test failed tasks are retried and only one worker finalizes a drained round."""
+    queue = WorkQueue(tmp_path, max_attempts=2)
+    queue.enqueue(0, [("a.swift", 2.0, 1), ("b.swift", 1.0, 1)])
+
+    first = queue.claim(0, "w1")
+    queue.fail(first, "w1", "generate stage failed")
+    assert queue.counts(0)["pending"] == 2
+    retry = queue.claim(0, "w1")
+    assert retry.path == "a.swift"
+    queue.fail(retry, "w1", "generate stage failed")
+
+    task = queue.claim(0, "w2")
+    assert not queue.try_finalize(0, "w2")
+    queue.complete(task, "w2", "generated")
+
+    assert queue.try_finalize(0, "w2")
+    assert not queue.try_finalize(0, "w1")
+    assert queue.results(0) == {"generated": 1, "error": 1}
+
+    queue.reset(0)
+    assert queue.counts(0) == {"pending": 0, "leased": 0, "done": 0, "failed": 0}
+
+
+def test_changed_sources_are_requeued(tmp_path: Path) -> None:
+    """Test finished files are queued again only once their source changed, reopening the round."""
+    queue = WorkQueue(tmp_path)
+    queue.enqueue(0, [("a.swift", 1.0, 100), ("b.swift", 1.0, 100)])
+    for _ in range(2):
+        queue.complete(queue.claim(0, "w1"), "w1", "generated")
+    assert queue.try_finalize(0, "w1")
+
+    assert queue.enqueue(0, [("a.swift", 1.0, 100), ("b.swift", 1.0, 100)]) == 0
+    assert queue.enqueue(0, [("a.swift", 1.0, 100), ("b.swift", 1.0, 200)]) == 1
+    assert queue.counts(0) == {"pending": 1, "leased": 0, "done": 1, "failed": 0}
+    task = queue.claim(0, "w2")
+    assert task.path == "b.swift" and task.attempts == 1
+    # A file still being worked on is not taken from its worker
+    assert queue.enqueue(0, [("b.swift", 1.0, 300)]) == 0
+
+    queue.complete(task, "w2", "generated")
+    assert queue.try_finalize(0, "w2")
+    assert not (tmp_path / "queue.lock").exists()
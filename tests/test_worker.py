@@ -0,0 +1,97 @@
+"""Tests for queue workers and the worker command."""
+
+import asyncio
+import os
+from pathlib import Path
+from typing import List
+
+import pytest
+from typer.testing import CliRunner
+
+from code_diff_doc_gen import llm, worker
+from code_diff_doc_gen.config import config, state
+from code_diff_doc_gen.main import app
+from code_diff_doc_gen.manifest import load_manifest
+from code_diff_doc_gen.models import CodeAnalysisResult, CodePair, FileDescription, GeneratedCode
+from code_diff_doc_gen.store import FileStore, open_store
+from code_diff_doc_gen.work_queue import WorkQueue
+
+
+async def test_workers_share_a_round(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test two workers process every file of a round exactly once and retry a failed stage."""
+    store = FileStore(tmp_path / "ws")
+    queue = WorkQueue(tmp_path / "ws")
+    queue.enqueue(0, [(f"{name}.swift", 1.0, 1) for name in "abcdef"])
+    runs: List[tuple] = []
+    failures = {"c.swift": 1}
+
+    async def run_file_stage(stage, path, *args):
+        await asyncio.sleep(0.001)
+        if stage == "generate" and failures.get(path.name):
+            failures[path.name] -= 1
+            return "error"
+        runs.append((stage, path.name))
+        return "generated"
+
+    monkeypatch.setattr(worker, "run_file_stage", run_file_stage)
+    monkeypatch.setattr(worker, "load_system_prompt", lambda *args: "prompt")
+
+    first, second = await asyncio.gather(
+        *(
+            worker.run_worker(tmp_path / "src", 0, tmp_path / "ws", store, queue, name, poll_interval=0.01)
+            for name in ("w1", "w2")
+        )
+    )
+
+    # Every stage ran once per file, except describe of the retried file
+    expected = [(stage, f"{name}.swift") for stage in ("describe", "generate", "analyze") for name in "abcdef"]
+    assert sorted(runs) == sorted(expected + [("describe", "c.swift")])
+    assert first["generate"]["error"] + second["generate"]["error"] == 1
+    assert first["analyze"].total + second["analyze"].total == 6
+    assert queue.results(0) == {"generated": 6}
+    assert queue.try_finalize(0, "w1")
+
+
+def test_worker_command_requeues_changed_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test the command processes a round, records it complete, and processes only edited files when run again."""
+    source_dir = tmp_path / "src"
+    source_dir.mkdir()
+    for name in ("a.swift", "b.swift"):
+        (source_dir / name).write_text(f"struct {name[0].upper()} {{}}\n")
+        os.utime(source_dir / name, (1_000_000_000, 1_000_000_000))
+    workspace_dir = tmp_path / "ws"
+    calls: List[str] = []
+
+    async def call_model(system_prompt, user_message, response_model, *args, **kwargs):
+        calls.append(response_model.__name__)
+        if response_model is FileDescription:
+            return FileDescription(description="A struct")
+        if response_model is GeneratedCode:
+            return GeneratedCode(implementation="struct Generated {}\n")
+        return CodeAnalysisResult(pairs=[CodePair(bad_code="struct Generated {}", good_code="struct A {}")])
+
+    async def prewarm_client():
+        pass
+
+    plain = (("stream", False), ("raw_output", False), ("routing", False), ("response_cache", False), ("max_cost", None))
+    for name, value in plain:
+        monkeypatch.setattr(config, name, value)
+    monkeypatch.setattr(state, "total_usage", dict(state.total_usage))
+    monkeypatch.setattr(llm, "_call_model", call_model)
+    monkeypatch.setattr(llm, "prewarm_client", prewarm_client)
+    command = ["worker", str(source_dir), "--output", str(workspace_dir), "--store", "files", "--poll", "0.01"]
+
+    result = CliRunner().invoke(app, command)
+    assert result.exit_code == 0, result.output
+    assert sorted(calls) == ["CodeAnalysisResult"] * 2 + ["FileDescription"] * 2 + ["GeneratedCode"] * 2
+    store = open_store(workspace_dir, "files")
+    assert set(load_manifest(store)["files"]) == {"a.swift", "b.swift"}
+
+    calls.clear()
+    (source_dir / "b.swift").write_text("struct B { let x = 1 }\n")
+    result = CliRunner().invoke(app, command)
+    assert result.exit_code == 0, result.output
+    assert sorted(calls) == ["CodeAnalysisResult", "FileDescription", "GeneratedCode"]
+    queue = WorkQueue(workspace_dir)
+    assert queue.counts(0) == {"pending": 0, "leased": 0, "done": 2, "failed": 0}
+    queue.close()